@@ -1,56 +1,84 @@
+import os
+import re
+
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from datetime import datetime, timedelta
 
-from f1 import *
+# Only the lightweight registry is imported while the scheduler parses the DAG, the collectors and their
+# database and HTTP clients are imported by the tasks
+from registry import collector_dependencies
 
 arguments = {
     'owner': 'airflow_f1',
-    'start_date': datetime.now(),
+    # A fixed start date, the DAG only runs when triggered
+    'start_date': datetime(2024, 1, 1),
     'retries': 1,
     'retry_delay': timedelta(minutes=5),
 }
 
+# Airflow pool shared by the collector tasks, so that they do not overload the Ergast API
+ergast_pool = os.environ.get('F1_AIRFLOW_POOL', 'ergast_api')
+
 with DAG(
     dag_id='f1_dag',
     default_args=arguments,
     schedule_interval=None,
+    catchup=False,
 ) as dag:
 
     # Define the Python function to call
-    def call_external_procedures():
-        seasons_data = SeasonCollector()
-        seasons_data.run()
-        drivers_data = DriverCollector()
-        drivers_data.run()
-        constructors_data = ConstructorCollector()
-        constructors_data.run()
-        status_data = StatusCollector()
-        status_data.run()
-        circuits_data = CircuitCollector()
-        circuits_data.run()
-        races_data = RaceCollector()
-        races_data.run()
-        driver_standings_data = DriverStandingsCollector()
-        driver_standings_data.run()
-        constructor_standings_data = ConstructorStandingsCollector()
-        constructor_standings_data.run()
-        qualifying_data = QualifyingCollector()
-        qualifying_data.run()
-        pit_stops_data = PitStopsCollector()
-        pit_stops_data.run()
-        laps_data = LapTimesCollector()
-        laps_data.run()
-        results_data = ResultsCollector()
-        results_data.run()
-        sprint_results_data = SprintResultsCollector()
-        sprint_results_data.run()
-
-        # You can return any results or perform additional tasks here
-
-    # Define the Airflow task
-    run_procedures = PythonOperator(
-        task_id='run_procedures',
-        python_callable=call_external_procedures,
-        provide_context=True,  # Optional, pass context to the function
+    def run_collector(collector_name):
+        from runner import CollectorRunner
+
+        CollectorRunner(names=[collector_name]).run_collector(collector_name)
+
+    # Define an Airflow task per collector, e.g. lap_times_collector for LapTimesCollector
+    tasks = dict()
+    for name in collector_dependencies:
+        tasks[name] = PythonOperator(
+            task_id=re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower(),
+            python_callable=run_collector,
+            op_kwargs={'collector_name': name},
+            pool=ergast_pool,
+        )
+
+    # Reference tables first, then races, then the per race facts in parallel
+    for name, dependencies in collector_dependencies.items():
+        for dependency in dependencies:
+            tasks[dependency] >> tasks[name]
+
+# Backfill of a range of seasons, triggered with e.g. {"start_year": 1996, "end_year": 2005}. The work units
+# are planned at run time and each one runs as a mapped task, those already checkpointed being left out
+with DAG(
+    dag_id='f1_backfill_dag',
+    default_args=arguments,
+    schedule_interval=None,
+    catchup=False,
+    params={'start_year': 1950, 'end_year': 1950, 'rounds': None, 'collectors': None},
+    render_template_as_native_obj=True,
+) as backfill_dag:
+
+    def plan_backfill(start_year, end_year, rounds=None, collectors=None):
+        from backfill import Backfill
+
+        backfill = Backfill(collectors=collectors)
+        units = backfill.pending(backfill.plan(int(start_year), int(end_year), rounds=rounds))
+        return [{'collector': unit.collector, 'year': unit.year, 'round': unit.round} for unit in units]
+
+    def run_backfill_unit(collector, year, round):
+        from backfill import Backfill, WorkUnit
+
+        Backfill().run_unit(WorkUnit(collector, year, round))
+
+    plan = PythonOperator(
+        task_id='plan_backfill',
+        python_callable=plan_backfill,
+        op_kwargs={'start_year': '{{ params.start_year }}', 'end_year': '{{ params.end_year }}',
+                   'rounds': '{{ params.rounds }}', 'collectors': '{{ params.collectors }}'},
     )
+    PythonOperator.partial(
+        task_id='backfill_unit',
+        python_callable=run_backfill_unit,
+        pool=ergast_pool,
+    ).expand(op_kwargs=plan.output)
@@ -0,0 +1,247 @@
+import argparse
+import time
+
+from collections import namedtuple
+
+from registry import round_collectors
+from runner import CollectorRunner
+
+# A backfill work unit, the rows of a round-walking collector for a single round
+WorkUnit = namedtuple('WorkUnit', ('collector', 'year', 'round'))
+
+
+class Backfill:
+    """Backfill of a range of seasons, partitioned into independent (collector, year, round) work units
+
+    Unlike a run, which resumes each collector from its watermark up to the current season, a backfill
+    collects an explicit range of seasons and rounds, e.g. to load the history of a new database or to
+    reload a few seasons. Each work unit collects a single round of a single collector, so the units run
+    in any order, in parallel worker processes or as the mapped tasks of the Airflow backfill DAG, and
+    each unit is checkpointed once its rows are stored. A backfill started again only runs the units
+    that have not been checkpointed yet. The reference tables and the races must be collected first.
+    """
+
+    def __init__(self, collectors=None, workers=1, dry_run=False, from_cache=False, rerun=False):
+        """
+            Initialize the backfill
+        :param collectors: The round-walking collectors to backfill, all of them by default
+        :param workers: The number of work unit processes, 1 to run the units in sequence in this process
+        :param dry_run: Read the database but never write to it, the checkpoints included
+        :param from_cache: Serve the requests from the response cache only, without any network request
+        :param rerun: Run the checkpointed work units again
+        """
+        self.collectors = [name for name in round_collectors if not collectors or name in collectors]
+        self.workers = max(int(workers), 1)
+        self.dry_run = dry_run
+        self.from_cache = from_cache
+        self.rerun = rerun
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({", ".join(self.collectors)}, workers={self.workers})'
+
+    def _runner(self, unit):
+        return CollectorRunner(names=[unit.collector], workers=self.workers, start_year=unit.year,
+                               start_round=unit.round, end_year=unit.year, end_round=unit.round,
+                               dry_run=self.dry_run, from_cache=self.from_cache)
+
+    def season_rounds(self, years):
+        """
+            Get the number of rounds of each season that have already run, from its races
+        :param years: The seasons
+        :return: A dict of the number of rounds of each season
+        :raise RuntimeError: If the races of a season could not be collected
+        """
+        from utils.requests_wrapper import RequestsWrapper
+        from utils.utils import last_past_round
+
+        season_rounds = dict()
+        request = RequestsWrapper(cache_only=self.from_cache)
+        try:
+            for year in years:
+                response = request.get(target=f'{year}/races.json')
+                if response.status != 200:
+                    raise RuntimeError(f'Failed to collect the rounds of {year}: {response.status}')
+                # The rounds that have not run yet would be checkpointed without any row
+                season_rounds[year] = last_past_round(response.data['MRData']['RaceTable']['Races'])
+        finally:
+            request.close()
+        return season_rounds
+
+    def plan(self, start_year, end_year, rounds=None):
+        """
+            Partition a range of seasons into work units
+        :param start_year: The first season
+        :param end_year: The last season
+        :param rounds: The rounds to backfill in each season, all of them by default
+        :return: The work units, in year and round order
+        """
+        units = list()
+        for year, total in self.season_rounds(range(start_year, end_year + 1)).items():
+            for current_round in range(1, total + 1):
+                if rounds and current_round not in rounds:
+                    continue
+                units += [WorkUnit(name, year, current_round) for name in self.collectors]
+        return units
+
+    def pending(self, units):
+        """
+            Leave out the work units that have been checkpointed, unless they are run again
+        :param units: The work units
+        :return: The work units to run
+        """
+        from utils.azure_wrapper import AzureDBWrapper
+
+        if self.rerun or not units:
+            return list(units)
+        years = [unit.year for unit in units]
+        with AzureDBWrapper() as azure_db:
+            completed = azure_db.checkpoint_store(azure_db).completed(min(years), max(years))
+        return [unit for unit in units if tuple(unit) not in completed]
+
+    def run_unit(self, unit, request=None, async_request=None, azure_db=None):
+        """
+            Run a work unit and checkpoint it once its rows are stored
+        :param unit: The work unit
+        :param request: The requests wrapper, a new one closed once the unit has run by default
+        :param async_request: The async requests wrapper
+        :param azure_db: The database wrapper, a new one closed once the unit has run by default
+        :return: The seconds the unit took
+        """
+        from utils.azure_wrapper import AzureDBWrapper
+
+        unit = WorkUnit(*unit)
+        own_db = azure_db is None
+        azure_db = azure_db or AzureDBWrapper()
+        try:
+            # A unit with a failed page or insert raises before it is checkpointed
+            seconds = self._runner(unit).run_collector(unit.collector, request=request, async_request=async_request,
+                                                       azure_db=azure_db)
+            if not self.dry_run and not azure_db.checkpoint_store(azure_db).complete(*unit):
+                raise RuntimeError(f'{unit.collector} {unit.year} round {unit.round} could not be checkpointed')
+        finally:
+            if own_db:
+                azure_db.close()
+        return seconds
+
+    def _run_sequential(self, units):
+        """
+            Run the work units one after the other, sharing the connection pools
+        :param units: The work units
+        :return: The seconds each unit took, None for the failed ones
+        """
+        from utils.azure_wrapper import AzureDBWrapper
+
+        timings = dict()
+        request, async_request = CollectorRunner(workers=self.workers, from_cache=self.from_cache)._requests()
+        try:
+            with AzureDBWrapper() as azure_db:
+                for unit in units:
+                    try:
+                        timings[unit] = self.run_unit(unit, request=request, async_request=async_request,
+                                                      azure_db=azure_db)
+                    except Exception as exception:
+                        print(f'{unit} failed: {exception!r}')
+                        timings[unit] = None
+                print(f'Connections: {request.connection_stats()}')
+        finally:
+            request.close()
+            if async_request:
+                async_request.close()
+        return timings
+
+    def _run_parallel(self, units):
+        """
+            Run the work units in worker processes
+        :param units: The work units
+        :return: The seconds each unit took, None for the failed ones
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        timings = dict()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.run_unit, unit): unit for unit in units}
+            for future in as_completed(futures):
+                unit = futures[future]
+                try:
+                    timings[unit] = future.result()
+                except Exception as exception:
+                    print(f'{unit} failed: {exception!r}')
+                    timings[unit] = None
+        return timings
+
+    def run(self, start_year, end_year, rounds=None):
+        """
+            Backfill a range of seasons
+        :param start_year: The first season
+        :param end_year: The last season
+        :param rounds: The rounds to backfill in each season, all of them by default
+        :return: True if every work unit succeeded
+        """
+        units = self.plan(start_year, end_year, rounds=rounds)
+        pending = self.pending(units)
+        mode = 'dry run' if self.dry_run else 'run'
+        print(f'Backfill {start_year}-{end_year} ({mode}, {self.workers} worker(s)): {len(pending)} work units '
+              f'to run, {len(units) - len(pending)} already checkpointed')
+
+        start = time.perf_counter()
+        timings = self._run_parallel(pending) if self.workers > 1 else self._run_sequential(pending)
+        failed = [unit for unit in pending if timings.get(unit) is None]
+        print(f'Backfill {start_year}-{end_year}: {len(pending) - len(failed)} work units done, {len(failed)} failed '
+              f'in {time.perf_counter() - start:.1f}s')
+        return not failed
+
+
+def parse_rounds(value):
+    """
+        Parse a list of rounds and ranges of rounds, e.g. 1-5,8
+    :param value: The rounds
+    :return: The set of rounds
+    :raise argparse.ArgumentTypeError: If a part is not a round or an increasing range of rounds
+    """
+    rounds = set()
+    for part in value.split(','):
+        first, _, last = part.strip().partition('-')
+        try:
+            first, last = int(first), int(last or first)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'invalid round or range of rounds: {part.strip()!r}')
+        if not 1 <= first <= last:
+            # A reversed range would select no round at all
+            raise argparse.ArgumentTypeError(f'invalid range of rounds: {part.strip()!r}, rounds start at 1 '
+                                             f'and a range goes from its first to its last round')
+        rounds.update(range(first, last + 1))
+    return rounds
+
+
+def add_arguments(parser):
+    """
+        Add the arguments of the backfill command
+    :param parser: The argument parser
+    """
+    parser.add_argument('collectors', nargs='*',
+                        help='The round-walking collectors to backfill, all of them by default')
+    parser.add_argument('--start-year', type=int, required=True, help='The first season')
+    parser.add_argument('--end-year', type=int, required=True, help='The last season')
+    parser.add_argument('--rounds', type=parse_rounds,
+                        help='The rounds of each season, e.g. 1-5,8, all of them by default')
+    parser.add_argument('--workers', type=int, default=1, help='The number of work unit processes')
+    parser.add_argument('--dry-run', action='store_true', help='Collect but never write to the database')
+    parser.add_argument('--from-cache', action='store_true',
+                        help='Serve the requests from the response cache only, without any network request')
+    parser.add_argument('--rerun', action='store_true', help='Run the checkpointed work units again')
+    parser.add_argument('--plan', action='store_true', help='Print the work units to run without running them')
+
+
+def main(args):
+    """
+        Run the backfill command
+    :param args: The parsed arguments
+    """
+    backfill = Backfill(collectors=args.collectors, workers=args.workers, dry_run=args.dry_run,
+                        from_cache=args.from_cache, rerun=args.rerun)
+    if args.plan:
+        for unit in backfill.pending(backfill.plan(args.start_year, args.end_year, rounds=args.rounds)):
+            print(f'{unit.collector} {unit.year} {unit.round}')
+        return
+    if not backfill.run(args.start_year, args.end_year, rounds=args.rounds):
+        raise SystemExit(1)
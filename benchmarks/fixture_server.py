@@ -0,0 +1,74 @@
+import os
+import threading
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.fixtures import page_path
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        offset = int(params.get('offset', ['0'])[0])
+        target = url.path.split('/api/f1/', 1)[-1]
+
+        path = page_path(self.server.directory, target, offset)
+        if not os.path.exists(path):
+            self.server.count(0)
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        with open(path, 'rb') as page_file:
+            content = page_file.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        self.server.count(len(content))
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Local HTTP server replaying the recorded Ergast pages, paginated by their offset"""
+
+    daemon_threads = True
+
+    def __init__(self, directory, port=0):
+        super().__init__(('127.0.0.1', port), FixtureRequestHandler)
+        self.directory = directory
+        self.requests = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def prefix(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/api/f1'
+
+    def count(self, response_bytes):
+        with self.lock:
+            self.requests += 1
+            self.bytes += response_bytes
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
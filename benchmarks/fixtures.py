@@ -0,0 +1,249 @@
+import argparse
+import os
+import simplejson as json
+
+from datetime import date, datetime, timedelta
+
+# Default directory of the recorded pages
+fixtures_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Page size of the recorded pages, the one RequestsWrapper requests
+page_limit = 1000
+
+# Per round targets of the round-walking collectors
+round_targets = ('driverStandings.json', 'constructorStandings.json', 'qualifying.json', 'pitstops.json',
+                 'laps.json', 'results.json', 'sprint.json')
+
+# Targets the API also serves for a whole season, e.g. 2023/results.json
+season_targets = ('qualifying.json', 'results.json', 'sprint.json')
+
+# Keys of the rows of a race, by target
+race_keys = {'qualifying.json': 'QualifyingResults', 'pitstops.json': 'PitStops', 'results.json': 'Results',
+             'sprint.json': 'SprintResults'}
+
+
+def page_path(directory, target, offset):
+    """
+        Get the file of a recorded page
+    :param directory: The fixtures directory
+    :param target: The request target, e.g. 2023/5/laps.json
+    :param offset: The page offset
+    :return: The page file path
+    """
+    return os.path.join(directory, *target.split('/'), f'{offset}.json')
+
+
+def write_page(directory, target, offset, data):
+    write_content(directory, target, offset, json.dumps(data).encode('utf-8'))
+
+
+def write_content(directory, target, offset, content):
+    path = page_path(directory, target, offset)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as page_file:
+        page_file.write(content)
+
+
+def _lap_time(milliseconds):
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    return f'{minutes}:{milliseconds // 1000:02d}.{milliseconds % 1000:03d}'
+
+
+def _rows(year, current_round, target, drivers, laps):
+    """
+        Build the flat rows of a synthetic round, each with the key of the group it is nested in
+    :return: A list of (group key, row) tuples
+    """
+    driver_ids = [f'driver_{year}_{number}' for number in range(1, drivers + 1)]
+    constructor_ids = [f'constructor_{number}' for number in range(1, drivers // 2 + 1)]
+
+    if target == 'driverStandings.json':
+        return [(None, {'position': str(position), 'positionText': str(position), 'points': str(100 - position),
+                        'wins': '0', 'Driver': {'driverId': driver_id}, 'Constructors': []})
+                for position, driver_id in enumerate(driver_ids, start=1)]
+    if target == 'constructorStandings.json':
+        return [(None, {'position': str(position), 'positionText': str(position), 'points': str(200 - position),
+                        'wins': '0', 'Constructor': {'constructorId': constructor_id}})
+                for position, constructor_id in enumerate(constructor_ids, start=1)]
+    if target == 'qualifying.json':
+        return [(None, {'number': str(position), 'position': str(position), 'Driver': {'driverId': driver_id},
+                        'Constructor': {'constructorId': constructor_ids[(position - 1) // 2]},
+                        'Q1': _lap_time(80000 + position * 37), 'Q2': _lap_time(79000 + position * 41) if position <= 15 else '',
+                        'Q3': _lap_time(78000 + position * 43) if position <= 10 else ''})
+                for position, driver_id in enumerate(driver_ids, start=1)]
+    if target == 'pitstops.json':
+        return [(None, {'driverId': driver_id, 'lap': str(stop * 20 + position % 5), 'stop': str(stop),
+                        'time': f'14:{stop * 10 + position % 10:02d}:00', 'duration': f'2{position % 10}.{stop}45'})
+                for stop in (1, 2) for position, driver_id in enumerate(driver_ids, start=1)]
+    if target == 'laps.json':
+        return [(str(lap), {'driverId': driver_id, 'position': str(position),
+                            'time': _lap_time(81000 + lap * 7 + position * 113)})
+                for lap in range(1, laps + 1) for position, driver_id in enumerate(driver_ids, start=1)]
+    if target in ('results.json', 'sprint.json'):
+        if target == 'sprint.json' and current_round % 4:
+            return list()
+        rows = list()
+        for position, driver_id in enumerate(driver_ids, start=1):
+            result = {'number': str(position), 'position': str(position), 'positionText': str(position),
+                      'points': str(max(26 - position, 0)), 'Driver': {'driverId': driver_id},
+                      'Constructor': {'constructorId': constructor_ids[(position - 1) // 2]},
+                      'grid': str(position), 'laps': str(laps), 'status': 'Finished',
+                      'Time': {'millis': str(5400000 + position * 1234), 'time': f'+{position}.234'},
+                      'FastestLap': {'rank': str(position), 'lap': str(laps - position),
+                                     'Time': {'time': _lap_time(80000 + position * 57)},
+                                     'AverageSpeed': {'units': 'kph', 'speed': f'{220 - position}.123'}}}
+            rows.append((None, result))
+        return rows
+    raise ValueError(f'Unknown target {target}')
+
+
+def _round_page(year, current_round, target, rows, offset):
+    """
+        Build an Ergast page out of a slice of the flat rows of a round
+    :return: The page data
+    """
+    page_rows = rows[offset:offset + page_limit]
+    mr_data = {'xmlns': 'http://ergast.com/mrd/1.5', 'series': 'f1', 'url': f'http://ergast.com/api/f1/{year}/{current_round}/{target}',
+               'limit': str(page_limit), 'offset': str(offset), 'total': str(len(rows))}
+    race = {'season': str(year), 'round': str(current_round), 'raceName': f'Grand Prix {current_round}',
+            'url': f'http://en.wikipedia.org/wiki/{year}_Grand_Prix_{current_round}', 'date': f'{year}-03-01'}
+
+    if target in ('driverStandings.json', 'constructorStandings.json'):
+        key = 'DriverStandings' if target == 'driverStandings.json' else 'ConstructorStandings'
+        standings = [{'season': str(year), 'round': str(current_round), key: [row for _, row in page_rows]}]
+        mr_data['StandingsTable'] = {'season': str(year), 'round': str(current_round),
+                                     'StandingsLists': standings if page_rows else list()}
+        return {'MRData': mr_data}
+
+    if target == 'laps.json':
+        laps = list()
+        for lap, row in page_rows:
+            if not laps or laps[-1]['number'] != lap:
+                laps.append({'number': lap, 'Timings': list()})
+            laps[-1]['Timings'].append(row)
+        race['Laps'] = laps
+    else:
+        race[race_keys[target]] = [row for _, row in page_rows]
+    mr_data['RaceTable'] = {'season': str(year), 'round': str(current_round), 'Races': [race] if page_rows else list()}
+    return {'MRData': mr_data}
+
+
+def _season_page(year, target, rows, offset):
+    """
+        Build an Ergast page out of a slice of the flat rows of a season, a race may span two pages
+    :return: The page data
+    """
+    page_rows = rows[offset:offset + page_limit]
+    mr_data = {'xmlns': 'http://ergast.com/mrd/1.5', 'series': 'f1', 'url': f'http://ergast.com/api/f1/{year}/{target}',
+               'limit': str(page_limit), 'offset': str(offset), 'total': str(len(rows))}
+
+    races = list()
+    for current_round, row in page_rows:
+        if not races or races[-1]['round'] != current_round:
+            races.append({'season': str(year), 'round': current_round, 'raceName': f'Grand Prix {current_round}',
+                          'url': f'http://en.wikipedia.org/wiki/{year}_Grand_Prix_{current_round}',
+                          'date': f'{year}-03-01', race_keys[target]: list()})
+        races[-1][race_keys[target]].append(row)
+    mr_data['RaceTable'] = {'season': str(year), 'Races': races}
+    return {'MRData': mr_data}
+
+
+def generate(directory, start_year, end_year, rounds=22, drivers=20, laps=60):
+    """
+        Write synthetic pages shaped like the Ergast ones, for benchmarking without the live API
+    :param directory: The fixtures directory
+    :param start_year: The first season
+    :param end_year: The last season
+    :param rounds: The number of rounds per season
+    :param drivers: The number of drivers per round
+    :param laps: The number of laps per round
+    :return: The number of written pages
+    """
+    pages = 0
+    for year in range(start_year, end_year + 1):
+        races = [{'season': str(year), 'round': str(current_round), 'raceName': f'Grand Prix {current_round}',
+                  'url': f'http://en.wikipedia.org/wiki/{year}_Grand_Prix_{current_round}',
+                  # Dated in the first weeks of the season, so that every round has already run
+                  'date': (date(year, 1, 1) + timedelta(days=current_round)).isoformat(),
+                  'Circuit': {'circuitId': f'circuit_{current_round}'}}
+                 for current_round in range(1, rounds + 1)]
+        mr_data = {'limit': str(page_limit), 'offset': '0', 'total': str(rounds),
+                   'RaceTable': {'season': str(year), 'Races': races}}
+        write_page(directory, f'{year}/races.json', 0, {'MRData': mr_data})
+        pages += 1
+
+        for current_round in range(1, rounds + 1):
+            for target in round_targets:
+                rows = _rows(year, current_round, target, drivers, laps)
+                for offset in range(0, max(len(rows), 1), page_limit):
+                    request_target = f'{year}/{current_round}/{target}'
+                    write_page(directory, request_target, offset, _round_page(year, current_round, target, rows, offset))
+                    pages += 1
+
+        for target in season_targets:
+            rows = [(str(current_round), row) for current_round in range(1, rounds + 1)
+                    for _, row in _rows(year, current_round, target, drivers, laps)]
+            for offset in range(0, max(len(rows), 1), page_limit):
+                write_page(directory, f'{year}/{target}', offset, _season_page(year, target, rows, offset))
+                pages += 1
+    return pages
+
+
+def record(directory, start_year, end_year):
+    """
+        Record the live Ergast pages of the round-walking collectors, as the raw response bytes
+    :param directory: The fixtures directory
+    :param start_year: The first season
+    :param end_year: The last season
+    :return: The number of recorded pages
+    :raise RuntimeError: If a page could not be collected
+    """
+    from utils.paginator import Paginator
+    from utils.requests_wrapper import RequestsWrapper
+
+    request = RequestsWrapper()
+    pages = 0
+
+    def record_page(target, offset=0):
+        response = request.get(target=target, parameters={'offset': offset} if offset else None)
+        if response.status != 200 or response.content is None:
+            raise RuntimeError(f'Failed to record {target} (offset {offset}): {response.status}')
+        # The decoded page would lack the keys the typed decoder leaves out, the fixtures keep the whole pages
+        write_content(directory, target, offset, response.content)
+        return response.data['MRData']
+
+    def record_target(target):
+        offsets = Paginator.offsets(record_page(target))
+        for offset in offsets:
+            record_page(target, offset)
+        return 1 + len(offsets)
+
+    for year in range(start_year, end_year + 1):
+        pages += record_target(f'{year}/races.json')
+        with open(page_path(directory, f'{year}/races.json', 0), encoding='utf-8') as races_file:
+            rounds = int(json.load(races_file)['MRData']['total'])
+        for current_round in range(1, rounds + 1):
+            for target in round_targets:
+                pages += record_target(f'{year}/{current_round}/{target}')
+        for target in season_targets:
+            pages += record_target(f'{year}/{target}')
+    request.close()
+    return pages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate or record the Ergast pages replayed by the benchmarks')
+    parser.add_argument('mode', choices=('generate', 'record'))
+    parser.add_argument('--directory', default=fixtures_directory)
+    parser.add_argument('--start-year', type=int, default=datetime.now().year - 1)
+    parser.add_argument('--end-year', type=int, default=datetime.now().year)
+    parser.add_argument('--rounds', type=int, default=22)
+    parser.add_argument('--drivers', type=int, default=20)
+    parser.add_argument('--laps', type=int, default=60)
+    args = parser.parse_args()
+
+    if args.mode == 'generate':
+        written = generate(args.directory, args.start_year, args.end_year, args.rounds, args.drivers, args.laps)
+    else:
+        written = record(args.directory, args.start_year, args.end_year)
+    print(f'Pages: {written}')
@@ -0,0 +1,85 @@
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+# Modules that the DAG parsing and the command line parsing must not import
+heavy_modules = ('f1', 'pyodbc', 'requests', 'simplejson', 'tabulate', 'httpx', 'urllib3', 'asyncio',
+                 'utils.requests_wrapper', 'utils.azure_wrapper')
+
+# The modules the DAG file may import at its top level, the standard library aside
+dag_modules = ('airflow', 'registry')
+
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module):
+    """
+        Import a module in a fresh interpreter
+    :param module: The module name
+    :return: The cumulative import microseconds of the module and the names of all the imported modules
+    """
+    code = f'import sys, {module}; print(",".join(sorted(sys.modules)))'
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=root_directory,
+                             capture_output=True, text=True, check=True)
+    cumulative = 0
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative = int(fields[1])
+    return cumulative, set(process.stdout.strip().split(','))
+
+
+def dag_imports(path):
+    """
+        Get the top-level imports of the DAG file, without importing it nor Airflow
+    :param path: The DAG file path
+    :return: The imported module names
+    """
+    with open(path, 'r', encoding='utf-8') as dag_file:
+        tree = ast.parse(dag_file.read())
+    modules = list()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules.append(node.module)
+    return modules
+
+
+def check(budget_ms):
+    """
+        Check that the DAG and the command line start without the heavy modules and within the budget
+    :param budget_ms: The import time budget of each lightweight module, in milliseconds
+    :return: The violations
+    """
+    violations = list()
+    for module in ('registry', 'runner', 'backfill', 'benchmarks.profiling'):
+        cumulative, modules = measure(module)
+        heavy = sorted(modules.intersection(heavy_modules))
+        print(f'{module}: {cumulative / 1000:.1f} ms')
+        if heavy:
+            violations.append(f'{module} imports {", ".join(heavy)}')
+        if cumulative > budget_ms * 1000:
+            violations.append(f'{module} takes {cumulative / 1000:.1f} ms to import, over {budget_ms} ms')
+
+    for module in dag_imports(os.path.join(root_directory, 'airflow_init.py')):
+        top_module = module.split('.')[0]
+        if top_module not in dag_modules and top_module not in sys.stdlib_module_names:
+            violations.append(f'airflow_init imports {module} at its top level')
+    return violations
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the import time of the DAG and the command line')
+    parser.add_argument('--budget-ms', type=float, default=50, help='The import time budget of each module')
+    args = parser.parse_args()
+
+    failures = check(args.budget_ms)
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        raise SystemExit(1)
+    print('OK')
@@ -0,0 +1,116 @@
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import tempfile
+
+from registry import load_collector, round_collectors
+
+
+def profile(name, season, output_directory, top=25, sort='cumulative', sampler=False, interval=0.005,
+            replay=False, prefix=None, use_async=False):
+    """
+        Run a collector over a single season under a profiler, storing its rows in a fresh SQLite database
+    :param name: The collector class name
+    :param season: The season
+    :param output_directory: The directory of the profile files
+    :param top: The number of functions of the hot function report
+    :param sort: The pstats sort key of the cProfile report
+    :param sampler: Profile with the sampling profiler instead of cProfile
+    :param interval: The seconds between two samples of the sampling profiler
+    :param replay: Serve the pages from the F1_ARCHIVE_DIR archive instead of the response cache and the API
+    :param prefix: The API prefix, e.g. of a fixture server
+    :param use_async: Fetch the round pages with the async client
+    :return: The paths of the written profile files
+    """
+    # Imported here, so that adding the profile command to the command line does not load the collectors
+    from tabulate import tabulate
+    from benchmarks.sqlite_db import SQLiteDBWrapper
+    from utils.async_requests_wrapper import AsyncRequestsWrapper
+    from utils.profiler import SamplingProfiler
+    from utils.requests_wrapper import RequestsWrapper
+    from utils.response_archive import ResponseArchive
+
+    directory = tempfile.mkdtemp(prefix='f1_profile_')
+    azure_db = SQLiteDBWrapper(os.path.join(directory, 'f1.sqlite'))
+    azure_db.seed(season)
+
+    archive = None
+    if replay:
+        archive = ResponseArchive(directory=os.environ.get('F1_ARCHIVE_DIR'), replay=True)
+    request = RequestsWrapper(archive=archive)
+    async_request = AsyncRequestsWrapper(archive=archive) if use_async else None
+    if prefix:
+        request.prefix = prefix
+        if async_request:
+            async_request.prefix = prefix
+    collector = load_collector(name)(request=request, azure_db=azure_db, async_request=async_request)
+    collector.end_year = season
+
+    os.makedirs(output_directory, exist_ok=True)
+    path = os.path.join(output_directory, f'{name}_{season}')
+    report = io.StringIO()
+    try:
+        if sampler:
+            with SamplingProfiler(interval=interval) as sampling_profiler:
+                collector.run()
+            sampling_profiler.write_folded(f'{path}.folded')
+            report.write(f'{sampling_profiler.samples} samples every {interval}s, idle threads left out\n')
+            report.write(tabulate(sampling_profiler.top(limit=top), tablefmt='psql',
+                                  headers=('function', 'own samples', 'own share', 'samples on stack')))
+            paths = [f'{path}.folded', f'{path}.txt']
+        else:
+            # cProfile only traces the main thread, the request threads are covered by the sampling profiler
+            profiler = cProfile.Profile()
+            profiler.runcall(collector.run)
+            profiler.dump_stats(f'{path}.prof')
+            pstats.Stats(profiler, stream=report).strip_dirs().sort_stats(sort).print_stats(top)
+            paths = [f'{path}.prof', f'{path}.txt']
+    finally:
+        request.close()
+        if async_request:
+            async_request.close()
+        if archive:
+            archive.close()
+        azure_db.close()
+
+    with open(f'{path}.txt', 'w', encoding='utf-8') as report_file:
+        report_file.write(report.getvalue())
+    print(report.getvalue())
+    return paths
+
+
+def add_arguments(parser):
+    """
+        Add the arguments of the profile command
+    :param parser: The argument parser
+    """
+    parser.add_argument('collector', choices=round_collectors, help='The collector to profile')
+    parser.add_argument('--season', type=int, required=True, help='The season to collect')
+    parser.add_argument('--output', default='profiles', help='The directory of the profile files')
+    parser.add_argument('--top', type=int, default=25, help='The number of functions of the hot function report')
+    parser.add_argument('--sort', default='cumulative', help='The pstats sort key, e.g. cumulative or tottime')
+    parser.add_argument('--sampler', action='store_true', help='Sample the stacks of every thread instead of cProfile')
+    parser.add_argument('--interval', type=float, default=0.005, help='The seconds between two samples')
+    parser.add_argument('--replay', action='store_true', help='Serve the pages from the F1_ARCHIVE_DIR archive')
+    parser.add_argument('--prefix', help='The API prefix, e.g. of a local fixture server')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='Fetch with the async client')
+
+
+def main(args):
+    """
+        Run the profile command
+    :param args: The parsed arguments
+    """
+    if args.replay and not os.environ.get('F1_ARCHIVE_DIR'):
+        raise SystemExit('--replay needs F1_ARCHIVE_DIR')
+    paths = profile(args.collector, args.season, args.output, top=args.top, sort=args.sort, sampler=args.sampler,
+                    interval=args.interval, replay=args.replay, prefix=args.prefix, use_async=args.use_async)
+    print(f'Profile: {", ".join(paths)}')
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(description='Profile a collector over a single season')
+    add_arguments(argument_parser)
+    main(argument_parser.parse_args())
@@ -0,0 +1,139 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from datetime import datetime
+from functools import wraps
+from tabulate import tabulate
+
+import f1
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.fixtures import fixtures_directory, generate
+from benchmarks.sqlite_db import SQLiteDBWrapper
+from utils.async_requests_wrapper import AsyncRequestsWrapper
+from utils.requests_wrapper import RequestsWrapper
+
+# Round-walking collectors with their collect/store methods and table
+collectors = {
+    'DriverStandingsCollector': ('_collect_driver_standings_data', '_store_driver_standings_data', 'driver_standings'),
+    'ConstructorStandingsCollector': ('_collect_constructor_standings_data', '_store_constructor_standings_data',
+                                      'constructor_standings'),
+    'QualifyingCollector': ('_collect_qualifying_data', '_store_qualifying_data', 'qualifying'),
+    'PitStopsCollector': ('_collect_pit_stops_data', '_store_pit_stops_data', 'pit_stops'),
+    'LapTimesCollector': ('_collect_laps_data', '_store_laps_data', 'lap_times'),
+    'ResultsCollector': ('_collect_results_data', '_store_results_data', 'results'),
+    'SprintResultsCollector': ('_collect_sprint_results_data', '_store_sprint_results_data', 'sprint_results'),
+}
+
+
+def timed_requests(request):
+    """
+        Accumulate the time spent waiting on the requests of a wrapper
+    :param request: The requests wrapper
+    :return: A dict holding the accumulated seconds
+    """
+    timings = {'seconds': 0.0}
+    get = request.get
+
+    @wraps(get)
+    def timed_get(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return get(*args, **kwargs)
+        finally:
+            timings['seconds'] += time.perf_counter() - start
+
+    request.get = timed_get
+    return timings
+
+
+def benchmark(name, server, start_year, trace_memory=True, use_async=False):
+    """
+        Run a collector against the fixture server and a fresh SQLite database
+    :param name: The collector class name
+    :param server: The fixture server
+    :param start_year: The first season
+    :param trace_memory: Trace the peak memory, which slows down the parsing
+    :param use_async: Fetch the round pages with the async client
+    :return: The benchmark report row
+    """
+    collect_method, store_method, table_name = collectors[name]
+    directory = tempfile.mkdtemp(prefix='f1_benchmark_')
+    azure_db = SQLiteDBWrapper(os.path.join(directory, 'f1.sqlite'))
+    azure_db.seed(start_year)
+
+    request = RequestsWrapper(cache=False, rate_limiter=False)
+    request.prefix = server.prefix
+    request_timings = timed_requests(request)
+    async_request = None
+    if use_async:
+        async_request = AsyncRequestsWrapper(cache=False, rate_limiter=False)
+        async_request.prefix = server.prefix
+    collector = getattr(f1, name)(request=request, azure_db=azure_db, async_request=async_request)
+    server.reset()
+
+    if trace_memory:
+        tracemalloc.start()
+    stages = dict()
+    start = time.perf_counter()
+    collector._populate_env()
+    stages['populate'] = time.perf_counter() - start
+
+    stage_start = time.perf_counter()
+    getattr(collector, collect_method)()
+    stages['collect'] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    getattr(collector, store_method)()
+    stages['store'] = time.perf_counter() - stage_start
+    total = time.perf_counter() - start
+
+    peak_memory = None
+    if trace_memory:
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    request.close()
+    if async_request:
+        async_request.close()
+    azure_db.close()
+    rows = azure_db.count(table_name)
+
+    return {
+        'collector': name,
+        'rows': rows,
+        'requests': server.requests,
+        'MB received': round(server.bytes / 1024 ** 2, 1),
+        'seconds': round(total, 2),
+        'rows/s': round(rows / total),
+        'requests/s': round(server.requests / total),
+        'peak MB': round(peak_memory / 1024 ** 2, 1) if peak_memory is not None else None,
+        'populate s': round(stages['populate'], 3),
+        'collect s': round(stages['collect'], 3),
+        'request wait s': round(request_timings['seconds'], 3),
+        'store s': round(stages['store'], 3),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the collectors against recorded Ergast pages')
+    parser.add_argument('collectors', nargs='*', default=list(collectors), help='The collectors to benchmark')
+    parser.add_argument('--directory', default=fixtures_directory, help='The directory of the recorded pages')
+    parser.add_argument('--start-year', type=int, default=datetime.now().year - 1)
+    parser.add_argument('--generate', action='store_true', help='Generate synthetic pages up to the current season')
+    parser.add_argument('--no-memory', action='store_true', help='Skip tracing the peak memory')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='Fetch with the async client')
+    args = parser.parse_args()
+
+    if args.generate:
+        generate(args.directory, args.start_year, datetime.now().year)
+
+    fixture_server = FixtureServer(args.directory).start()
+    try:
+        report = [benchmark(name, fixture_server, args.start_year, trace_memory=not args.no_memory,
+                            use_async=args.use_async)
+                  for name in args.collectors]
+    finally:
+        fixture_server.stop()
+    print(tabulate(report, headers='keys', tablefmt='psql'))
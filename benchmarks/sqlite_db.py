@@ -0,0 +1,148 @@
+import sqlite3
+
+from utils.azure_wrapper import AzureDBWrapper
+from utils.checkpoint_store import CheckpointStore
+from utils.watermark_store import WatermarkStore
+
+# Columns of the tables written by the round-walking collectors, besides their identity column
+tables = {
+    'driver_standings': ('driver_id', 'points', 'position', 'wins', 'year', 'round'),
+    'constructor_standings': ('constructor_id', 'points', 'position', 'wins', 'year', 'round'),
+    'qualifying': ('driver_id', 'constructor_id', 'year', 'round', 'number', 'position', 'q1', 'q2', 'q3'),
+    'pit_stops': ('driver_id', 'stop', 'lap', 'time', 'duration', 'milliseconds', 'year', 'round'),
+    'lap_times': ('driver_id', 'lap', 'position', 'time', 'milliseconds', 'year', 'round'),
+    'results': ('driver_id', 'constructor_id', 'number', 'grid', 'position', 'points', 'laps', 'milliseconds',
+                'fastest_lap', 'rank', 'fastest_lap_time', 'fastest_lap_speed', 'status_id', 'year', 'round'),
+    'sprint_results': ('driver_id', 'constructor_id', 'number', 'grid', 'position', 'points', 'laps', 'milliseconds',
+                       'fastest_lap', 'fastest_lap_time', 'status_id', 'year', 'round'),
+}
+
+
+class SQLiteWatermarkStore(WatermarkStore):
+    """WatermarkStore with the SQLite dialect of its statements"""
+
+    create_query = f"""
+        CREATE TABLE IF NOT EXISTS {WatermarkStore.table_name} (
+            collector  TEXT    NOT NULL PRIMARY KEY,
+            year       INTEGER NOT NULL,
+            round      INTEGER NOT NULL,
+            row_offset INTEGER NOT NULL,
+            updated_at TEXT    NOT NULL
+        );
+    """
+
+    update_query = f"""
+        INSERT INTO {WatermarkStore.table_name} (collector, year, round, row_offset, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (collector) DO UPDATE SET year = excluded.year, round = excluded.round,
+                                              row_offset = excluded.row_offset, updated_at = excluded.updated_at
+        WHERE excluded.year > year OR (excluded.year = year AND excluded.round >= round);
+    """
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """CheckpointStore with the SQLite dialect of its statements"""
+
+    create_query = f"""
+        CREATE TABLE IF NOT EXISTS {CheckpointStore.table_name} (
+            collector    TEXT    NOT NULL,
+            year         INTEGER NOT NULL,
+            round        INTEGER NOT NULL,
+            completed_at TEXT    NOT NULL,
+            PRIMARY KEY (collector, year, round)
+        );
+    """
+
+    update_query = f"""
+        INSERT INTO {CheckpointStore.table_name} (collector, year, round, completed_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (collector, year, round) DO UPDATE SET completed_at = excluded.completed_at;
+    """
+
+
+class SQLiteCursor:
+    """The subset of the pyodbc cursor used by AzureDBWrapper, on top of SQLite"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.fast_executemany = False
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    def columns(self, table):
+        # Same layout as the pyodbc rows: the column name is the 4th item and the type name the 6th
+        return [(None, None, table, name, 0, 'int identity' if primary_key else (column_type or 'varchar'), 0, 0, 0)
+                for _, name, column_type, _, _, primary_key in self.cursor.execute(f'PRAGMA table_info({table})')]
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def execute(self, query, *parameters):
+        # pyodbc takes the parameters as positional arguments, SQLite as a sequence
+        self.cursor.execute(query, parameters)
+        return self
+
+    def executemany(self, query, rows):
+        self.cursor.executemany(query, rows)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self.cursor.fetchmany(size)
+
+
+class SQLiteConnection:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=60)
+
+    def cursor(self):
+        return SQLiteCursor(self.connection.cursor())
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+
+class SQLiteDBWrapper(AzureDBWrapper):
+    """AzureDBWrapper stand-in storing to a SQLite file, so that the real insert path is benchmarked"""
+
+    watermark_store = SQLiteWatermarkStore
+    checkpoint_store = SQLiteCheckpointStore
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        with sqlite3.connect(path) as conn:
+            for table_name, columns in tables.items():
+                # The year and round are INT columns in the Azure database too, so that they compare as numbers
+                definitions = [f'{column} INTEGER' if column in ('year', 'round') else column for column in columns]
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} "
+                             f"(id INTEGER PRIMARY KEY, {', '.join(definitions)})")
+
+    def connect(self):
+        return SQLiteConnection(self.path)
+
+    def seed(self, start_year):
+        """
+            Add a round 0 row to every table, so that the collectors start from the first round of a season
+        :param start_year: The season
+        """
+        with sqlite3.connect(self.path) as conn:
+            for table_name in tables:
+                conn.execute(f'INSERT INTO {table_name} (year, round) VALUES (?, 0)', (start_year,))
+
+    def count(self, table_name):
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM {table_name} WHERE round > 0').fetchone()[0]
@@ -1,25 +1,45 @@
+import os
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
 from pprint import pprint, pformat
+from registry import collector_dependencies
 from utils.requests_wrapper import RequestsWrapper
 from utils.azure_wrapper import AzureDBWrapper
-from datetime import datetime
-from utils.utils import get_years_between
-from decimal import Decimal
+from datetime import date, datetime
+from utils.column_buffer import ColumnBuffer
+from utils.key_index import KeyIndex
+from utils.metrics import Metrics, collected, timed
+from utils.paginator import Paginator
+from utils.stream_writer import StreamWriter
+from utils.row_mapping import RowMapping
+from utils.utils import get_years_between, durations_to_milliseconds, last_past_round, to_integers, to_dates
 
 # Base URL of the Ergast API
 base_url = 'https://ergast.com/api/f1'
 
 
 class Season(object):
+    __slots__ = ('year', 'url')
+    mapping = RowMapping(rows=('SeasonTable.Seasons',), fields={'year': 'season', 'url': 'url'})
+
     def __init__(self):
         self.year = None
         self.url = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class Driver(object):
+    __slots__ = ('driver_id', 'number', 'code', 'forename', 'surname', 'date_of_birth', 'nationality', 'url')
+    mapping = RowMapping(rows=('DriverTable.Drivers',),
+                         fields={'driver_id': 'driverId', 'number': 'permanentNumber?', 'code': 'code?',
+                                 'forename': 'givenName', 'surname': 'familyName', 'date_of_birth': 'dateOfBirth',
+                                 'nationality': 'nationality', 'url': 'url'})
+
     def __init__(self):
         self.driver_id = None
         self.number = None
@@ -31,10 +51,15 @@ class Driver(object):
         self.url = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class Constructor(object):
+    __slots__ = ('constructor_id', 'name', 'nationality', 'url')
+    mapping = RowMapping(rows=('ConstructorTable.Constructors',),
+                         fields={'constructor_id': 'constructorId', 'name': 'name', 'nationality': 'nationality',
+                                 'url': 'url'})
+
     def __init__(self):
         self.constructor_id = None
         self.name = None
@@ -42,19 +67,28 @@ class Constructor(object):
         self.url = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class Status(object):
+    __slots__ = ('id', 'status')
+    mapping = RowMapping(rows=('StatusTable.Status',), fields={'id': 'statusId', 'status': 'status'})
+
     def __init__(self):
         self.id = None
         self.status = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class Circuit(object):
+    __slots__ = ('circuit_id', 'name', 'location', 'country', 'latitude', 'longitude', 'altitude', 'url')
+    mapping = RowMapping(rows=('CircuitTable.Circuits',),
+                         fields={'circuit_id': 'circuitId', 'name': 'circuitName', 'location': 'Location.locality',
+                                 'country': 'Location.country', 'latitude': 'Location.lat',
+                                 'longitude': 'Location.long', 'url': 'url'})
+
     def __init__(self):
         self.circuit_id = None
         self.name = None
@@ -66,10 +100,16 @@ class Circuit(object):
         self.url = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class Race(object):
+    __slots__ = ('year', 'round', 'circuit_id', 'name', 'date', 'time', 'url')
+    mapping = RowMapping(rows=('RaceTable.Races',),
+                         fields={'year': 'season', 'round': 'round', 'circuit_id': 'Circuit.circuitId',
+                                 'name': 'raceName', 'date': 'date', 'url': 'url'},
+                         converters={'date': to_dates})
+
     def __init__(self):
         self.year = None
         self.round = None
@@ -80,10 +120,15 @@ class Race(object):
         self.url = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class DriverStandings(object):
+    __slots__ = ('driver_id', 'points', 'position', 'wins', 'year', 'round')
+    mapping = RowMapping(rows=('StandingsTable.StandingsLists', 'DriverStandings'),
+                         fields={'driver_id': 'Driver.driverId', 'points': 'points', 'position': 'position',
+                                 'wins': 'wins', 'year': 'StandingsLists:season', 'round': 'StandingsLists:round'})
+
     def __init__(self):
         self.driver_id = None
         self.points = None
@@ -93,10 +138,16 @@ class DriverStandings(object):
         self.round = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class ConstructorStandings(object):
+    __slots__ = ('constructor_id', 'points', 'position', 'wins', 'year', 'round')
+    mapping = RowMapping(rows=('StandingsTable.StandingsLists', 'ConstructorStandings'),
+                         fields={'constructor_id': 'Constructor.constructorId', 'points': 'points',
+                                 'position': 'position', 'wins': 'wins', 'year': 'StandingsLists:season',
+                                 'round': 'StandingsLists:round'})
+
     def __init__(self):
         self.constructor_id = None
         self.points = None
@@ -106,10 +157,18 @@ class ConstructorStandings(object):
         self.round = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class Qualifying(object):
+    __slots__ = ('driver_id', 'constructor_id', 'year', 'round', 'number', 'position', 'q1', 'q2', 'q3')
+    mapping = RowMapping(rows=('RaceTable.Races', 'QualifyingResults'),
+                         fields={'constructor_id': 'Constructor.constructorId', 'driver_id': 'Driver.driverId',
+                                 'number': 'number', 'position': 'position', 'q1': 'Q1?', 'q2': 'Q2?', 'q3': 'Q3?',
+                                 'year': 'Races:season', 'round': 'Races:round'},
+                         converters={'q1': durations_to_milliseconds, 'q2': durations_to_milliseconds,
+                                     'q3': durations_to_milliseconds})
+
     def __init__(self):
         self.driver_id = None
         self.constructor_id = None
@@ -122,10 +181,16 @@ class Qualifying(object):
         self.q3 = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class PitStop(object):
+    __slots__ = ('driver_id', 'stop', 'lap', 'time', 'duration', 'milliseconds', 'year', 'round')
+    mapping = RowMapping(rows=('RaceTable.Races', 'PitStops'),
+                         fields={'driver_id': 'driverId', 'duration': 'duration', 'lap': 'lap', 'stop': 'stop',
+                                 'time': 'time', 'year': 'Races:season', 'round': 'Races:round'},
+                         converters={'milliseconds': (durations_to_milliseconds, 'duration')})
+
     def __init__(self):
         self.driver_id = None
         self.stop = None
@@ -137,10 +202,16 @@ class PitStop(object):
         self.round = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class LapTime(object):
+    __slots__ = ('driver_id', 'lap', 'position', 'time', 'milliseconds', 'year', 'round')
+    mapping = RowMapping(rows=('RaceTable.Races', 'Laps', 'Timings'),
+                         fields={'driver_id': 'driverId', 'position': 'position', 'time': 'time',
+                                 'lap': 'Laps:number', 'year': 'Races:season', 'round': 'Races:round'},
+                         converters={'milliseconds': (durations_to_milliseconds, 'time')})
+
     def __init__(self):
         self.driver_id = None
         self.lap = None
@@ -151,10 +222,21 @@ class LapTime(object):
         self.round = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class Result(object):
+    __slots__ = ('driver_id', 'constructor_id', 'number', 'grid', 'position', 'points', 'laps', 'milliseconds', 'fastest_lap', 'rank', 'fastest_lap_time', 'fastest_lap_speed', 'status_id', 'year', 'round')
+    mapping = RowMapping(rows=('RaceTable.Races', 'Results'),
+                         fields={'driver_id': 'Driver.driverId', 'constructor_id': 'Constructor.constructorId',
+                                 'number': 'number', 'grid': 'grid', 'position': 'position', 'points': 'points',
+                                 'laps': 'laps', 'status_id': 'status', 'milliseconds': 'Time.millis?',
+                                 'fastest_lap': 'FastestLap.lap?', 'rank': 'FastestLap.rank?',
+                                 'fastest_lap_speed': 'FastestLap.AverageSpeed.speed?',
+                                 'fastest_lap_time': 'FastestLap.Time.time?',
+                                 'year': 'Races:season', 'round': 'Races:round'},
+                         converters={'milliseconds': to_integers, 'fastest_lap_time': durations_to_milliseconds})
+
     def __init__(self):
         self.driver_id = None
         self.constructor_id = None
@@ -173,10 +255,19 @@ class Result(object):
         self.round = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class SprintResult(object):
+    __slots__ = ('driver_id', 'constructor_id', 'number', 'grid', 'position', 'points', 'laps', 'milliseconds', 'fastest_lap', 'fastest_lap_time', 'status_id', 'year', 'round')
+    mapping = RowMapping(rows=('RaceTable.Races', 'SprintResults'),
+                         fields={'driver_id': 'Driver.driverId', 'constructor_id': 'Constructor.constructorId',
+                                 'number': 'number', 'grid': 'grid', 'position': 'position', 'points': 'points',
+                                 'laps': 'laps', 'status_id': 'status', 'milliseconds': 'Time.millis?',
+                                 'fastest_lap': 'FastestLap.lap?', 'fastest_lap_time': 'FastestLap.Time.time?',
+                                 'year': 'Races:season', 'round': 'Races:round'},
+                         converters={'milliseconds': to_integers, 'fastest_lap_time': durations_to_milliseconds})
+
     def __init__(self):
         self.driver_id = None
         self.constructor_id = None
@@ -193,27 +284,354 @@ class SprintResult(object):
         self.round = None
 
     def __repr__(self):
-        return pformat(vars(self), indent=2, width=1)
+        return pformat({slot: getattr(self, slot) for slot in self.__slots__}, indent=2, width=1)
 
 
 class F1DataCollector(object):
-    def __init__(self):
+    # Maximum number of concurrent requests of the round-walking collectors
+    concurrency = int(os.environ.get('F1_CONCURRENCY', 8))
+    # Number of rows after which the round-walking collectors store their rows, 0 to store them at the end
+    stream_rows = int(os.environ.get('F1_STREAM_ROWS', 0))
+    # Number of rounds fetched ahead of the consumer by the async client
+    async_window = int(os.environ.get('F1_ASYNC_WINDOW', 64))
+    # 'auto' to fetch a whole season per request where it takes fewer requests than its rounds, 'round' or 'season'
+    fetch_strategy = os.environ.get('F1_FETCH_STRATEGY', 'auto')
+    # Number of rows per page the requests wrapper asks for
+    page_size = 1000
+    # Whether the API serves the target of a whole season, e.g. 2023/results.json
+    season_pages = False
+    # Expected number of rows of a round
+    rows_per_round = 0
+    # 'upsert' to merge the rows on their natural keys, so that re-ingesting a round is safe, or 'insert'
+    write_mode = os.environ.get('DB_WRITE_MODE', 'insert')
+    # The natural key columns of the collector table
+    key_columns = ()
+    # The stage timed by the metrics of each method name prefix
+    stages = {'_populate_env': 'populate', '_collect_': 'collect', '_store_': 'store'}
+
+    def __init_subclass__(cls, **kwargs):
+        """Time the stages of the collectors and label the metrics recorded while they run"""
+        super().__init_subclass__(**kwargs)
+        for name, method in list(vars(cls).items()):
+            if not callable(method):
+                continue
+            if name == 'run':
+                setattr(cls, name, collected(method))
+            for prefix, stage in cls.stages.items():
+                if name.startswith(prefix):
+                    setattr(cls, name, timed(stage)(method))
+
+    def __init__(self, request=None, azure_db=None, async_request=None):
+        """
+            Initialize the collector
+        :param request: A requests wrapper to share its connection pool across collectors
+        :param azure_db: A database wrapper to share its connection pool across collectors
+        :param async_request: An async requests wrapper fetching the round pages from its event loop instead of threads
+        """
         self.entity = self.__class__.__base__.__name__
-        self.request = RequestsWrapper()
-        self.azure_db = AzureDBWrapper()
+        self.request = request or RequestsWrapper()
+        self.async_request = async_request
+        self.paginator = Paginator(request=self.request, async_request=async_request, concurrency=self.concurrency)
+        self.azure_db = azure_db or AzureDBWrapper()
+        self.watermarks = self.azure_db.watermark_store(self.azure_db)
+        self.merge_keys = self.key_columns if self.write_mode == 'upsert' else None
 
         self.env = dict()
+        self.streams = list()
+        self.key_indexes = list()
+        # The first and last rounds the round-walking collectors collect, from the round following their
+        # watermark to the last round of the current season by default
+        self.start_year = None
+        self.start_round = None
+        self.end_year = None
+        self.end_round = None
 
     def __repr__(self):
         return f'{self.__class__.__name__}'
 
+    def _get_watermark(self):
+        """
+            Get the last ingested round of the collector, a single key lookup instead of a MAX() scan
+        :return: The year and round or None if the collector has no watermark yet
+        """
+        if self.start_year:
+            # An explicit range starts right after the round preceding it, whatever has been ingested so far
+            return {'year': self.start_year, 'round': (self.start_round or 1) - 1}
+        watermark = self.watermarks.get(self.__class__.__name__)
+        if watermark:
+            return {'year': watermark['year'], 'round': watermark['round']}
+        return None
+
+    def _watermark_statements(self, data):
+        """
+            Build the watermark update of the rows about to be inserted
+        :param data: The column buffer, in year and round order
+        :return: The statements to run in the transaction of the insert, none for an explicit range
+        """
+        if not len(data) or self.start_year or self.end_year:
+            # A bounded run, e.g. a backfill unit, must not move the watermark the regular runs resume from
+            return list()
+
+        years, rounds = data.column('year'), data.column('round')
+        year, current_round = years[-1], rounds[-1]
+        offset = 0
+        for index in range(len(data) - 1, -1, -1):
+            if years[index] != year or rounds[index] != current_round:
+                break
+            offset += 1
+        return [self.watermarks.statement(collector=self.__class__.__name__, year=int(year), round=int(current_round),
+                                          offset=offset)]
+
+    def _get_key_index(self, table_name, columns, since=None):
+        """
+            Load the keys stored in a table into a key index
+        :param table_name: The table name
+        :param columns: The key columns
+        :param since: The year and round from which the keys of a round-walking collector table are loaded
+        :return: The key index, without the stored keys for an upsert
+        """
+        if self.merge_keys:
+            # An upsert updates the stored rows instead of skipping them, only the collected rows are de-duplicated
+            keys = KeyIndex(columns=columns)
+            self.key_indexes.append(keys)
+            return keys
+
+        conditions, parameters = list(), ()
+        if since:
+            conditions.append(f'({table_name}.year > ? OR ({table_name}.year = ? AND {table_name}.round >= ?))')
+            parameters += (since['year'], since['year'], since['round'])
+            # A range ending before the current season, e.g. a backfill work unit, needs none of the later keys
+            if self.end_year and self.end_round:
+                conditions.append(f'({table_name}.year < ? OR ({table_name}.year = ? AND {table_name}.round <= ?))')
+                parameters += (self.end_year, self.end_year, self.end_round)
+            elif self.end_year:
+                conditions.append(f'{table_name}.year <= ?')
+                parameters += (self.end_year,)
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+
+        count_raw = self.azure_db.select(query=f'SELECT COUNT(*) AS total FROM {table_name} {where};',
+                                         parameters=parameters)
+        capacity = int(count_raw[0]['total']) if count_raw else 0
+
+        def confirm(key):
+            # Bloom filter hits are confirmed with a lookup of the key
+            condition = ' AND '.join(f'{table_name}.{column} = ?' for column in columns)
+            rows = self.azure_db.select(query=f'SELECT COUNT(*) AS total FROM {table_name} WHERE {condition};',
+                                        parameters=key)
+            return bool(rows and rows[0]['total'])
+
+        keys = KeyIndex(columns=columns, capacity=capacity, confirm=confirm)
+        self.key_indexes.append(keys)
+        key_columns = ', '.join(f'{table_name}.{column}' for column in columns)
+        keys.update(self.azure_db.iterate(query=f'SELECT {key_columns} FROM {table_name} {where};',
+                                          parameters=parameters))
+        return keys
+
+    def _get_season_rounds(self, year):
+        """
+            Get the number of rounds of a season that have already run, from its races
+        :param year: The season
+        :return: The number of rounds
+        :raise RuntimeError: If the races could not be collected
+        """
+        response = self.request.get(target=f'{year}/races.json')
+        if response.status == 200:
+            # The rounds of the calendar that have not run yet have no rows to collect
+            return last_past_round(response.data['MRData']['RaceTable']['Races'])
+        Metrics.shared().increment('page_failures')
+        raise RuntimeError(f'Failed to collect the rounds of {year}: {response.status}')
+
+    async def _get_season_rounds_async(self, year):
+        """
+            Get the number of rounds of a season that have already run, from its races, with the async client
+        :param year: The season
+        :return: The number of rounds
+        :raise RuntimeError: If the races could not be collected
+        """
+        response = await self.async_request.get(target=f'{year}/races.json')
+        if response.status == 200:
+            # The rounds of the calendar that have not run yet have no rows to collect
+            return last_past_round(response.data['MRData']['RaceTable']['Races'])
+        Metrics.shared().increment('page_failures')
+        raise RuntimeError(f'Failed to collect the rounds of {year}: {response.status}')
+
+    def _fetch_by_season(self):
+        """
+            Pick the fetch granularity of the target
+        :return: True to fetch the target a season at a time, False to fetch it a round at a time
+        """
+        if not self.season_pages or self.fetch_strategy == 'round':
+            return False
+        if self.end_round and (self.start_year, self.start_round) == (self.end_year, self.end_round):
+            # A single round, e.g. a backfill work unit, is a single round request
+            return False
+        # A season of N rounds takes about N * rows_per_round / page_size requests instead of N
+        return self.fetch_strategy == 'season' or self.rows_per_round < self.page_size
+
+    @staticmethod
+    def _skip_rounds(mr_data, start_year, start_round, end_year=None, end_round=None):
+        """
+            Drop the races of a season page that precede the first round or follow the last round to collect
+        :param mr_data: The page MRData
+        :param start_year: The first season
+        :param start_round: The first round of the first season
+        :param end_year: The last season
+        :param end_round: The last round of the last season, None for all of them
+        :return: The page MRData
+        """
+        race_table = mr_data['RaceTable']
+        race_table['Races'] = [race for race in race_table['Races']
+                               if (int(race['season']) > start_year or int(race['round']) >= start_round)
+                               and (not end_round or int(race['season']) < end_year
+                                    or int(race['round']) <= end_round)]
+        return mr_data
+
+    def _get_round_targets(self, years, season_rounds, start_year, start_round):
+        """
+            Build the round targets to fetch
+        :param years: The seasons
+        :param season_rounds: The number of rounds of each season
+        :param start_year: The first season
+        :param start_round: The first round of the first season
+        :return: The targets, in year and round order
+        """
+        targets = list()
+        for year, rounds in zip(years, season_rounds):
+            first_round = start_round if year == start_year else 1
+            if self.end_round and year == years[-1]:
+                rounds = min(rounds, self.end_round)
+            for current_round in range(first_round, rounds + 1):
+                targets.append(f'{year}/{current_round}/{self.target}')
+        return targets
+
+    def _fetch_pages_async(self, start_year, start_round, by_season):
+        """
+            Fetch every page of the target from the event loop of the async client
+        :param start_year: The first season
+        :param start_round: The first round of the first season
+        :param by_season: Fetch the target a season at a time
+        :return: A generator of the MRData of every page, in year, round and offset order
+        """
+        years = get_years_between(start_year, self.end_year or datetime.now().year)
+        submit = self.async_request.submit
+        if by_season:
+            targets = [f'{year}/{self.target}' for year in years]
+        else:
+            season_rounds = [future.result() for future in [submit(self._get_season_rounds_async(year))
+                                                            for year in years]]
+            targets = self._get_round_targets(years, season_rounds, start_year, start_round)
+
+        pending_targets = iter(targets)
+        window = deque(submit(self.paginator.pages_async(target))
+                       for target in islice(pending_targets, self.async_window))
+        try:
+            while window:
+                pages = window.popleft().result()
+                for target in islice(pending_targets, 1):
+                    window.append(submit(self.paginator.pages_async(target)))
+
+                yield from pages
+                self._round_completed()
+        finally:
+            for future in window:
+                future.cancel()
+
+    def _fetch_round_pages(self, start_year, start_round):
+        """
+            Fetch every page of the target from the first round to collect, a season or a round at a time
+        :param start_year: The first season
+        :param start_round: The first round of the first season
+        :return: A generator of the MRData of every page, in year, round and offset order
+        """
+        by_season = self._fetch_by_season()
+        fetch = self._fetch_pages_async if self.async_request else self._fetch_pages
+        for mr_data in fetch(start_year=start_year, start_round=start_round, by_season=by_season):
+            if by_season:
+                mr_data = self._skip_rounds(mr_data=mr_data, start_year=start_year, start_round=start_round,
+                                            end_year=self.end_year or datetime.now().year, end_round=self.end_round)
+            yield mr_data
+
+    def _fetch_pages(self, start_year, start_round, by_season):
+        """
+            Fetch every page of the target concurrently
+        :param start_year: The first season
+        :param start_round: The first round of the first season
+        :param by_season: Fetch the target a season at a time
+        :return: A generator of the MRData of every page, in year, round and offset order
+        """
+        years = get_years_between(start_year, self.end_year or datetime.now().year)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            if by_season:
+                targets = [f'{year}/{self.target}' for year in years]
+            else:
+                season_rounds = list(executor.map(self._get_season_rounds, years))
+                targets = self._get_round_targets(years, season_rounds, start_year, start_round)
+
+            # Only a bounded window of rounds is fetched ahead of the consumer, to keep the memory flat
+            pending_targets = iter(targets)
+            window = deque(executor.submit(self.paginator.submit_pages, executor, target)
+                           for target in islice(pending_targets, self.concurrency * 2))
+            try:
+                while window:
+                    mr_data, next_pages = window.popleft().result()
+                    for target in islice(pending_targets, 1):
+                        window.append(executor.submit(self.paginator.submit_pages, executor, target))
+
+                    if mr_data:
+                        yield mr_data
+                    for next_page in next_pages:
+                        mr_data = next_page.result()
+                        if mr_data:
+                            yield mr_data
+                    self._round_completed()
+            finally:
+                # A failed page stops the collection, the rounds fetched ahead of it are not needed anymore
+                for future in window:
+                    future.cancel()
+
+    def _round_completed(self):
+        """Flush the streamed buffers after each round or season, so that they are only ever stored in whole rounds"""
+        for buffer in self.streams:
+            buffer.flush()
+        # The keys hold the year and round, so the rows of the next rounds never repeat the collected ones
+        for keys in self.key_indexes:
+            keys.clear_added()
+
+    @contextmanager
+    def _streaming(self, buffer, table_name):
+        """
+            Stream the rows of a buffer to the database every stream_rows rows, instead of storing them at the end
+        :param buffer: The column buffer
+        :param table_name: The table name
+        :return: The stream writer or None if streaming is disabled
+        """
+        if not self.stream_rows:
+            yield None
+            return
+
+        writer = StreamWriter(azure_db=self.azure_db, table_name=table_name, statements=self._watermark_statements,
+                              keys=self.merge_keys)
+        buffer.sink = writer.put
+        buffer.flush_size = self.stream_rows
+        self.streams.append(buffer)
+        try:
+            yield writer
+            buffer.flush(force=True)
+        finally:
+            self.streams.remove(buffer)
+            buffer.sink = None
+            writer.close()
+
 
 class SeasonCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('year',)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = 'seasons.json'
-        self.seasons_data = list()
+        self.seasons_data = ColumnBuffer(Season)
 
     def run(self, **kwargs):
         self._populate_env()
@@ -243,36 +661,28 @@ class SeasonCollector(F1DataCollector):
         if self.env['start_year'] > self.env['end_year']:
             return
 
-        years = get_years_between(self.env['start_year'], self.env['end_year'])
+        years = set(get_years_between(self.env['start_year'], self.env['end_year']))
 
-        response = self.request.get(target=self.target)
-        if response.status == 200:
-            # offset = response.offset
-            data = response.data
-            mr_data = data['MRData']
-            season_table = mr_data['SeasonTable']
-            seasons = season_table['Seasons']
-            for season in seasons:
-                if int(season['season']) in years:
-                    season_row = Season()
-                    season_row.year = season['season']
-                    season_row.url = season['url']
-                    self.seasons_data.append(season_row)
+        for mr_data in self.paginator.pages(target=self.target):
+            self.seasons_data.extract(mr_data, keep=lambda year: int(year) in years,
+                                      keep_columns=('year',))
 
     def _store_seasons_data(self):
         """
             Store seasons data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='seasons', data=self.seasons_data)
+        return self.azure_db.insert(table_name='seasons', data=self.seasons_data, keys=self.merge_keys)
 
 
 class DriverCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('driver_id',)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = '2024/drivers.json'
-        self.drivers_data = list()
+        self.drivers_data = ColumnBuffer(Driver)
 
     def run(self, **kwargs):
         self._populate_env()
@@ -285,55 +695,30 @@ class DriverCollector(F1DataCollector):
 
     def _populate_env(self):
         """Populate the task environment data"""
-        self.env['drivers_in_db'] = list()
-
-        # Collect drivers information
-        drivers_query = """
-            SELECT drivers.driver_id
-            FROM drivers;
-        """
-        drivers_raw = self.azure_db.select(query=drivers_query)
-
-        for row in drivers_raw:
-            self.env['drivers_in_db'].append(row['driver_id'])
+        self.env['drivers_in_db'] = self._get_key_index(table_name='drivers', columns=self.key_columns)
 
     def _collect_drivers_data(self):
 
-        response = self.request.get(target=self.target)
-        if response.status == 200:
-            # offset = response.offset
-            data = response.data
-            mr_data = data['MRData']
-            driver_table = mr_data['DriverTable']
-            drivers = driver_table['Drivers']
-            for driver in drivers:
-                if driver['driverId'] not in self.env['drivers_in_db']:
-                    driver_row = Driver()
-                    driver_row.driver_id = driver['driverId']
-                    driver_row.number = driver['permanentNumber']
-                    driver_row.code = driver['code']
-                    driver_row.forename = driver['givenName']
-                    driver_row.surname = driver['familyName']
-                    driver_row.date_of_birth = driver['dateOfBirth']
-                    driver_row.nationality = driver['nationality']
-                    driver_row.url = driver['url']
-
-                    self.drivers_data.append(driver_row)
+        for mr_data in self.paginator.pages(target=self.target):
+            self.drivers_data.extract(mr_data, keep=self.env['drivers_in_db'].add,
+                                      keep_columns=self.key_columns)
 
     def _store_drivers_data(self):
         """
             Store drivers data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='drivers', data=self.drivers_data)
+        return self.azure_db.insert(table_name='drivers', data=self.drivers_data, keys=self.merge_keys)
 
 
 class ConstructorCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('constructor_id',)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = '2024/constructors.json'
-        self.constructors_data = list()
+        self.constructors_data = ColumnBuffer(Constructor)
 
     def run(self, **kwargs):
         self._populate_env()
@@ -346,51 +731,30 @@ class ConstructorCollector(F1DataCollector):
 
     def _populate_env(self):
         """Populate the task environment data"""
-        self.env['constructors_in_db'] = list()
-
-        # Collect constructors information
-        constructors_query = """
-            SELECT constructors.constructor_id
-            FROM constructors;
-        """
-        constructors_raw = self.azure_db.select(query=constructors_query)
-
-        for row in constructors_raw:
-            self.env['constructors_in_db'].append(row['constructor_id'])
+        self.env['constructors_in_db'] = self._get_key_index(table_name='constructors', columns=self.key_columns)
 
     def _collect_constructors_data(self):
 
-        response = self.request.get(target=self.target)
-        if response.status == 200:
-            # offset = response.offset
-            data = response.data
-            mr_data = data['MRData']
-            constructor_table = mr_data['ConstructorTable']
-            constructors = constructor_table['Constructors']
-            for constructor in constructors:
-                if constructor['constructorId'] not in self.env['constructors_in_db']:
-                    constructor_row = Constructor()
-                    constructor_row.constructor_id = constructor['constructorId']
-                    constructor_row.name = constructor['name']
-                    constructor_row.nationality = constructor['nationality']
-                    constructor_row.url = constructor['url']
-
-                    self.constructors_data.append(constructor_row)
+        for mr_data in self.paginator.pages(target=self.target):
+            self.constructors_data.extract(mr_data, keep=self.env['constructors_in_db'].add,
+                                           keep_columns=self.key_columns)
 
     def _store_constructors_data(self):
         """
             Store constructors data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='constructors', data=self.constructors_data)
+        return self.azure_db.insert(table_name='constructors', data=self.constructors_data, keys=self.merge_keys)
 
 
 class StatusCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('id',)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = 'status.json'
-        self.status_data = list()
+        self.status_data = ColumnBuffer(Status)
 
     def run(self, **kwargs):
         self._populate_env()
@@ -403,49 +767,30 @@ class StatusCollector(F1DataCollector):
 
     def _populate_env(self):
         """Populate the task environment data"""
-        self.env['statuses_in_db'] = list()
-
-        # Collect status information
-        status_query = """
-            SELECT status.id
-            FROM status;
-        """
-        status_raw = self.azure_db.select(query=status_query)
-
-        for row in status_raw:
-            self.env['statuses_in_db'].append(row['id'])
+        self.env['statuses_in_db'] = self._get_key_index(table_name='status', columns=self.key_columns)
 
     def _collect_status_data(self):
 
-        response = self.request.get(target=self.target)
-        if response.status == 200:
-            # offset = response.offset
-            data = response.data
-            mr_data = data['MRData']
-            status_table = mr_data['StatusTable']
-            statuses = status_table['Status']
-            for status in statuses:
-                if int(status['statusId']) not in self.env['statuses_in_db']:
-                    status_row = Constructor()
-                    status_row.id = status['statusId']
-                    status_row.status = status['status']
-
-                    self.status_data.append(status_row)
+        for mr_data in self.paginator.pages(target=self.target):
+            self.status_data.extract(mr_data, keep=self.env['statuses_in_db'].add,
+                                     keep_columns=self.key_columns)
 
     def _store_status_data(self):
         """
             Store constructors data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='status', data=self.status_data)
+        return self.azure_db.insert(table_name='status', data=self.status_data, keys=self.merge_keys)
 
 
 class CircuitCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('circuit_id',)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = '2023/circuits.json'
-        self.circuits_data = list()
+        self.circuits_data = ColumnBuffer(Circuit)
 
     def run(self, **kwargs):
         self._populate_env()
@@ -458,54 +803,30 @@ class CircuitCollector(F1DataCollector):
 
     def _populate_env(self):
         """Populate the task environment data"""
-        self.env['circuits_in_db'] = list()
-
-        # Collect circuits information
-        circuits_query = """
-            SELECT circuits.circuit_id
-            FROM circuits;
-        """
-        circuits_raw = self.azure_db.select(query=circuits_query)
-
-        for row in circuits_raw:
-            self.env['circuits_in_db'].append(row['circuit_id'])
+        self.env['circuits_in_db'] = self._get_key_index(table_name='circuits', columns=self.key_columns)
 
     def _collect_circuits_data(self):
 
-        response = self.request.get(target=self.target)
-        if response.status == 200:
-            # offset = response.offset
-            data = response.data
-            mr_data = data['MRData']
-            circuits_table = mr_data['CircuitTable']
-            circuits = circuits_table['Circuits']
-            for circuit in circuits:
-                if circuit['circuitId'] not in self.env['circuits_in_db']:
-                    circuit_row = Circuit()
-                    circuit_row.circuit_id = circuit['circuitId']
-                    circuit_row.name = circuit['circuitName']
-                    circuit_row.location = circuit['Location']['locality']
-                    circuit_row.country = circuit['Location']['country']
-                    circuit_row.latitude = circuit['Location']['lat']
-                    circuit_row.longitude = circuit['Location']['long']
-                    circuit_row.url = circuit['url']
-
-                    self.circuits_data.append(circuit_row)
+        for mr_data in self.paginator.pages(target=self.target):
+            self.circuits_data.extract(mr_data, keep=self.env['circuits_in_db'].add,
+                                       keep_columns=self.key_columns)
 
     def _store_circuits_data(self):
         """
             Store circuits data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='status', data=self.circuits_data)
+        return self.azure_db.insert(table_name='circuits', data=self.circuits_data, keys=self.merge_keys)
 
 
 class RaceCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('year', 'round')
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = 'races.json'
-        self.races_data = list()
+        self.races_data = ColumnBuffer(Race)
 
     def run(self, **kwargs):
         self._populate_env()
@@ -518,7 +839,7 @@ class RaceCollector(F1DataCollector):
 
     def _populate_env(self):
         """Populate the task environment data"""
-        self.env['races_in_db'] = datetime.min
+        self.env['max_race'] = date.min
 
         # Collect circuits information
         races_query = """
@@ -528,62 +849,41 @@ class RaceCollector(F1DataCollector):
         races_raw = self.azure_db.select(query=races_query)
 
         for row in races_raw:
-            self.env['max_race'] = row['max_date']
+            if row['max_date']:
+                self.env['max_race'] = row['max_date']
 
     def _collect_races_data(self):
-
-        offset = 0
-        params = None
-
-        while True:
-            if offset:
-                params = dict()
-                params['offset'] = 1000
-            response = self.request.get(target=self.target, parameters=params)
-            if response.status == 200:
-                data = response.data
-                mr_data = data['MRData']
-
-                races_table = mr_data['RaceTable']
-                races = races_table['Races']
-                for race in races:
-                    race_date = datetime.strptime(race['date'], '%Y-%m-%d').date()
-                    if race_date > self.env['max_race']:
-                        race_row = Race()
-                        race_row.year = race['season']
-                        race_row.round = race['round']
-                        race_row.circuit_id = race['Circuit']['circuitId']
-                        race_row.name = race['raceName']
-                        race_row.date = race_date
-                        race_row.url = race['url']
-
-                        self.races_data.append(race_row)
-
-                total_rows = int(mr_data.get('total', 0))
-                batch_size = int(mr_data.get('limit', 0))
-                offset = offset + batch_size
-                if offset > total_rows:
-                    break
+        max_race = str(self.env['max_race'])[:10]
+        for mr_data in self.paginator.pages(target=self.target):
+            # The ISO dates compare as strings, before they are converted
+            self.races_data.extract(mr_data, keep=lambda race_date: race_date > max_race,
+                                    keep_columns=('date',))
 
     def _store_races_data(self):
         """
             Store circuits data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='races', data=self.races_data)
+        return self.azure_db.insert(table_name='races', data=self.races_data, keys=self.merge_keys)
 
 
 class DriverStandingsCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('year', 'round', 'driver_id')
+    rows_per_round = 20
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = 'driverStandings.json'
-        self.driver_standings_data = list()
+        self.driver_standings_data = ColumnBuffer(DriverStandings)
 
     def run(self, **kwargs):
         self._populate_env()
-        self._collect_driver_standings_data()
-        if self.driver_standings_data:
+        with self._streaming(buffer=self.driver_standings_data, table_name='driver_standings') as stream:
+            self._collect_driver_standings_data()
+        if stream:
+            print(f'Driver standings rows: {stream.rows}')
+        elif self.driver_standings_data:
             response = self._store_driver_standings_data()
             print(f'Driver standings rows: {response}')
         else:
@@ -593,6 +893,11 @@ class DriverStandingsCollector(F1DataCollector):
         """Populate the task environment data"""
         self.env['driver_standings_data_in_db'] = dict()
 
+        watermark = self._get_watermark()
+        if watermark:
+            self.env['driver_standings_data_in_db'] = watermark
+            return
+
         # Collect circuits information
         driver_standings_query = """
             SELECT max_year.max_year,
@@ -614,69 +919,38 @@ class DriverStandingsCollector(F1DataCollector):
         if self.env['driver_standings_data_in_db']:
             max_year = self.env['driver_standings_data_in_db']['year']
             max_round = self.env['driver_standings_data_in_db']['round'] + 1
-            for year in range(max_year, datetime.now().year + 1):
-                current_round = max_round if max_round else 1
-
-                while current_round:
-                    request_target = f'{year}/{current_round}/{self.target}'
-                    offset = 0
-                    params = None
-
-                    while True:
-                        if offset:
-                            params = dict()
-                            params['offset'] = 1000
-                        response = self.request.get(target=request_target, parameters=params)
-
-                        if response.status == 200:
-                            data = response.data
-                            mr_data = data['MRData']
-                            standings_table = mr_data['StandingsTable']
-                            standings = standings_table['StandingsLists']
-
-                            if standings:
-                                current_round += 1
-                            else:
-                                current_round = None
-                                max_round = None
-
-                            for standing in standings:
-                                for driver in standing['DriverStandings']:
-                                    standing_row = DriverStandings()
-                                    standing_row.driver_id = driver['Driver']['driverId']
-                                    standing_row.points = driver['points']
-                                    standing_row.position = driver['position']
-                                    standing_row.wins = driver['wins']
-                                    standing_row.year = standing['season']
-                                    standing_row.round = standing['round']
-
-                                    self.driver_standings_data.append(standing_row)
-
-                            total_rows = int(mr_data.get('total', 0))
-                            batch_size = int(mr_data.get('limit', 0))
-                            offset = offset + batch_size
-                            if offset > total_rows:
-                                break
+            keys = self._get_key_index(table_name='driver_standings', columns=self.key_columns,
+                                       since=self.env['driver_standings_data_in_db'])
+            for mr_data in self._fetch_round_pages(start_year=max_year, start_round=max_round):
+                self.driver_standings_data.extract(mr_data, keep=keys.add, keep_columns=self.key_columns)
 
     def _store_driver_standings_data(self):
         """
             Store driver standings data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='driver_standings', data=self.driver_standings_data)
+        return self.azure_db.insert(table_name='driver_standings', data=self.driver_standings_data,
+                                    statements=self._watermark_statements(self.driver_standings_data),
+                                    keys=self.merge_keys)
 
 
 class ConstructorStandingsCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('year', 'round', 'constructor_id')
+    rows_per_round = 10
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = 'constructorStandings.json'
-        self.constructor_standings_data = list()
+        self.constructor_standings_data = ColumnBuffer(ConstructorStandings)
 
     def run(self, **kwargs):
         self._populate_env()
-        self._collect_constructor_standings_data()
-        if self.constructor_standings_data:
+        with self._streaming(buffer=self.constructor_standings_data, table_name='constructor_standings') as stream:
+            self._collect_constructor_standings_data()
+        if stream:
+            print(f'Constructor standings rows: {stream.rows}')
+        elif self.constructor_standings_data:
             response = self._store_constructor_standings_data()
             print(f'Constructor standings rows: {response}')
         else:
@@ -686,6 +960,11 @@ class ConstructorStandingsCollector(F1DataCollector):
         """Populate the task environment data"""
         self.env['constructor_standings_data_in_db'] = dict()
 
+        watermark = self._get_watermark()
+        if watermark:
+            self.env['constructor_standings_data_in_db'] = watermark
+            return
+
         # Collect circuits information
         constructor_standings_query = """
             SELECT max_year.max_year,
@@ -706,69 +985,39 @@ class ConstructorStandingsCollector(F1DataCollector):
         if self.env['constructor_standings_data_in_db']:
             max_year = self.env['constructor_standings_data_in_db']['year']
             max_round = self.env['constructor_standings_data_in_db']['round'] + 1
-            for year in range(max_year, datetime.now().year + 1):
-                current_round = max_round if max_round else 1
-
-                while current_round:
-                    request_target = f'{year}/{current_round}/{self.target}'
-                    offset = 0
-                    params = None
-
-                    while True:
-                        if offset:
-                            params = dict()
-                            params['offset'] = 1000
-                        response = self.request.get(target=request_target, parameters=params)
-
-                        if response.status == 200:
-                            data = response.data
-                            mr_data = data['MRData']
-                            standings_table = mr_data['StandingsTable']
-                            standings = standings_table['StandingsLists']
-
-                            if standings:
-                                current_round += 1
-                            else:
-                                current_round = None
-                                max_round = None
-
-                            for standing in standings:
-                                for constructor in standing['ConstructorStandings']:
-                                    standing_row = ConstructorStandings()
-                                    standing_row.constructor_id = constructor['Constructor']['constructorId']
-                                    standing_row.points = constructor['points']
-                                    standing_row.position = constructor['position']
-                                    standing_row.wins = constructor['wins']
-                                    standing_row.year = standing['season']
-                                    standing_row.round = standing['round']
-
-                                    self.constructor_standings_data.append(standing_row)
-
-                            total_rows = int(mr_data.get('total', 0))
-                            batch_size = int(mr_data.get('limit', 0))
-                            offset = offset + batch_size
-                            if offset > total_rows:
-                                break
+            keys = self._get_key_index(table_name='constructor_standings', columns=self.key_columns,
+                                       since=self.env['constructor_standings_data_in_db'])
+            for mr_data in self._fetch_round_pages(start_year=max_year, start_round=max_round):
+                self.constructor_standings_data.extract(mr_data, keep=keys.add, keep_columns=self.key_columns)
 
     def _store_constructor_standings_data(self):
         """
             Store driver standings data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='constructor_standings', data=self.constructor_standings_data)
+        return self.azure_db.insert(table_name='constructor_standings', data=self.constructor_standings_data,
+                                    statements=self._watermark_statements(self.constructor_standings_data),
+                                    keys=self.merge_keys)
 
 
 class QualifyingCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('year', 'round', 'driver_id')
+    season_pages = True
+    rows_per_round = 20
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = 'qualifying.json'
-        self.qualifying_data = list()
+        self.qualifying_data = ColumnBuffer(Qualifying)
 
     def run(self, **kwargs):
         self._populate_env()
-        self._collect_qualifying_data()
-        if self.qualifying_data:
+        with self._streaming(buffer=self.qualifying_data, table_name='qualifying') as stream:
+            self._collect_qualifying_data()
+        if stream:
+            print(f'Qualifying rows: {stream.rows}')
+        elif self.qualifying_data:
             response = self._store_qualifying_data()
             print(f'Qualifying rows: {response}')
         else:
@@ -778,6 +1027,11 @@ class QualifyingCollector(F1DataCollector):
         """Populate the task environment data"""
         self.env['max_qualifying_date'] = dict()
 
+        watermark = self._get_watermark()
+        if watermark:
+            self.env['max_qualifying_date'] = watermark
+            return
+
         # Collect qualifying information
         qualifying_query = """
             SELECT max_year.max_year,
@@ -798,80 +1052,38 @@ class QualifyingCollector(F1DataCollector):
         if self.env['max_qualifying_date']:
             max_year = self.env['max_qualifying_date']['year']
             max_round = self.env['max_qualifying_date']['round'] + 1
-            for year in range(max_year, datetime.now().year + 1):
-                current_round = max_round if max_round else 1
-
-                while current_round:
-                    request_target = f'{year}/{current_round}/{self.target}'
-                    offset = 0
-                    params = None
-
-                    while True:
-                        if offset:
-                            params = dict()
-                            params['offset'] = 1000
-                        response = self.request.get(target=request_target, parameters=params)
-
-                        if response.status == 200:
-                            data = response.data
-                            mr_data = data['MRData']
-                            race_table = mr_data['RaceTable']
-                            races = race_table['Races']
-
-                            if races:
-                                current_round += 1
-                            else:
-                                current_round = None
-                                max_round = None
-                            for race in races:
-                                for qualifying in race['QualifyingResults']:
-                                    qualifying_row = Qualifying()
-                                    qualifying_row.constructor_id = qualifying['Constructor']['constructorId']
-                                    qualifying_row.driver_id = qualifying['Driver']['driverId']
-                                    qualifying_row.number = qualifying['number']
-                                    qualifying_row.position = qualifying['position']
-                                    if qualifying.get('Q1') and qualifying.get('Q1') != '':
-                                        q1 = datetime.strptime(qualifying['Q1'], '%M:%S.%f').time()
-                                        qualifying_row.q1 = (q1.minute * 60000) + (q1.second * 1000) + (
-                                                q1.microsecond / 1000)
-                                    if qualifying.get('Q2') and qualifying.get('Q2') != '':
-                                        q2 = datetime.strptime(qualifying['Q2'], '%M:%S.%f').time()
-                                        qualifying_row.q2 = (q2.minute * 60000) + (q2.second * 1000) + (
-                                                q2.microsecond / 1000)
-                                    if qualifying.get('Q3') and qualifying.get('Q3') != '':
-                                        q3 = datetime.strptime(qualifying['Q3'], '%M:%S.%f').time()
-                                        qualifying_row.q3 = (q3.minute * 60000) + (q3.second * 1000) + (
-                                                q3.microsecond / 1000)
-                                    qualifying_row.year = race['season']
-                                    qualifying_row.round = race['round']
-
-                                    self.qualifying_data.append(qualifying_row)
-
-                            total_rows = int(mr_data.get('total', 0))
-                            batch_size = int(mr_data.get('limit', 0))
-                            offset = offset + batch_size
-                            if offset > total_rows:
-                                break
+            keys = self._get_key_index(table_name='qualifying', columns=self.key_columns,
+                                       since=self.env['max_qualifying_date'])
+            for mr_data in self._fetch_round_pages(start_year=max_year, start_round=max_round):
+                self.qualifying_data.extract(mr_data, keep=keys.add, keep_columns=self.key_columns)
 
     def _store_qualifying_data(self):
         """
             Store driver standings data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='qualifying', data=self.qualifying_data)
+        return self.azure_db.insert(table_name='qualifying', data=self.qualifying_data,
+                                    statements=self._watermark_statements(self.qualifying_data),
+                                    keys=self.merge_keys)
 
 
 class PitStopsCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('year', 'round', 'driver_id', 'stop')
+    rows_per_round = 50
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = 'pitstops.json'
-        self.pit_stops_data = list()
+        self.pit_stops_data = ColumnBuffer(PitStop)
 
     def run(self):
         self._populate_env()
-        self._collect_pit_stops_data()
-        if self.pit_stops_data:
+        with self._streaming(buffer=self.pit_stops_data, table_name='pit_stops') as stream:
+            self._collect_pit_stops_data()
+        if stream:
+            print(f'Pit stops rows: {stream.rows}')
+        elif self.pit_stops_data:
             response = self._store_pit_stops_data()
             print(f'Pit stops rows: {response}')
         else:
@@ -881,6 +1093,11 @@ class PitStopsCollector(F1DataCollector):
         """Populate the task environment data"""
         self.env['max_pit_stops_date'] = dict()
 
+        watermark = self._get_watermark()
+        if watermark:
+            self.env['max_pit_stops_date'] = watermark
+            return
+
         # Collect pit stops information
         pit_stops_query = """
             SELECT max_year.max_year,
@@ -901,75 +1118,38 @@ class PitStopsCollector(F1DataCollector):
         if self.env['max_pit_stops_date']:
             max_year = self.env['max_pit_stops_date']['year']
             max_round = self.env['max_pit_stops_date']['round'] + 1
-            for year in range(max_year, datetime.now().year + 1):
-                current_round = max_round if max_round else 1
-
-                while current_round:
-                    request_target = f'{year}/{current_round}/{self.target}'
-                    offset = 0
-                    params = None
-
-                    while True:
-                        if offset:
-                            params = dict()
-                            params['offset'] = 1000
-                        response = self.request.get(target=request_target, parameters=params)
-
-                        if response.status == 200:
-                            data = response.data
-                            mr_data = data['MRData']
-                            race_table = mr_data['RaceTable']
-                            races = race_table['Races']
-
-                            if races:
-                                current_round += 1
-                            else:
-                                current_round = None
-                                max_round = None
-                            for race in races:
-                                for pit_stop in race['PitStops']:
-                                    pit_stop_row = PitStop()
-                                    pit_stop_row.driver_id = pit_stop['driverId']
-                                    pit_stop_row.duration = pit_stop['duration']
-                                    pit_stop_row.lap = pit_stop['lap']
-                                    pit_stop_row.stop = pit_stop['stop']
-                                    pit_stop_row.time = pit_stop['time']
-                                    try:
-                                        pit_stop_row.milliseconds = Decimal(pit_stop['duration']) * 1000
-                                    except Exception as ex:
-                                        pit_stop_time = datetime.strptime(pit_stop['duration'], '%M:%S.%f').time()
-                                        pit_stop_row.milliseconds = (pit_stop_time.minute * 60000) + (
-                                                pit_stop_time.second * 1000) + (pit_stop_time.microsecond / 1000)
-                                    pit_stop_row.year = race['season']
-                                    pit_stop_row.round = race['round']
-
-                                    self.pit_stops_data.append(pit_stop_row)
-
-                            total_rows = int(mr_data.get('total', 0))
-                            batch_size = int(mr_data.get('limit', 0))
-                            offset = offset + batch_size
-                            if offset > total_rows:
-                                break
+            keys = self._get_key_index(table_name='pit_stops', columns=self.key_columns,
+                                       since=self.env['max_pit_stops_date'])
+            for mr_data in self._fetch_round_pages(start_year=max_year, start_round=max_round):
+                self.pit_stops_data.extract(mr_data, keep=keys.add, keep_columns=self.key_columns)
 
     def _store_pit_stops_data(self):
         """
             Store pit stops data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='pit_stops', data=self.pit_stops_data)
+        return self.azure_db.insert(table_name='pit_stops', data=self.pit_stops_data,
+                                    statements=self._watermark_statements(self.pit_stops_data),
+                                    keys=self.merge_keys)
 
 
 class LapTimesCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('year', 'round', 'driver_id', 'lap')
+    rows_per_round = 1200
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = 'laps.json'
-        self.laps_data = list()
+        self.laps_data = ColumnBuffer(LapTime)
 
     def run(self):
         self._populate_env()
-        self._collect_laps_data()
-        if self.laps_data:
+        with self._streaming(buffer=self.laps_data, table_name='lap_times') as stream:
+            self._collect_laps_data()
+        if stream:
+            print(f'Laps rows: {stream.rows}')
+        elif self.laps_data:
             response = self._store_laps_data()
             print(f'Laps rows: {response}')
         else:
@@ -979,6 +1159,11 @@ class LapTimesCollector(F1DataCollector):
         """Populate the task environment data"""
         self.env['max_lap_times_date'] = dict()
 
+        watermark = self._get_watermark()
+        if watermark:
+            self.env['max_lap_times_date'] = watermark
+            return
+
         # Collect circuits information
         lap_times_query = """
             SELECT max_year.max_year,
@@ -999,79 +1184,40 @@ class LapTimesCollector(F1DataCollector):
         if self.env['max_lap_times_date']:
             max_year = self.env['max_lap_times_date']['year']
             max_round = self.env['max_lap_times_date']['round'] + 1
-            for year in range(max_year, datetime.now().year + 1):
-                current_round = max_round if max_round else 1
-
-                while current_round:
-                    request_target = f'{year}/{current_round}/{self.target}'
-                    offset = 0
-                    params = None
-
-                    while True:
-                        if offset > 0:
-                            params = dict()
-                            params['offset'] = offset
-                        response = self.request.get(target=request_target, parameters=params)
-
-                        if response.status == 200:
-                            data = response.data
-                            mr_data = data['MRData']
-                            race_table = mr_data['RaceTable']
-                            races = race_table['Races']
-                            for race in races:
-                                for race_lap in race['Laps']:
-                                    for timing in race_lap['Timings']:
-                                        lap_row = LapTime()
-                                        lap_row.driver_id = timing['driverId']
-                                        lap_row.position = timing['position']
-                                        lap_row.time = timing['time']
-                                        if timing.get('time') and timing.get('time') != '':
-                                            try:
-                                                lap_time = datetime.strptime(timing['time'], '%M:%S.%f').time()
-                                                lap_row.milliseconds = (lap_time.minute * 60000) + (
-                                                        lap_time.second * 1000) + (lap_time.microsecond / 1000)
-                                            except ValueError as error:
-                                                lap_time = datetime.strptime(timing['time'], '%H:%M:%S.%f').time()
-                                                lap_row.milliseconds = (lap_time.hour * 3600000) + (
-                                                        lap_time.minute * 60000) + (lap_time.second * 1000) + (
-                                                                               lap_time.microsecond / 1000)
-                                        lap_row.lap = race_lap['number']
-                                        lap_row.year = race['season']
-                                        lap_row.round = race['round']
-
-                                        self.laps_data.append(lap_row)
-
-                            total_rows = int(mr_data.get('total', 0))
-                            batch_size = int(mr_data.get('limit', 0))
-                            offset = offset + batch_size
-
-                            if offset > total_rows:
-                                if offset:
-                                    current_round += 1
-                                if total_rows == 0:
-                                    current_round = None
-                                    max_round = None
-                                break
+            keys = self._get_key_index(table_name='lap_times', columns=self.key_columns,
+                                       since=self.env['max_lap_times_date'])
+            for mr_data in self._fetch_round_pages(start_year=max_year, start_round=max_round):
+                self.laps_data.extract(mr_data, keep=keys.add, keep_columns=self.key_columns)
 
     def _store_laps_data(self):
         """
             Store pit stops data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='lap_times', data=self.laps_data)
+        return self.azure_db.insert(table_name='lap_times', data=self.laps_data,
+                                    statements=self._watermark_statements(self.laps_data),
+                                    keys=self.merge_keys)
 
 
 class ResultsCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    # A driver sharing several cars in the early seasons has a result per car in the same race
+    key_columns = ('year', 'round', 'driver_id', 'number')
+    season_pages = True
+    rows_per_round = 20
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = 'results.json'
-        self.results_data = list()
+        self.results_data = ColumnBuffer(Result)
 
     def run(self):
         self._populate_env()
-        self._collect_results_data()
-        if self.results_data:
+        with self._streaming(buffer=self.results_data, table_name='results') as stream:
+            self._collect_results_data()
+        if stream:
+            print(f'Results rows: {stream.rows}')
+        elif self.results_data:
             response = self._store_results_data()
             print(f'Results rows: {response}')
         else:
@@ -1081,6 +1227,11 @@ class ResultsCollector(F1DataCollector):
         """Populate the task environment data"""
         self.env['max_results_date'] = dict()
 
+        watermark = self._get_watermark()
+        if watermark:
+            self.env['max_results_date'] = watermark
+            return
+
         # Collect results information
         results_query = """
             SELECT max_year.max_year,
@@ -1101,85 +1252,39 @@ class ResultsCollector(F1DataCollector):
         # if self.env['max_results_date']:
         max_year = self.env['max_results_date']['year']
         max_round = self.env['max_results_date']['round'] + 1
-        for year in range(max_year, datetime.now().year + 1):
-            current_round = max_round if max_round else 1
-
-            while current_round:
-                request_target = f'{year}/{current_round}/{self.target}'
-                offset = 0
-                params = None
-
-                while True:
-                    if offset:
-                        params = dict()
-                        params['offset'] = 1000
-                    response = self.request.get(target=request_target, parameters=params)
-
-                    if response.status == 200:
-                        data = response.data
-                        mr_data = data['MRData']
-                        race_table = mr_data['RaceTable']
-                        races = race_table['Races']
-                        if races:
-                            current_round += 1
-                        else:
-                            current_round = None
-                            max_round = None
-                        for race in races:
-                            results = race['Results']
-                            for result in results:
-                                result_row = Result()
-                                result_row.driver_id = result['Driver']['driverId']
-                                result_row.constructor_id = result['Constructor']['constructorId']
-                                result_row.number = result['number']
-                                result_row.grid = result['grid']
-                                result_row.position = result['position']
-                                result_row.points = result['points']
-                                result_row.laps = result['laps']
-                                result_row.status_id = result['status']
-
-                                if result.get('Time'):
-                                    result_row.milliseconds = int(result['Time']['millis'])
-                                if result.get('FastestLap'):
-                                    result_row.fastest_lap = result['FastestLap']['lap']
-                                    result_row.rank = result['FastestLap']['rank']
-                                    result_row.fastest_lap_speed = result['FastestLap']['AverageSpeed']['speed']
-
-                                    fastest_lap_time = datetime.strptime(result['FastestLap']['Time']['time'],
-                                                                         '%M:%S.%f').time()
-                                    result_row.fastest_lap_time = (fastest_lap_time.minute * 60000) + (
-                                            fastest_lap_time.second * 1000) + (fastest_lap_time.microsecond / 1000)
-
-                                result_row.year = race_table['season']
-                                result_row.round = race_table['round']
-
-                                self.results_data.append(result_row)
-
-                        total_rows = int(mr_data.get('total', 0))
-                        batch_size = int(mr_data.get('limit', 0))
-                        offset = offset + batch_size
-                        if offset > total_rows:
-                            break
+        keys = self._get_key_index(table_name='results', columns=self.key_columns,
+                                   since=self.env['max_results_date'])
+        for mr_data in self._fetch_round_pages(start_year=max_year, start_round=max_round):
+            self.results_data.extract(mr_data, keep=keys.add, keep_columns=self.key_columns)
 
     def _store_results_data(self):
         """
             Store pit stops data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='results', data=self.results_data)
+        return self.azure_db.insert(table_name='results', data=self.results_data,
+                                    statements=self._watermark_statements(self.results_data),
+                                    keys=self.merge_keys)
 
 
 class SprintResultsCollector(F1DataCollector):
-    def __init__(self):
-        super().__init__()
+    key_columns = ('year', 'round', 'driver_id', 'number')
+    season_pages = True
+    rows_per_round = 20
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
 
         self.target = 'sprint.json'
-        self.sprint_results_data = list()
+        self.sprint_results_data = ColumnBuffer(SprintResult)
 
     def run(self):
         self._populate_env()
-        self._collect_sprint_results_data()
-        if self.sprint_results_data:
+        with self._streaming(buffer=self.sprint_results_data, table_name='sprint_results') as stream:
+            self._collect_sprint_results_data()
+        if stream:
+            print(f'Sprint results rows: {stream.rows}')
+        elif self.sprint_results_data:
             response = self._store_sprint_results_data()
             print(f'Sprint results rows: {response}')
         else:
@@ -1189,6 +1294,11 @@ class SprintResultsCollector(F1DataCollector):
         """Populate the task environment data"""
         self.env['max_sprint_results_date'] = dict()
 
+        watermark = self._get_watermark()
+        if watermark:
+            self.env['max_sprint_results_date'] = watermark
+            return
+
         # Collect sprint results information
         sprint_results_query = """
             SELECT max_year.max_year,
@@ -1209,95 +1319,16 @@ class SprintResultsCollector(F1DataCollector):
         if self.env['max_sprint_results_date']:
             max_year = self.env['max_sprint_results_date']['year']
             max_round = self.env['max_sprint_results_date']['round'] + 1
-            for year in range(max_year, datetime.now().year + 1):
-                current_round = max_round if max_round else 1
-
-                while current_round:
-                    request_target = f'{year}/{current_round}/{self.target}'
-                    offset = 0
-                    params = None
-
-                    while True:
-                        if offset:
-                            params = dict()
-                            params['offset'] = 1000
-                        response = self.request.get(target=request_target, parameters=params)
-
-                        if response.status == 200:
-                            data = response.data
-                            mr_data = data['MRData']
-                            race_table = mr_data['RaceTable']
-                            races = race_table['Races']
-                            if races:
-                                current_round += 1
-                            else:
-                                current_round = None
-                                max_round = None
-                            for race in races:
-                                results = race['SprintResults']
-                                for result in results:
-                                    result_row = SprintResult()
-                                    result_row.driver_id = result['Driver']['driverId']
-                                    result_row.constructor_id = result['Constructor']['constructorId']
-                                    result_row.number = result['number']
-                                    result_row.grid = result['grid']
-                                    result_row.position = result['position']
-                                    result_row.points = result['points']
-                                    result_row.laps = result['laps']
-                                    result_row.status_id = result['status']
-
-                                    if result.get('Time'):
-                                        result_row.milliseconds = int(result['Time']['millis'])
-                                    if result.get('FastestLap'):
-                                        result_row.fastest_lap = result['FastestLap']['lap']
-
-                                        fastest_lap_time = datetime.strptime(result['FastestLap']['Time']['time'],
-                                                                             '%M:%S.%f').time()
-                                        result_row.fastest_lap_time = (fastest_lap_time.minute * 60000) + (
-                                                fastest_lap_time.second * 1000) + (fastest_lap_time.microsecond / 1000)
-
-                                    result_row.year = race_table['season']
-                                    result_row.round = race_table['round']
-                                    self.sprint_results_data.append(result_row)
-
-                            total_rows = int(mr_data.get('total', 0))
-                            batch_size = int(mr_data.get('limit', 0))
-                            offset = offset + batch_size
-                            if offset > total_rows:
-                                break
+            keys = self._get_key_index(table_name='sprint_results', columns=self.key_columns,
+                                       since=self.env['max_sprint_results_date'])
+            for mr_data in self._fetch_round_pages(start_year=max_year, start_round=max_round):
+                self.sprint_results_data.extract(mr_data, keep=keys.add, keep_columns=self.key_columns)
 
     def _store_sprint_results_data(self):
         """
             Store pit stops data
         :return: The query response
         """
-        return self.azure_db.insert(table_name='sprint_results', data=self.sprint_results_data)
-
-
-if __name__ == '__main__':
-    seasons_data = SeasonCollector()
-    seasons_data.run()
-    drivers_data = DriverCollector()
-    drivers_data.run()
-    constructors_data = ConstructorCollector()
-    constructors_data.run()
-    status_data = StatusCollector()
-    status_data.run()
-    circuits_data = CircuitCollector()
-    circuits_data.run()
-    races_data = RaceCollector()
-    races_data.run()
-    driver_standings_data = DriverStandingsCollector()
-    driver_standings_data.run()
-    constructor_standings_data = ConstructorStandingsCollector()
-    constructor_standings_data.run()
-    qualifying_data = QualifyingCollector()
-    qualifying_data.run()
-    pit_stops_data = PitStopsCollector()
-    pit_stops_data.run()
-    laps_data = LapTimesCollector()
-    laps_data.run()
-    results_data = ResultsCollector()
-    results_data.run()
-    sprint_results_data = SprintResultsCollector()
-    sprint_results_data.run()
+        return self.azure_db.insert(table_name='sprint_results', data=self.sprint_results_data,
+                                    statements=self._watermark_statements(self.sprint_results_data),
+                                    keys=self.merge_keys)
@@ -0,0 +1,36 @@
+import importlib
+
+# The collectors, each with the collectors of the tables its rows reference. The registry only needs the
+# standard library, so that the Airflow DAG is parsed without importing the collectors and their clients.
+collector_dependencies = {
+    'SeasonCollector': (),
+    'DriverCollector': (),
+    'ConstructorCollector': (),
+    'StatusCollector': (),
+    'CircuitCollector': (),
+    'RaceCollector': ('SeasonCollector', 'CircuitCollector'),
+    'DriverStandingsCollector': ('RaceCollector', 'DriverCollector'),
+    'ConstructorStandingsCollector': ('RaceCollector', 'ConstructorCollector'),
+    'QualifyingCollector': ('RaceCollector', 'DriverCollector', 'ConstructorCollector'),
+    'PitStopsCollector': ('RaceCollector', 'DriverCollector'),
+    'LapTimesCollector': ('RaceCollector', 'DriverCollector'),
+    'ResultsCollector': ('RaceCollector', 'DriverCollector', 'ConstructorCollector', 'StatusCollector'),
+    'SprintResultsCollector': ('RaceCollector', 'DriverCollector', 'ConstructorCollector', 'StatusCollector'),
+}
+
+# The round-walking collectors, collecting the rows of each race
+round_collectors = tuple(name for name, dependencies in collector_dependencies.items() if 'RaceCollector' in dependencies)
+
+# The module defining the collectors, imported on the first collector load
+collector_module = 'f1'
+
+
+def load_collector(name):
+    """
+        Load a collector class, importing its module on first use
+    :param name: The collector class name
+    :return: The collector class
+    """
+    if name not in collector_dependencies:
+        raise KeyError(f'Unknown collector: {name}')
+    return getattr(importlib.import_module(collector_module), name)
@@ -0,0 +1,240 @@
+import argparse
+import os
+import time
+
+from registry import collector_dependencies, load_collector
+
+
+class CollectorRunner:
+    """Command-line runner of the collectors, outside Airflow
+
+    The collectors run in the order of collector_dependencies, the ones a collector depends on first when
+    they are run too. With more than one worker each collector runs in its own process as soon as its
+    dependencies are done, the rate limit of the Ergast API being split between the workers.
+    The collectors and their clients are only imported once a collector runs, so that the command line
+    parses and the worker processes start without loading them.
+    """
+
+    def __init__(self, names=None, workers=1, start_year=None, start_round=None, end_year=None, end_round=None,
+                 dry_run=False, from_cache=False):
+        """
+            Initialize the runner
+        :param names: The collectors to run, all of them by default
+        :param workers: The number of collector processes, 1 to run them in sequence in this process
+        :param start_year: The first season of the round-walking collectors, from their watermark by default
+        :param start_round: The first round of the first season
+        :param end_year: The last season of the round-walking collectors, the current one by default
+        :param end_round: The last round of the last season
+        :param dry_run: Read the database but never write to it
+        :param from_cache: Serve the requests from the response cache only, without any network request
+        """
+        self.names = [name for name in collector_dependencies if not names or name in names]
+        self.workers = max(int(workers), 1)
+        self.start_year = start_year
+        self.start_round = start_round
+        self.end_year = end_year
+        self.end_round = end_round
+        self.dry_run = dry_run
+        self.from_cache = from_cache
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({", ".join(self.names)}, workers={self.workers})'
+
+    def _dependencies(self, name):
+        return [dependency for dependency in collector_dependencies[name] if dependency in self.names]
+
+    def _requests(self):
+        """
+            Create the requests wrappers of a process
+        :return: The requests wrapper and the async one, None unless F1_ASYNC_CLIENT is 1
+        """
+        from utils.rate_limiter import RateLimiter
+        from utils.requests_wrapper import RequestsWrapper
+
+        rate_limiter = None
+        if self.workers > 1:
+            # The workers share the rate limit of the API instead of each sending at the full rate
+            rate_limiter = RateLimiter.from_env()
+            if rate_limiter:
+                rate_limiter.rate /= self.workers
+                rate_limiter.max_rate /= self.workers
+                rate_limiter.min_rate /= self.workers
+            else:
+                rate_limiter = False
+        request = RequestsWrapper(rate_limiter=rate_limiter, cache_only=self.from_cache)
+        async_request = None
+        if os.environ.get('F1_ASYNC_CLIENT') == '1':
+            from utils.async_requests_wrapper import AsyncRequestsWrapper
+            async_request = AsyncRequestsWrapper(rate_limiter=rate_limiter, cache_only=self.from_cache)
+        return request, async_request
+
+    def run_collector(self, name, request=None, async_request=None, azure_db=None):
+        """
+            Run a collector
+        :param name: The collector class name
+        :param request: The requests wrapper, a new one closed once the collector has run by default
+        :param async_request: The async requests wrapper
+        :param azure_db: The database wrapper, a new one closed once the collector has run by default
+        :return: The seconds the collector took
+        :raise RuntimeError: If any page or insert of the collector failed, e.g. so that Airflow retries its task
+        """
+        from utils.azure_wrapper import AzureDBWrapper
+        from utils.metrics import Metrics
+
+        collector_class = load_collector(name)
+        metrics = Metrics.shared()
+        failures = metrics.failures(name)
+        own_request, own_db = request is None, azure_db is None
+        if own_request:
+            request, async_request = self._requests()
+        azure_db = azure_db or AzureDBWrapper()
+        azure_db.dry_run = self.dry_run
+
+        start = time.perf_counter()
+        try:
+            collector = collector_class(request=request, azure_db=azure_db, async_request=async_request)
+            collector.start_year = self.start_year
+            collector.start_round = self.start_round
+            collector.end_year = self.end_year
+            collector.end_round = self.end_round
+            collector.run()
+            if metrics.failures(name) > failures:
+                raise RuntimeError(f'{name} has failed pages or inserts')
+        finally:
+            if own_request:
+                print(f'Connections: {request.connection_stats()}')
+                request.close()
+                if async_request:
+                    async_request.close()
+            if own_db:
+                azure_db.close()
+        return time.perf_counter() - start
+
+    def _run_sequential(self):
+        """
+            Run the collectors one after the other, sharing the connection pools
+        :return: The seconds each collector took, None for the failed ones
+        """
+        from utils.azure_wrapper import AzureDBWrapper
+
+        timings = dict()
+        request, async_request = self._requests()
+        try:
+            with AzureDBWrapper() as azure_db:
+                for name in self.names:
+                    if any(timings.get(dependency) is None for dependency in self._dependencies(name)):
+                        print(f'{name} skipped, a collector it depends on failed')
+                        timings[name] = None
+                        continue
+                    try:
+                        timings[name] = self.run_collector(name, request=request, async_request=async_request,
+                                                           azure_db=azure_db)
+                    except Exception as exception:
+                        print(f'{name} failed: {exception!r}')
+                        timings[name] = None
+                print(f'Connections: {request.connection_stats()}')
+        finally:
+            request.close()
+            if async_request:
+                async_request.close()
+        return timings
+
+    def _run_parallel(self):
+        """
+            Run each collector in a worker process as soon as its dependencies are done
+        :return: The seconds each collector took, None for the failed ones
+        """
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+        timings = dict()
+        pending = list(self.names)
+        running = dict()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    dependencies = self._dependencies(name)
+                    if any(dependency in timings and timings[dependency] is None for dependency in dependencies):
+                        print(f'{name} skipped, a collector it depends on failed')
+                        timings[name] = None
+                        pending.remove(name)
+                    elif all(dependency in timings for dependency in dependencies):
+                        running[executor.submit(self.run_collector, name)] = name
+                        pending.remove(name)
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        timings[name] = future.result()
+                    except Exception as exception:
+                        print(f'{name} failed: {exception!r}')
+                        timings[name] = None
+        return timings
+
+    def run(self):
+        """
+            Run the collectors
+        :return: True if every collector succeeded
+        """
+        mode = 'dry run' if self.dry_run else 'run'
+        print(f'Collectors ({mode}, {self.workers} worker(s)): {", ".join(self.names)}')
+        timings = self._run_parallel() if self.workers > 1 else self._run_sequential()
+        for name in self.names:
+            seconds = timings.get(name)
+            print(f'{name}: {"failed" if seconds is None else f"{seconds:.1f}s"}')
+        return all(timings.get(name) is not None for name in self.names)
+
+
+def add_arguments(parser):
+    """
+        Add the arguments of the run command
+    :param parser: The argument parser
+    """
+    parser.add_argument('collectors', nargs='*', help='The collectors to run, all of them by default')
+    parser.add_argument('--workers', type=int, default=1, help='The number of collector processes')
+    parser.add_argument('--start-year', type=int, help='The first season, from the watermark by default')
+    parser.add_argument('--start-round', type=int, help='The first round of the first season')
+    parser.add_argument('--end-year', type=int, help='The last season, the current one by default')
+    parser.add_argument('--end-round', type=int, help='The last round of the last season')
+    parser.add_argument('--dry-run', action='store_true', help='Collect but never write to the database')
+    parser.add_argument('--from-cache', action='store_true',
+                        help='Serve the requests from the response cache only, without any network request')
+
+
+def main():
+    """Parse the command line and run its command, every collector in sequence without one"""
+    parser = argparse.ArgumentParser(description='Collect the Ergast API data into the Azure database')
+    commands = parser.add_subparsers(dest='command')
+    add_arguments(commands.add_parser('run', help='Run some or all of the collectors'))
+    import backfill
+    backfill.add_arguments(commands.add_parser('backfill', help='Backfill a range of seasons, a round at a time'))
+    from benchmarks import profiling
+    profiling.add_arguments(commands.add_parser('profile', help='Profile a collector over a single season'))
+    args = parser.parse_args()
+
+    if args.command == 'profile':
+        profiling.main(args)
+        return
+    if args.command == 'backfill':
+        unknown = [name for name in args.collectors if name not in backfill.round_collectors]
+        if unknown:
+            parser.error(f'unknown round-walking collectors: {", ".join(unknown)}')
+        backfill.main(args)
+        return
+    if args.command is None:
+        runner = CollectorRunner()
+    else:
+        unknown = [name for name in args.collectors if name not in collector_dependencies]
+        if unknown:
+            parser.error(f'unknown collectors: {", ".join(unknown)}')
+        runner = CollectorRunner(names=args.collectors, workers=args.workers, start_year=args.start_year,
+                                 start_round=args.start_round, end_year=args.end_year, end_round=args.end_round,
+                                 dry_run=args.dry_run, from_cache=args.from_cache)
+    if not runner.run():
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
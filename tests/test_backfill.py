@@ -0,0 +1,93 @@
+import argparse
+import sys
+import types
+
+import pytest
+
+from backfill import Backfill, WorkUnit, parse_rounds
+
+
+@pytest.mark.parametrize('value, rounds', [
+    ('3', {3}),
+    ('1-5,8', {1, 2, 3, 4, 5, 8}),
+    (' 1 - 3 , 7 ', {1, 2, 3, 7}),
+    ('4-4', {4}),
+    ('2,2-3', {2, 3}),
+])
+def test_parse_rounds(value, rounds):
+    assert parse_rounds(value) == rounds
+
+
+@pytest.mark.parametrize('value', ['', '1,,3', '5-2', '0', '0-3', '-3', 'a', '1-b', '1-2-3'])
+def test_parse_invalid_rounds(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_rounds(value)
+
+
+def backfill(collectors=('LapTimesCollector', 'PitStopsCollector'), **kwargs):
+    planned = Backfill(collectors=collectors, **kwargs)
+    planned.season_rounds = lambda years: {year: 3 if year == 2021 else 2 for year in years}
+    return planned
+
+
+def test_plan():
+    assert backfill().plan(2021, 2022) == [
+        WorkUnit('PitStopsCollector', 2021, 1), WorkUnit('LapTimesCollector', 2021, 1),
+        WorkUnit('PitStopsCollector', 2021, 2), WorkUnit('LapTimesCollector', 2021, 2),
+        WorkUnit('PitStopsCollector', 2021, 3), WorkUnit('LapTimesCollector', 2021, 3),
+        WorkUnit('PitStopsCollector', 2022, 1), WorkUnit('LapTimesCollector', 2022, 1),
+        WorkUnit('PitStopsCollector', 2022, 2), WorkUnit('LapTimesCollector', 2022, 2),
+    ]
+
+
+def test_plan_rounds():
+    units = backfill(collectors=['LapTimesCollector']).plan(2021, 2022, rounds=parse_rounds('2-3'))
+    # The rounds a season does not have are left out
+    assert units == [WorkUnit('LapTimesCollector', 2021, 2), WorkUnit('LapTimesCollector', 2021, 3),
+                     WorkUnit('LapTimesCollector', 2022, 2)]
+
+
+@pytest.fixture
+def checkpoints(monkeypatch):
+    """The completed work units of a stub database, without the database driver"""
+    completed = {('LapTimesCollector', 2021, 1), ('PitStopsCollector', 2021, 2), ('LapTimesCollector', 2020, 1)}
+    ranges = list()
+
+    class CheckpointStore:
+        def __init__(self, azure_db):
+            pass
+
+        def completed(self, start_year, end_year):
+            ranges.append((start_year, end_year))
+            return {unit for unit in completed if start_year <= unit[1] <= end_year}
+
+    class AzureDBWrapper:
+        checkpoint_store = CheckpointStore
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            pass
+
+    monkeypatch.setitem(sys.modules, 'utils.azure_wrapper', types.SimpleNamespace(AzureDBWrapper=AzureDBWrapper))
+    return ranges
+
+
+def test_pending_skips_checkpointed_units(checkpoints):
+    planned = backfill()
+    units = planned.plan(2021, 2021, rounds={1, 2})
+    assert planned.pending(units) == [WorkUnit('PitStopsCollector', 2021, 1), WorkUnit('LapTimesCollector', 2021, 2)]
+    assert checkpoints == [(2021, 2021)]
+
+
+def test_pending_rerun(checkpoints):
+    planned = backfill(rerun=True)
+    units = planned.plan(2021, 2021)
+    assert planned.pending(units) == units
+    assert not checkpoints
+
+
+def test_nothing_pending(checkpoints):
+    assert backfill().pending([]) == []
+    assert not checkpoints
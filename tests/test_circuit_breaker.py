@@ -0,0 +1,129 @@
+from utils.circuit_breaker import CircuitBreaker
+from utils.json_decoder import JsonDecoder
+from utils.rate_limiter import RateLimiter
+from utils.requests_wrapper import RequestsWrapper
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def opened(clock, failure_threshold=3, reset_timeout=30):
+    breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout, clock=clock)
+    for _ in range(failure_threshold):
+        breaker.failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, clock=Clock())
+    breaker.failure()
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == 'closed' and breaker.admit() == 0
+    breaker.failure()
+    assert breaker.state == 'open'
+
+
+def test_open_circuit_waits_for_the_reset_timeout():
+    clock = Clock()
+    breaker = opened(clock)
+    assert breaker.admit() == 30
+    clock.now += 20
+    assert breaker.admit() == 10
+
+
+def test_single_probe_after_the_reset_timeout():
+    clock = Clock()
+    breaker = opened(clock)
+    clock.now += 30
+    assert breaker.state == 'half-open'
+    assert breaker.admit() == 0
+    # The other requests wait for the answer of the probe
+    assert breaker.state == 'open'
+    assert breaker.admit() == breaker.probe_poll
+    breaker.success()
+    assert breaker.state == 'closed' and breaker.admit() == 0
+
+
+def test_failed_probe_opens_the_circuit_again():
+    clock = Clock()
+    breaker = opened(clock)
+    clock.now += 30
+    assert breaker.admit() == 0
+    breaker.failure()
+    assert breaker.state == 'open' and breaker.admit() == 30
+
+
+def test_cancelled_probe_lets_another_request_probe():
+    clock = Clock()
+    breaker = opened(clock)
+    clock.now += 30
+    assert breaker.admit() == 0
+    breaker.cancel()
+    assert breaker.admit() == 0
+
+
+def test_throttled_requests_are_no_failures():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, clock=clock)
+    for _ in range(5):
+        breaker.throttled()
+    assert breaker.state == 'closed' and breaker.failures == 0
+
+    # A throttled probe shows that the API answers
+    breaker = opened(clock)
+    clock.now += 30
+    breaker.admit()
+    breaker.throttled()
+    assert breaker.state == 'closed'
+
+
+class Session:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.requests = 0
+
+    def get(self, **kwargs):
+        self.requests += 1
+        status_code = self.statuses.pop(0) if self.statuses else 200
+        content = b'{"MRData": {"total": "0"}}' if status_code == 200 else b''
+        return type('Response', (), {'status_code': status_code, 'ok': status_code == 200, 'content': content,
+                                     'headers': {'Retry-After': '0'} if status_code == 429 else dict()})
+
+    def close(self):
+        pass
+
+
+def wrapper(statuses, breaker):
+    # A fast limiter that never sleeps through the backoff of the retries
+    limiter = RateLimiter(rate=1000, max_rate=1000, min_rate=500, burst=100)
+    request = RequestsWrapper(cache=False, archive=False, decoder=JsonDecoder('simplejson'), rate_limiter=limiter,
+                              circuit_breaker=breaker)
+    request.session = Session(statuses)
+    return request
+
+
+def test_request_waits_for_the_probe(capsys):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    request = wrapper([503, 503, 503], breaker)
+    response = request.get(target='2023/1/laps.json')
+    assert response.ok and response.data == {'MRData': {'total': '0'}}
+    # Two failures open the circuit, the first probe fails and the second one closes it
+    assert request.session.requests == 4 and breaker.state == 'closed'
+    assert 'Circuit Open' in capsys.readouterr().out
+
+
+def test_obeyed_throttling_keeps_the_circuit_closed(capsys):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    request = wrapper([429, 429, 429], breaker)
+    response = request.get(target='2023/1/laps.json')
+    assert response.ok and request.session.requests == 4
+    assert breaker.state == 'closed' and breaker.failures == 0
+    assert 'Circuit Open' not in capsys.readouterr().out
@@ -0,0 +1,57 @@
+import pytest
+
+# The collectors module loads the database driver, which fails to import without the ODBC libraries
+pytest.importorskip('pyodbc', exc_type=ImportError)
+
+from f1 import Result, ResultsCollector
+from utils.column_buffer import ColumnBuffer
+from utils.key_index import KeyIndex
+
+
+def result(driver_id, number, position, grid):
+    return {'number': number, 'position': position, 'points': '0', 'grid': grid, 'laps': '98', 'status': '1',
+            'Driver': {'driverId': driver_id}, 'Constructor': {'constructorId': 'ferrari'}}
+
+
+# The 1956 Argentine Grand Prix: Fangio won in the car of Musso and retired in his own
+shared_drives = {'RaceTable': {'Races': [{'season': '1956', 'round': '1', 'Results': [
+    result('fangio', '34', '1', '3'),
+    result('musso', '34', '1', '3'),
+    result('fangio', '30', '6', '1'),
+]}]}}
+
+
+def test_shared_drives_kept():
+    keys = KeyIndex(columns=ResultsCollector.key_columns)
+    buffer = ColumnBuffer(Result)
+    assert buffer.extract(shared_drives, keep=keys.add, keep_columns=ResultsCollector.key_columns) == 3
+    assert list(zip(buffer.column('driver_id'), buffer.column('number'))) == \
+        [('fangio', '34'), ('musso', '34'), ('fangio', '30')]
+
+
+def test_stored_shared_drives_skipped():
+    keys = KeyIndex(columns=ResultsCollector.key_columns)
+    keys.update([(1956, 1, 'fangio', 34), (1956, 1, 'musso', 34)])
+    buffer = ColumnBuffer(Result)
+    assert buffer.extract(shared_drives, keep=keys.add, keep_columns=ResultsCollector.key_columns) == 1
+    assert buffer.column('number') == ['30']
+
+
+def test_merge_on_the_car_number():
+    from utils.azure_wrapper import AzureDBWrapper
+
+    _, _, merge_query, _ = AzureDBWrapper._merge_queries('results', columns=Result.__slots__,
+                                                         keys=ResultsCollector.key_columns)
+    assert 'ON target.year = source.year AND target.round = source.round AND target.driver_id = source.driver_id ' \
+           'AND target.number = source.number' in merge_query
+    assert 'number = source.number' not in merge_query.split('UPDATE SET')[1].split('WHEN NOT MATCHED')[0]
+
+
+def test_merge_batch_without_duplicate_keys():
+    # An upsert does not skip the stored rows, but a batch repeating a key would make the merge fail
+    keys = KeyIndex(columns=ResultsCollector.key_columns)
+    buffer = ColumnBuffer(Result)
+    buffer.extract(shared_drives, keep=keys.add, keep_columns=ResultsCollector.key_columns)
+    buffer.extract(shared_drives, keep=keys.add, keep_columns=ResultsCollector.key_columns)
+    rows = list(zip(*(buffer.column(column) for column in ResultsCollector.key_columns)))
+    assert len(rows) == len(set(rows)) == 3
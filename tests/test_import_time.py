@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.import_time import dag_imports, dag_modules, heavy_modules, measure, root_directory
+
+# The import time budget of the command line, in milliseconds, as checked by benchmarks.import_time
+budget_ms = 50
+
+
+def test_runner_import_budget():
+    cumulative, modules = measure('runner')
+    assert not modules.intersection(heavy_modules)
+    assert cumulative <= budget_ms * 1000
+
+
+def test_runner_help_without_heavy_modules():
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'runner', '--help'], cwd=root_directory,
+                             capture_output=True, text=True)
+    assert process.returncode == 0, process.stderr
+    # import time: self [us] | cumulative | imported package
+    modules = {line.split('|')[2].strip() for line in process.stderr.splitlines() if line.count('|') == 2}
+    assert not modules.intersection(heavy_modules)
+
+
+def test_dag_top_level_imports():
+    modules = dag_imports(os.path.join(root_directory, 'airflow_init.py'))
+    assert 'registry' in modules
+    for module in modules:
+        top_module = module.split('.')[0]
+        assert top_module in dag_modules or top_module in sys.stdlib_module_names, module
+        assert top_module not in ('f1', 'pyodbc', 'requests', 'utils') and module not in heavy_modules, module
+
+
+def test_registry_without_heavy_modules():
+    # The registry is the only module of the project the DAG file imports when it is parsed
+    _, modules = measure('registry')
+    assert not modules.intersection(heavy_modules)
+    assert not [module for module in modules if module.startswith('utils.')]
@@ -0,0 +1,98 @@
+import itertools
+
+import pytest
+
+from utils.key_index import BloomFilter, KeyIndex
+
+stored = [(2024, current_round, 'albon', lap) for current_round in (1, 2) for lap in range(1, 11)]
+
+
+@pytest.fixture
+def bloom_index(monkeypatch):
+    """A key index of the stored keys small enough to be a Bloom filter, recording the confirmed keys"""
+    monkeypatch.setattr(KeyIndex, 'set_limit', 10)
+    confirmed = list()
+
+    def confirm(key):
+        confirmed.append(key)
+        return key in {KeyIndex.key(row) for row in stored}
+
+    keys = KeyIndex(columns=('year', 'round', 'driver_id', 'lap'), capacity=len(stored), confirm=confirm)
+    keys.update(stored)
+    assert isinstance(keys.keys, BloomFilter)
+    return keys, confirmed
+
+
+def false_positive(keys):
+    # A key of a later round the filter answers for without it being stored
+    return next(row for row in ((2024, 3, 'albon', lap) for lap in itertools.count(1)) if keys.key(row) in keys.keys)
+
+
+def test_set_below_the_limit():
+    keys = KeyIndex(columns=('driver_id',), capacity=10, confirm=lambda key: pytest.fail('confirmed'))
+    keys.update([('albon',)])
+    assert isinstance(keys.keys, set)
+    assert not keys.add('albon')
+    assert keys.add('sainz') and not keys.add('sainz')
+
+
+def test_bloom_hit_confirmed_before_the_row_is_dropped(bloom_index):
+    keys, confirmed = bloom_index
+    assert not keys.add(2024, 1, 'albon', 3)
+    assert confirmed == [('2024', '1', 'albon', '3')]
+
+
+def test_false_positive_kept(bloom_index):
+    keys, confirmed = bloom_index
+    row = false_positive(keys)
+    assert keys.add(*row)
+    assert confirmed == [keys.key(row)]
+    # The row collected again is de-duplicated without a lookup
+    assert not keys.add(*row)
+    assert len(confirmed) == 1
+
+
+def test_bloom_miss_not_confirmed(bloom_index):
+    keys, confirmed = bloom_index
+    rows = [row for row in ((2025, 1, 'albon', lap) for lap in range(1, 200)) if keys.key(row) not in keys.keys]
+    assert all(keys.add(*row) for row in rows)
+    assert not confirmed
+
+
+class AzureDB:
+    """Stub database wrapper storing the keys of a table, counting the key lookups"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.lookups = list()
+
+    def watermark_store(self, azure_db):
+        return None
+
+    def select(self, query, parameters=()):
+        if 'WHERE lap_times.year = ?' in query:
+            self.lookups.append(tuple(parameters))
+            return [{'total': int(tuple(parameters) in {KeyIndex.key(row) for row in self.rows})}]
+        return [{'total': len(self.rows)}]
+
+    def iterate(self, query, parameters=()):
+        return iter(self.rows)
+
+
+def test_collector_confirms_bloom_hits_against_the_table(monkeypatch):
+    # The collectors module loads the database driver, which fails to import without the ODBC libraries
+    pytest.importorskip('pyodbc', exc_type=ImportError)
+    from f1 import LapTimesCollector
+
+    monkeypatch.setattr(KeyIndex, 'set_limit', 10)
+    azure_db = AzureDB(stored)
+    collector = LapTimesCollector(request=object(), azure_db=azure_db)
+    keys = collector._get_key_index(table_name='lap_times', columns=collector.key_columns,
+                                    since={'year': 2024, 'round': 1})
+    assert isinstance(keys.keys, BloomFilter)
+
+    assert not keys.add(2024, 2, 'albon', 7)
+    assert azure_db.lookups == [('2024', '2', 'albon', '7')]
+    row = false_positive(keys)
+    assert keys.add(*row)
+    assert azure_db.lookups[1:] == [keys.key(row)]
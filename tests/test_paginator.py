@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.paginator import Paginator
+
+
+class Request:
+    """Stub requests wrapper serving the pages of a target of total rows, the later pages answering first"""
+
+    def __init__(self, total, limit=30, failed=()):
+        self.total = total
+        self.limit = limit
+        self.failed = set(failed)
+        self.offsets = list()
+        self.lock = threading.Lock()
+
+    def response(self, target, parameters):
+        offset = (parameters or dict()).get('offset', 0)
+        with self.lock:
+            self.offsets.append(offset)
+        response = type('Response', (), dict())()
+        response.status = 500 if offset in self.failed else 200
+        rows = list(range(offset, min(offset + self.limit, self.total)))
+        response.data = {'MRData': {'limit': str(self.limit), 'offset': str(offset), 'total': str(self.total),
+                                    'rows': rows}}
+        return response
+
+    def get(self, target, parameters=None):
+        offset = (parameters or dict()).get('offset', 0)
+        time.sleep(max(0.0, 0.02 - offset / 10000))
+        return self.response(target, parameters)
+
+
+class AsyncRequest(Request):
+    async def get(self, target, parameters=None):
+        offset = (parameters or dict()).get('offset', 0)
+        await asyncio.sleep(max(0.0, 0.02 - offset / 10000))
+        return self.response(target, parameters)
+
+
+def rows(pages):
+    return [row for mr_data in pages for row in mr_data['rows']]
+
+
+@pytest.mark.parametrize('total, offsets', [
+    (0, []),
+    (30, []),
+    (31, [30]),
+    (90, [30, 60]),
+    (95, [30, 60, 90]),
+])
+def test_offsets_cover_the_total(total, offsets):
+    assert list(Paginator.offsets({'limit': '30', 'total': str(total)})) == offsets
+
+
+def test_offsets_without_limit():
+    assert list(Paginator.offsets({'total': '95'})) == []
+
+
+def test_pages_in_offset_order():
+    request = Request(total=200)
+    pages = list(Paginator(request=request, concurrency=8).pages(target='2023/laps.json'))
+    assert [int(mr_data['offset']) for mr_data in pages] == [0, 30, 60, 90, 120, 150, 180]
+    assert rows(pages) == list(range(200))
+    assert sorted(request.offsets) == [0, 30, 60, 90, 120, 150, 180]
+
+
+def test_submitted_pages_in_offset_order():
+    paginator = Paginator(request=Request(total=200), concurrency=8)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        mr_data, next_pages = paginator.submit_pages(executor, target='2023/laps.json')
+        pages = [mr_data] + [next_page.result() for next_page in next_pages]
+    assert rows(pages) == list(range(200))
+
+
+def test_pages_async_in_offset_order():
+    paginator = Paginator(request=None, async_request=AsyncRequest(total=200), concurrency=8)
+    pages = asyncio.run(paginator.pages_async(target='2023/laps.json'))
+    assert rows(pages) == list(range(200))
+
+
+def test_failed_first_page_raises():
+    with pytest.raises(RuntimeError, match='offset 0'):
+        list(Paginator(request=Request(total=100, failed={0})).pages(target='2023/laps.json'))
+
+
+def test_failed_page_raises_instead_of_being_skipped():
+    pages = Paginator(request=Request(total=100, failed={60})).pages(target='2023/laps.json')
+    assert rows([next(pages), next(pages)]) == list(range(60))
+    with pytest.raises(RuntimeError, match='2023/laps.json \\(offset 60\\): 500'):
+        next(pages)
+
+
+def test_failed_submitted_page_raises():
+    paginator = Paginator(request=Request(total=100, failed={30}))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        _, next_pages = paginator.submit_pages(executor, target='2023/laps.json')
+        with pytest.raises(RuntimeError):
+            next_pages[0].result()
+
+
+def test_failed_async_page_raises():
+    paginator = Paginator(request=None, async_request=AsyncRequest(total=100, failed={90}))
+    with pytest.raises(RuntimeError, match='offset 90'):
+        asyncio.run(paginator.pages_async(target='2023/laps.json'))
@@ -0,0 +1,64 @@
+import pytest
+
+from utils.rate_limiter import RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_paced():
+    clock = Clock()
+    limiter = RateLimiter(rate=4, max_rate=8, burst=2, clock=clock)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(0.25)
+    clock.now += 0.25
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(0.25)
+
+
+def test_tokens_capped_at_burst():
+    clock = Clock()
+    limiter = RateLimiter(rate=4, burst=2, clock=clock)
+    clock.now += 60
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    assert limiter.reserve() > 0
+
+
+def test_throttle_halves_the_rate():
+    clock = Clock()
+    limiter = RateLimiter(rate=4, max_rate=8, min_rate=0.5, burst=4, clock=clock)
+    limiter.throttle()
+    assert limiter.rate == 2 and limiter.throttled == 1
+    # The tokens left are dropped, the next request waits for the lower rate
+    assert limiter.reserve() == pytest.approx(0.5)
+    for _ in range(5):
+        limiter.throttle()
+    assert limiter.rate == 0.5
+
+
+def test_success_recovers_the_rate_additively():
+    limiter = RateLimiter(rate=1, max_rate=1.5, increase=0.1, clock=Clock())
+    for _ in range(3):
+        limiter.success()
+    assert limiter.rate == pytest.approx(1.3)
+    for _ in range(10):
+        limiter.success()
+    assert limiter.rate == 1.5
+
+
+def test_retry_after_pauses_every_request():
+    clock = Clock()
+    limiter = RateLimiter(rate=100, burst=10, clock=clock)
+    limiter.throttle(retry_after=5)
+    assert limiter.reserve() == pytest.approx(5)
+    clock.now += 4
+    assert limiter.reserve() == pytest.approx(1)
+    clock.now += 1
+    assert limiter.reserve() == 0
@@ -0,0 +1,84 @@
+import pytest
+import simplejson as json
+
+from utils.json_decoder import JsonDecoder
+from utils.requests_wrapper import RequestsWrapper
+from utils.response_archive import ResponseArchive
+from utils.response_cache import ResponseCache
+
+# The typed decode of the pages, the one stripping the undeclared keys, needs msgspec
+pytest.importorskip('msgspec')
+
+target = '2023/1/laps.json'
+parameters = {'limit': 1000}
+
+# The keys of the envelope, the race and the timing that the typed msgspec decode leaves out
+page = {'MRData': {'xmlns': 'http://ergast.com/mrd/1.5', 'series': 'f1', 'limit': '1000', 'offset': '0',
+                   'total': '1', 'RaceTable': {'season': '2023', 'round': '1', 'Races': [
+                       {'season': '2023', 'round': '1', 'time': '15:00:00Z', 'Laps': [
+                           {'number': '1', 'Timings': [{'driverId': 'max_verstappen', 'position': '1',
+                                                        'time': '1:37.284', 'lapTime': 97284}]}]}]}}}
+content = json.dumps(page).encode('utf-8')
+
+
+class Session:
+    def __init__(self):
+        self.requests = 0
+
+    def get(self, **kwargs):
+        self.requests += 1
+        return type('Response', (), {'status_code': 200, 'ok': True, 'content': content, 'headers': dict()})
+
+    def close(self):
+        pass
+
+
+def wrapper(tmp_path, archive_directory, session):
+    decoder = JsonDecoder('msgspec')
+    request = RequestsWrapper(cache=ResponseCache(directory=str(tmp_path / 'cache'), decoder=decoder),
+                              archive=ResponseArchive(directory=str(tmp_path / archive_directory), decoder=decoder),
+                              decoder=decoder, rate_limiter=False, circuit_breaker=False)
+    request.session = session
+    return request
+
+
+def archived(tmp_path, archive_directory):
+    archive = ResponseArchive(directory=str(tmp_path / archive_directory), decoder=JsonDecoder('simplejson'))
+    try:
+        return archive.read(target=target, parameters=parameters)
+    finally:
+        archive.close()
+
+
+def assert_typed(data):
+    assert 'xmlns' not in data['MRData']
+    race = data['MRData']['RaceTable']['Races'][0]
+    assert 'time' not in race
+    assert race['Laps'][0]['Timings'] == [{'driverId': 'max_verstappen', 'position': '1', 'time': '1:37.284'}]
+
+
+def test_raw_content_cached_and_archived(tmp_path):
+    session = Session()
+    request = wrapper(tmp_path, 'archive', session)
+    response = request.get(target=target)
+    request.close()
+
+    assert response.ok and session.requests == 1
+    assert_typed(response.data)
+    assert request.cache.get(target=target, parameters=parameters)['content'] == content
+    assert archived(tmp_path, 'archive') == page
+
+
+def test_cached_page_archived_raw(tmp_path):
+    request = wrapper(tmp_path, 'archive', Session())
+    request.get(target=target)
+    request.close()
+
+    session = Session()
+    request = wrapper(tmp_path, 'cached_archive', session)
+    response = request.get(target=target)
+    request.close()
+
+    assert response.ok and session.requests == 0
+    assert_typed(response.data)
+    assert archived(tmp_path, 'cached_archive') == page
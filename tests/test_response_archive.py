@@ -0,0 +1,45 @@
+import pytest
+
+from utils.async_requests_wrapper import AsyncRequestsWrapper
+from utils.json_decoder import JsonDecoder
+from utils.requests_wrapper import RequestsWrapper
+from utils.response_archive import ResponseArchive
+
+page = b'{"MRData": {"limit": "30", "offset": "0", "total": "1", "RaceTable": {"season": "2023"}}}'
+
+
+@pytest.fixture
+def shared_archive(tmp_path, monkeypatch):
+    """The process archive of a temporary directory, holding a page and its open memory map"""
+    monkeypatch.setattr(ResponseArchive, '_shared', dict())
+    monkeypatch.setenv('F1_ARCHIVE_DIR', str(tmp_path))
+    monkeypatch.setenv('F1_ARCHIVE_REPLAY', '1')
+    archive = ResponseArchive.shared()
+    archive.decoder = JsonDecoder('simplejson')
+    archive.write(target='2023/1/laps.json', parameters=None, content=page)
+    assert archive.read(target='2023/1/laps.json')['MRData']['total'] == '1'
+    return archive
+
+
+def test_shared_archive_left_open(shared_archive):
+    request = RequestsWrapper(cache=False, decoder=JsonDecoder('simplejson'), rate_limiter=False,
+                              circuit_breaker=False)
+    other_request = RequestsWrapper(cache=False, decoder=JsonDecoder('simplejson'), rate_limiter=False,
+                                    circuit_breaker=False)
+    assert request.archive is other_request.archive is shared_archive
+    maps = dict(shared_archive.maps)
+
+    request.close()
+    assert shared_archive.maps == maps
+    response = other_request.get(target='2023/1/laps.json')
+    assert response.ok and response.data['MRData']['RaceTable'] == {'season': '2023'}
+    other_request.close()
+
+
+def test_async_shared_archive_left_open(shared_archive):
+    async_request = AsyncRequestsWrapper(cache=False, decoder=JsonDecoder('simplejson'), rate_limiter=False,
+                                         circuit_breaker=False)
+    assert async_request.archive is shared_archive
+    maps = dict(shared_archive.maps)
+    async_request.close()
+    assert shared_archive.maps == maps
@@ -0,0 +1,149 @@
+import os
+import time
+
+from datetime import datetime
+
+from utils.json_decoder import JsonDecoder
+from utils.requests_wrapper import RequestsWrapper
+from utils.response_cache import ResponseCache
+
+current_target = f'{datetime.now().year}/1/laps.json'
+finished_target = '2023/1/laps.json'
+parameters = {'limit': 1000}
+content = b'{"MRData": {"total": "0", "RaceTable": {"Races": []}}}'
+
+
+class Session:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or dict()
+        self.requests = list()
+
+    def get(self, **kwargs):
+        self.requests.append(kwargs['headers'])
+        response_content = content if self.status_code == 200 else b''
+        return type('Response', (), {'status_code': self.status_code, 'ok': True, 'content': response_content,
+                                     'headers': self.headers})
+
+    def close(self):
+        pass
+
+
+def cache(tmp_path, **kwargs):
+    return ResponseCache(directory=str(tmp_path), decoder=JsonDecoder('simplejson'), **kwargs)
+
+
+def wrapper(response_cache, session, cache_only=False):
+    request = RequestsWrapper(cache=response_cache, archive=False, decoder=JsonDecoder('simplejson'),
+                              rate_limiter=False, circuit_breaker=False, cache_only=cache_only)
+    request.session = session
+    return request
+
+
+def disk_size(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+
+def test_size_bookkeeping(tmp_path):
+    response_cache = cache(tmp_path)
+    response_cache.set(target=finished_target, parameters=parameters, content=content)
+    assert response_cache.size == disk_size(tmp_path)
+    response_cache.set(target=current_target, parameters=parameters, content=content)
+    response_cache.set(target=current_target, parameters=parameters, content=content + b' ')
+    assert response_cache.size == disk_size(tmp_path)
+
+
+def test_least_recently_used_evicted(tmp_path):
+    response_cache = cache(tmp_path)
+    for round_number in (1, 2):
+        response_cache.set(target=f'2023/{round_number}/laps.json', parameters=parameters, content=content)
+    entry_size = disk_size(tmp_path) // 2
+    # The first round was cached first but read last
+    os.utime(response_cache._path(response_cache.key('2023/2/laps.json', parameters)), (1, 1))
+    assert response_cache.get(target='2023/1/laps.json', parameters=parameters)
+
+    response_cache.max_size = entry_size * 2
+    response_cache.set(target='2023/3/laps.json', parameters=parameters, content=content)
+    assert response_cache.get(target='2023/2/laps.json', parameters=parameters) is None
+    assert response_cache.get(target='2023/1/laps.json', parameters=parameters)
+    assert response_cache.get(target='2023/3/laps.json', parameters=parameters)
+    assert response_cache.size == disk_size(tmp_path) <= response_cache.max_size
+
+
+def test_expiry(tmp_path):
+    response_cache = cache(tmp_path, ttl=60)
+    response_cache.set(target=finished_target, parameters=parameters, content=content)
+    response_cache.set(target=current_target, parameters=parameters, content=content)
+
+    finished = response_cache.get(target=finished_target, parameters=parameters)
+    assert finished['expires'] is None and response_cache.is_fresh(finished)
+    current = response_cache.get(target=current_target, parameters=parameters)
+    assert time.time() < current['expires'] <= time.time() + 60 and response_cache.is_fresh(current)
+    current['expires'] = time.time() - 1
+    assert not response_cache.is_fresh(current)
+    assert current['content'] == content
+
+
+def test_fresh_entry_served_without_request(tmp_path):
+    session = Session()
+    request = wrapper(cache(tmp_path), session)
+    assert request.get(target=current_target).data == request.get(target=current_target).data
+    assert len(session.requests) == 1
+
+
+def test_stale_entry_revalidated(tmp_path, monkeypatch):
+    response_cache = cache(tmp_path)
+    expires = response_cache._expires
+    monkeypatch.setattr(response_cache, '_expires', lambda target: time.time() - 1)
+    headers = {'ETag': '"v1"', 'Last-Modified': 'Sun, 01 Jan 2023 00:00:00 GMT'}
+    wrapper(response_cache, Session(headers=headers)).get(target=current_target)
+
+    session = Session(status_code=304)
+    monkeypatch.setattr(response_cache, '_expires', expires)
+    response = wrapper(response_cache, session).get(target=current_target)
+    assert response.ok and response.status == 200
+    assert response.data['MRData']['total'] == '0'
+    assert session.requests == [{'If-None-Match': '"v1"', 'If-Modified-Since': 'Sun, 01 Jan 2023 00:00:00 GMT'}]
+
+    # The revalidated entry is fresh again, with its validators
+    entry = response_cache.get(target=current_target, parameters=parameters)
+    assert response_cache.is_fresh(entry) and entry['etag'] == '"v1"'
+
+
+def test_cache_only(tmp_path, monkeypatch):
+    response_cache = cache(tmp_path)
+    session = Session()
+    response = wrapper(response_cache, session, cache_only=True).get(target=current_target)
+    assert not response.ok and response.status == 'Not Cached'
+
+    # Stale entries are served too
+    monkeypatch.setattr(response_cache, '_expires', lambda target: time.time() - 1)
+    response_cache.set(target=current_target, parameters=parameters, content=content)
+    response = wrapper(response_cache, session, cache_only=True).get(target=current_target)
+    assert response.ok and response.data['MRData']['total'] == '0'
+    assert not session.requests
+
+
+def test_former_entry_missed(tmp_path):
+    response_cache = cache(tmp_path)
+    path = response_cache._path(response_cache.key(finished_target, parameters))
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'w', encoding='utf-8') as cache_file:
+        cache_file.write('{"target": "2023/1/laps.json", "expires": null, "data": {"MRData": {}}}')
+    assert response_cache.get(target=finished_target, parameters=parameters) is None
+
+
+def test_failed_write_not_retried(tmp_path, monkeypatch):
+    from utils.circuit_breaker import CircuitBreaker
+
+    def set(**kwargs):
+        raise OSError(28, 'No space left on device')
+
+    response_cache = cache(tmp_path)
+    monkeypatch.setattr(response_cache, 'set', set)
+    session = Session()
+    request = wrapper(response_cache, session)
+    request.circuit_breaker = CircuitBreaker()
+    response = request.get(target=current_target)
+    assert response.ok and response.data['MRData']['total'] == '0'
+    assert len(session.requests) == 1 and request.circuit_breaker.failures == 0
@@ -0,0 +1,104 @@
+import pytest
+
+from utils.column_buffer import ColumnBuffer
+from utils.row_mapping import RowMapping
+from utils.utils import durations_to_milliseconds
+
+
+class Lap:
+    __slots__ = ('year', 'round', 'lap', 'driver_id', 'position', 'time', 'milliseconds', 'comment')
+    mapping = RowMapping(rows=('RaceTable.Races', 'Laps', 'Timings'),
+                         fields={'year': 'Races:season', 'round': 'Races:round', 'lap': 'Laps:number',
+                                 'driver_id': 'driverId', 'position': 'position', 'time': 'time'},
+                         converters={'milliseconds': (durations_to_milliseconds, 'time')})
+
+
+class Result:
+    __slots__ = ('year', 'driver_id', 'fastest_lap_time', 'fastest_lap_rank')
+    mapping = RowMapping(rows=('RaceTable.Races', 'Results'),
+                         fields={'year': 'Races:season', 'driver_id': 'Driver.driverId',
+                                 'fastest_lap_time': 'FastestLap.Time.time?', 'fastest_lap_rank': 'FastestLap.rank?'})
+
+
+def timing(driver_id, position, time):
+    return {'driverId': driver_id, 'position': position, 'time': time}
+
+
+laps_page = {'RaceTable': {'Races': [
+    {'season': '2023', 'round': '1', 'Laps': [
+        {'number': '1', 'Timings': [timing('max_verstappen', '1', '1:37.284'), timing('leclerc', '2', '1:38.211')]},
+        {'number': '2', 'Timings': [timing('max_verstappen', '1', '1:36.012')]},
+    ]},
+    {'season': '2023', 'round': '2', 'Laps': [
+        {'number': '1', 'Timings': [timing('perez', '1', '1:35.500')]},
+    ]},
+]}}
+
+results_page = {'RaceTable': {'Races': [{'season': '2023', 'Results': [
+    {'Driver': {'driverId': 'max_verstappen'}, 'FastestLap': {'rank': '1', 'Time': {'time': '1:33.996'}}},
+    {'Driver': {'driverId': 'sargeant'}, 'FastestLap': {'rank': '12'}},
+    {'Driver': {'driverId': 'stroll'}},
+]}]}}
+
+
+def test_scoped_fields():
+    buffer = ColumnBuffer(Lap)
+    assert buffer.extract(laps_page) == 4
+    assert buffer.column('year') == ['2023'] * 4
+    assert buffer.column('round') == ['1', '1', '1', '2']
+    assert buffer.column('lap') == ['1', '1', '2', '1']
+    assert buffer.column('driver_id') == ['max_verstappen', 'leclerc', 'max_verstappen', 'perez']
+    assert buffer.column('position') == ['1', '2', '1', '1']
+
+
+def test_converters_and_unmapped_columns():
+    buffer = ColumnBuffer(Lap)
+    buffer.extract(laps_page)
+    buffer.extract(laps_page)
+    assert buffer.column('milliseconds') == [97284, 98211, 96012, 95500] * 2
+    assert buffer.column('comment') == [None] * 8
+
+
+def test_optional_paths():
+    buffer = ColumnBuffer(Result)
+    assert buffer.extract(results_page) == 3
+    assert buffer.column('fastest_lap_time') == ['1:33.996', None, None]
+    assert buffer.column('fastest_lap_rank') == ['1', '12', None]
+
+
+def test_required_path_missing():
+    buffer = ColumnBuffer(Result)
+    with pytest.raises(KeyError):
+        buffer.extract({'RaceTable': {'Races': [{'season': '2023', 'Results': [{'FastestLap': {}}]}]}})
+
+
+def test_keep_columns():
+    seen = list()
+
+    def keep(year, lap, driver_id):
+        seen.append((year, lap, driver_id))
+        return driver_id != 'leclerc'
+
+    buffer = ColumnBuffer(Lap)
+    assert buffer.extract(laps_page, keep=keep, keep_columns=('year', 'lap', 'driver_id')) == 3
+    assert seen == [('2023', '1', 'max_verstappen'), ('2023', '1', 'leclerc'), ('2023', '2', 'max_verstappen'),
+                    ('2023', '1', 'perez')]
+    assert buffer.column('driver_id') == ['max_verstappen', 'max_verstappen', 'perez']
+    assert buffer.column('milliseconds') == [97284, 96012, 95500]
+
+
+def test_compile():
+    extract = Result.mapping.compile(columns=('driver_id', 'year', 'unmapped'))
+    data = {'driver_id': list(), 'year': list(), 'unmapped': list()}
+    assert extract(results_page, data, None) == 3
+    assert data == {'driver_id': ['max_verstappen', 'sargeant', 'stroll'], 'year': ['2023'] * 3,
+                    'unmapped': [None] * 3}
+
+
+def test_compiled_once_per_columns():
+    buffer = ColumnBuffer(Result)
+    buffer.extract(results_page)
+    extractor = Result.mapping.extractors[(buffer.columns, ())]
+    buffer.extract(results_page)
+    assert Result.mapping.extractors[(buffer.columns, ())] is extractor
+    assert len(buffer) == 6
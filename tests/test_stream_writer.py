@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from utils.stream_writer import StreamWriter
+
+
+class AzureDB:
+    """Stub database wrapper failing the insert of the failed chunks, holding each insert until it is released"""
+
+    def __init__(self, failed=(), error=None):
+        self.failed = set(failed)
+        self.error = error
+        self.inserted = list()
+        self.released = threading.Event()
+        self.released.set()
+
+    def insert(self, table_name, data, statements=None, keys=None):
+        self.released.wait(timeout=5)
+        if data[0] in self.failed:
+            if self.error:
+                raise self.error
+            return None
+        self.inserted.append(data)
+        return len(data)
+
+
+def failed(writer):
+    deadline = time.monotonic() + 5
+    while writer.error is None and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return writer.error
+
+
+def test_chunks_inserted_in_order():
+    azure_db = AzureDB()
+    writer = StreamWriter(azure_db=azure_db, table_name='lap_times', queue_size=2)
+    for chunk in ([1, 2], [3], [4, 5, 6]):
+        writer.put(chunk)
+    assert writer.close() == 6
+    assert azure_db.inserted == [[1, 2], [3], [4, 5, 6]]
+
+
+def test_failure_raised_on_the_next_put():
+    writer = StreamWriter(azure_db=AzureDB(failed={3}), table_name='lap_times')
+    writer.put([1, 2])
+    writer.put([3])
+    assert failed(writer) == 'Failed to insert 1 rows in lap_times'
+    with pytest.raises(RuntimeError, match='Failed to insert 1 rows in lap_times'):
+        writer.put([4])
+    with pytest.raises(RuntimeError):
+        writer.close()
+
+
+def test_failure_raised_on_close():
+    writer = StreamWriter(azure_db=AzureDB(failed={3}), table_name='lap_times')
+    writer.put([1, 2])
+    writer.put([3])
+    with pytest.raises(RuntimeError, match='Failed to insert 1 rows in lap_times'):
+        writer.close()
+
+
+def test_chunks_after_a_failure_not_written():
+    azure_db = AzureDB(failed={3})
+    azure_db.released.clear()
+    writer = StreamWriter(azure_db=azure_db, table_name='lap_times', queue_size=4)
+    # The chunks are queued before the writer fails on the second one
+    for chunk in ([1, 2], [3], [4], [5, 6]):
+        writer.put(chunk)
+    azure_db.released.set()
+    with pytest.raises(RuntimeError):
+        writer.close()
+    assert azure_db.inserted == [[1, 2]]
+    assert writer.rows == 2
+
+
+def test_insert_exception_surfaces_without_blocking_the_producer():
+    azure_db = AzureDB(failed={1}, error=RuntimeError('Timed out waiting for a connection'))
+    writer = StreamWriter(azure_db=azure_db, table_name='lap_times', queue_size=1)
+    writer.put([1])
+    assert failed(writer) == 'Failed to insert 1 rows in lap_times: Timed out waiting for a connection'
+    with pytest.raises(RuntimeError, match='Timed out'):
+        writer.put([2])
+    with pytest.raises(RuntimeError, match='Timed out'):
+        writer.close()
+    assert azure_db.inserted == []
@@ -0,0 +1,29 @@
+import pytest
+
+from utils.utils import duration_to_milliseconds, durations_to_milliseconds
+
+
+@pytest.mark.parametrize('duration, milliseconds', [
+    ('1:23.456', 83456),
+    ('0:59.999', 59999),
+    ('16:44.073', 1004073),
+    ('1:02:03.456', 3723456),
+    ('2:00:00.000', 7200000),
+    ('23.456', 23456),
+    ('22.5', 22500),
+    ('1:23.4567', 83456),
+    ('1:23', 83000),
+    ('42', 42000),
+])
+def test_duration_to_milliseconds(duration, milliseconds):
+    assert duration_to_milliseconds(duration) == milliseconds
+
+
+@pytest.mark.parametrize('duration', ['', None])
+def test_empty_duration(duration):
+    assert duration_to_milliseconds(duration) is None
+
+
+def test_durations_to_milliseconds():
+    assert durations_to_milliseconds(['1:23.456', None, '', '1:02:03.456', '23.456']) == \
+        [83456, None, None, 3723456, 23456]
@@ -0,0 +1,67 @@
+import pytest
+
+# The collectors and the SQLite stand-in of the database load the database driver
+pytest.importorskip('pyodbc', exc_type=ImportError)
+
+from benchmarks.sqlite_db import SQLiteDBWrapper
+from f1 import PitStop, PitStopsCollector
+from utils.column_buffer import ColumnBuffer
+from utils.watermark_store import WatermarkStore
+
+
+@pytest.fixture
+def azure_db(tmp_path):
+    azure_db = SQLiteDBWrapper(str(tmp_path / 'db.sqlite'))
+    yield azure_db
+    azure_db.close()
+
+
+def collected(azure_db, **bounds):
+    collector = PitStopsCollector(request=object(), azure_db=azure_db)
+    for name, value in bounds.items():
+        setattr(collector, name, value)
+    for year, current_round, stop in ((2024, 21, 1), (2024, 22, 1), (2024, 22, 2)):
+        collector.pit_stops_data.append(driver_id='albon', stop=stop, year=year, round=current_round)
+    return collector
+
+
+def test_watermark_of_the_last_round(azure_db):
+    collector = collected(azure_db)
+    assert collector._watermark_statements(collector.pit_stops_data) == \
+        [(azure_db.watermark_store.update_query, ('PitStopsCollector', 2024, 22, 2))]
+    assert collector._watermark_statements(ColumnBuffer(PitStop)) == []
+
+
+@pytest.mark.parametrize('bounds', [
+    {'start_year': 2024},
+    {'start_year': 2024, 'start_round': 21},
+    {'end_year': 2024},
+    {'start_year': 2024, 'start_round': 21, 'end_year': 2024, 'end_round': 22},
+])
+def test_bounded_run_leaves_the_watermark(azure_db, bounds):
+    collector = collected(azure_db, **bounds)
+    assert collector._watermark_statements(collector.pit_stops_data) == []
+
+
+def test_watermark_only_moves_forward(azure_db):
+    watermarks = azure_db.watermark_store(azure_db)
+
+    def update(year, current_round, offset):
+        query, parameters = watermarks.statement(collector='PitStopsCollector', year=year, round=current_round,
+                                                 offset=offset)
+        azure_db.execute(query=query, parameters=parameters)
+        return watermarks.get('PitStopsCollector')
+
+    assert watermarks.get('PitStopsCollector') is None
+    assert update(2024, 22, 40) == {'year': 2024, 'round': 22, 'offset': 40}
+    assert update(2021, 3, 10) == {'year': 2024, 'round': 22, 'offset': 40}
+    assert update(2024, 21, 10) == {'year': 2024, 'round': 22, 'offset': 40}
+    # The rows streamed later in the same round move its offset
+    assert update(2024, 22, 60) == {'year': 2024, 'round': 22, 'offset': 60}
+    assert update(2025, 1, 5) == {'year': 2025, 'round': 1, 'offset': 5}
+
+
+def test_azure_merge_only_moves_forward():
+    condition = 'WHEN MATCHED AND (source.year > target.year OR (source.year = target.year ' \
+                'AND source.round >= target.round)) THEN'
+    assert condition in ' '.join(WatermarkStore.update_query.split())
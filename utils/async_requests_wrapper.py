@@ -0,0 +1,282 @@
+import asyncio
+import os
+import threading
+import requests
+
+from functools import partial
+from http.client import responses
+
+from utils.circuit_breaker import CircuitBreaker
+from utils.json_decoder import JsonDecoder
+from utils.metrics import Metrics
+from utils.rate_limiter import RateLimiter
+from utils.requests_wrapper import Response, RequestsWrapper
+from utils.response_archive import ResponseArchive
+from utils.response_cache import ResponseCache
+from utils.utils import exponential_backoff_retries
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+
+class AsyncRequestsWrapper:
+    """Async counterpart of RequestsWrapper, fetching from a single event loop
+
+    Identical in-flight requests are coalesced, so that concurrent callers of the same page share one fetch.
+    The requests are sent with httpx, over HTTP/2 when the h2 package is installed and F1_HTTP2 is not 0.
+    Without httpx they fall back to a requests session run in the default executor.
+    """
+
+    def __init__(self, cache=None, pool_size=None, rate_limiter=None, circuit_breaker=None, http2=None,
+                 decoder=None, archive=None, cache_only=False):
+        """
+            Initialize the wrapper
+        :param cache: The response cache, None to create it from the environment or False to disable it
+        :param pool_size: The maximum number of open connections
+        :param rate_limiter: The rate limiter, the process one by default or False to disable it
+        :param circuit_breaker: The circuit breaker, the process one by default or False to disable it
+        :param http2: Negotiate HTTP/2, by default when the h2 package is installed
+        :param decoder: The JSON decoder of the pages, the one of F1_JSON_DECODER by default
+        :param archive: The response archive, None to create it from the environment or False to disable it
+        :param cache_only: Serve the requests from the response cache only, without any network request
+        """
+        self.prefix = 'https://ergast.com/api/f1'
+        self.pool_size = int(pool_size or os.environ.get('F1_CONCURRENCY', 8))
+        self.decoder = decoder or JsonDecoder.from_env()
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self.archive = archive if archive is not None else ResponseArchive.shared()
+        self.metrics = Metrics.shared()
+        self.cache_only = cache_only
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter.shared()
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker.shared()
+        if http2 is None:
+            http2 = h2 is not None and os.environ.get('F1_HTTP2', '1') != '0'
+        self.http2 = http2 and httpx is not None
+        self.client = None
+        self.session = None
+        self.in_flight = dict()
+        self.coalesced = 0
+        self.loop = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        client = 'httpx' if httpx is not None else 'requests'
+        return f'{self.__class__.__name__}({client}, http2={self.http2}, coalesced={self.coalesced})'
+
+    def _get_client(self):
+        """
+            Get the long-lived client of the event loop, creating it on first use
+        :return: The httpx client, or the requests session without httpx
+        """
+        if httpx is not None:
+            if self.client is None:
+                limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+                self.client = httpx.AsyncClient(http2=self.http2, limits=limits, timeout=300,
+                                                headers={'Accept-Encoding': 'gzip, deflate'})
+            return self.client
+        if self.session is None:
+            # The session is only used from the default executor, its pool is sized like the sync wrapper's
+            self.session = RequestsWrapper(cache=False, pool_size=self.pool_size)._get_session()
+        return self.session
+
+    async def _send(self, url, params, headers):
+        """
+            Send a single GET request
+        :param url: The URL
+        :param params: The query parameters
+        :param headers: The request headers
+        :return: The response, with status_code, headers and content like both clients provide
+        """
+        client = self._get_client()
+        if httpx is not None:
+            return await client.get(url, params=params, headers=headers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(client.get, url, params=params, headers=headers, timeout=300))
+
+    async def _acquire(self):
+        """Wait for the rate limiter without blocking the event loop"""
+        wait = self.rate_limiter.reserve()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.rate_limiter.reserve()
+
+    async def _execute(self, target, response, params):
+        url = f'{self.prefix}/{target}'
+
+        if self.archive and self.archive.replay:
+            RequestsWrapper._set_archived(response=response, archive=self.archive, target=target, params=params)
+            return
+
+        cache_entry = self.cache.get(target=target, parameters=params) if self.cache else None
+        if self.cache_only:
+            RequestsWrapper._set_cache_only(response=response, cache_entry=cache_entry, decoder=self.decoder,
+                                            metrics=self.metrics, target=target, params=params)
+            return
+        if cache_entry and self.cache.is_fresh(cache_entry):
+            self.metrics.increment('cache_hits')
+            RequestsWrapper._set_cached(response=response, cache_entry=cache_entry, decoder=self.decoder)
+            RequestsWrapper._archive_cached(archive=self.archive, target=target, params=params,
+                                            cache_entry=cache_entry)
+            return
+
+        headers = dict()
+        if cache_entry and cache_entry.get('etag'):
+            headers['If-None-Match'] = cache_entry['etag']
+        if cache_entry and cache_entry.get('last_modified'):
+            headers['If-Modified-Since'] = cache_entry['last_modified']
+
+        for attempt, sleep_time in enumerate(exponential_backoff_retries()):
+            if attempt:
+                self.metrics.increment('retries')
+            delay = self.circuit_breaker.admit() if self.circuit_breaker else 0
+            if delay:
+                print(f'Circuit Open (get): {url}')
+                while delay:
+                    await asyncio.sleep(delay)
+                    delay = self.circuit_breaker.admit()
+            try:
+                if self.rate_limiter:
+                    await self._acquire()
+                with self.metrics.timer('request'):
+                    request_response = await self._send(url=url, params=params, headers=headers)
+                self.metrics.increment('requests', status=request_response.status_code)
+                self.metrics.increment('response_bytes', len(request_response.content))
+
+                if request_response.status_code == 429 or request_response.status_code >= 500:
+                    retry_after = RequestsWrapper._retry_after(request_response)
+                    if self.rate_limiter:
+                        self.rate_limiter.throttle(retry_after=retry_after)
+                    if self.circuit_breaker:
+                        if request_response.status_code == 429:
+                            self.circuit_breaker.throttled()
+                        else:
+                            self.circuit_breaker.failure()
+                    response.ok = False
+                    response.status = request_response.status_code
+                    response.description = responses.get(request_response.status_code, None)
+                    print(f'{request_response.status_code} (get): {url}')
+                    if not self.rate_limiter:
+                        await asyncio.sleep(retry_after or sleep_time)
+                    continue
+
+                if self.rate_limiter:
+                    self.rate_limiter.success()
+                if self.circuit_breaker:
+                    self.circuit_breaker.success()
+                if request_response.status_code == 304 and cache_entry:
+                    RequestsWrapper._write_locally(self.cache.refresh, target=target, parameters=params,
+                                                   entry=cache_entry)
+                    RequestsWrapper._set_cached(response=response, cache_entry=cache_entry, decoder=self.decoder)
+                    RequestsWrapper._archive_cached(archive=self.archive, target=target, params=params,
+                                                    cache_entry=cache_entry)
+                    break
+
+                response.ok = request_response.status_code < 400
+                response.status = request_response.status_code
+                response.description = responses.get(request_response.status_code, None)
+                if response.ok:
+                    try:
+                        with self.metrics.timer('decode'):
+                            response.data = self.decoder.decode(request_response.content, page=True)
+                        response.content = request_response.content
+                        if self.archive:
+                            RequestsWrapper._write_locally(self.archive.write, target=target, parameters=params,
+                                                           content=request_response.content)
+                        if self.cache:
+                            RequestsWrapper._write_locally(self.cache.set, target=target, parameters=params,
+                                                           content=request_response.content,
+                                                           etag=request_response.headers.get('ETag'),
+                                                           last_modified=request_response.headers.get('Last-Modified'))
+                    except ValueError:
+                        response.data = dict()
+
+                # Other client errors are not retried
+                break
+
+            except asyncio.CancelledError:
+                if self.circuit_breaker:
+                    # A cancelled probe would leave the other requests waiting for its answer
+                    self.circuit_breaker.cancel()
+                raise
+            except Exception as exception:
+                response.status = 'Connection Error' if isinstance(exception, (OSError, requests.ConnectionError)) \
+                    else 'Exception'
+                response.description = exception
+                print(f'{response.status} (get): {url}')
+                if self.circuit_breaker:
+                    self.circuit_breaker.failure()
+                await asyncio.sleep(sleep_time)
+
+    async def get(self, target, parameters=None):
+        """
+            Get data from target, sharing the fetch of an identical request already in flight
+        :param target: The request target
+        :param parameters: The request parameters
+        :return: The response, shared by the coalesced callers so it must not be modified
+        """
+        params = {
+            'limit': 1000,
+        }
+        if parameters:
+            for parameter, value in parameters.items():
+                params[parameter] = value
+
+        key = (target, tuple(sorted(params.items())))
+        fetch = self.in_flight.get(key)
+        if fetch is None:
+            response = Response()
+            fetch = asyncio.ensure_future(self._execute(target=target, response=response, params=params))
+            fetch.response = response
+            self.in_flight[key] = fetch
+            fetch.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        # Shielded, so that a cancelled caller does not cancel the fetch of the others
+        await asyncio.shield(fetch)
+        return fetch.response
+
+    def _get_loop(self):
+        """
+            Get the event loop of the wrapper, running in a background thread
+        :return: The event loop
+        """
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self.loop.run_forever, name='async_requests', daemon=True)
+                self.thread.start()
+        return self.loop
+
+    def submit(self, coroutine):
+        """
+            Run a coroutine on the event loop of the wrapper, from any thread
+        :param coroutine: The coroutine
+        :return: A concurrent.futures.Future of its result
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._get_loop())
+
+    async def _close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def close(self):
+        """Close the client and stop the event loop, the archive is left open for the other wrappers sharing it"""
+        if self.loop is not None:
+            self.submit(self._close()).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+        if self.session is not None:
+            self.session.close()
+            self.session = None
@@ -1,65 +1,322 @@
 import pyodbc
+import threading
 import time
 import os
 
+from contextlib import contextmanager
+
+from utils.metrics import Metrics
 from utils.utils import exponential_backoff_retries, batch
+from utils.checkpoint_store import CheckpointStore
+from utils.watermark_store import WatermarkStore
+
+
+class ConnectionPool:
+    """Pool of lazily created database connections, health-checked before reuse"""
+
+    def __init__(self, connect, max_size=None, health_check_interval=None):
+        """
+            Initialize the pool
+        :param connect: The function creating a new connection
+        :param max_size: The maximum number of open connections
+        :param health_check_interval: The idle seconds after which a connection is checked before reuse
+        """
+        self.connect = connect
+        self.max_size = int(max_size or os.environ.get('DB_POOL_SIZE', 4))
+        self.health_check_interval = int(health_check_interval or os.environ.get('DB_POOL_HEALTH_CHECK', 60))
+        self.idle = list()
+        self.size = 0
+        self.condition = threading.Condition()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(size={self.size}, idle={len(self.idle)})'
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.cursor().execute('SELECT 1').fetchall()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def acquire(self):
+        """
+            Get an idle connection or open a new one while the pool has room
+        :return: The connection
+        """
+        with self.condition:
+            while not self.idle and self.size >= self.max_size:
+                self.condition.wait()
+            if self.idle:
+                conn, last_used = self.idle.pop()
+            else:
+                conn, last_used = None, None
+                self.size += 1
+
+        if conn is not None and time.time() - last_used > self.health_check_interval and not self._is_healthy(conn):
+            # Replace the broken connection, keeping its slot in the pool
+            try:
+                conn.close()
+            except pyodbc.Error:
+                pass
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self.connect()
+            except pyodbc.Error:
+                with self.condition:
+                    self.size -= 1
+                    self.condition.notify()
+                raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+            Return a connection to the pool
+        :param conn: The connection
+        :param discard: Close the connection instead, e.g. after an error
+        """
+        if discard:
+            self._discard(conn)
+            return
+        with self.condition:
+            self.idle.append((conn, time.time()))
+            self.condition.notify()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with block"""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except pyodbc.Error:
+            discard = True
+            raise
+        except BaseException:
+            # Leave no uncommitted work behind on a connection going back to the pool, also when an iterate()
+            # generator is closed early. A connection that cannot roll back is not reused.
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            # The slot of the connection always goes back to the pool, whatever happened in the with block
+            self.release(conn, discard=discard)
+
+    def close(self):
+        """Close all the idle connections"""
+        with self.condition:
+            idle, self.idle = self.idle, list()
+        for conn, _ in idle:
+            self._discard(conn)
 
 
 class AzureDBWrapper:
+    batch_size = 5000
+    watermark_store = WatermarkStore
+    checkpoint_store = CheckpointStore
+
     def __init__(self):
         self.server = os.environ.get('DB_SERVER')
         self.database = os.environ.get('DB_NAME')
         self.port = os.environ.get('DB_PORT')
         self.username = os.environ.get('DB_USERNAME')
         self.password = os.environ.get('DB_PASSWORD')
-        self.conn = None
-        self.cursor = None
+        self.pool = ConnectionPool(connect=self.connect)
+        # Read the database but never write to it, reporting the rows that would be inserted
+        self.dry_run = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def connect(self):
+        """
+            Open a new connection, retrying with exponential backoff
+        :return: The connection
+        """
+        error = None
         for sleep_time in exponential_backoff_retries():
             try:
                 conn_str = f'DRIVER=ODBC Driver 17 for SQL Server;SERVER={self.server};DATABASE={self.database};UID={self.username};PWD={self.password}'
-                self.conn = pyodbc.connect(conn_str)
-                self.cursor = self.conn.cursor()
+                return pyodbc.connect(conn_str)
             except pyodbc.Error as e:
                 print(f'Error connecting to Azure SQL Database: {str(e)}')
+                error = e
                 time.sleep(sleep_time)
+        raise error
 
     def close(self):
-        if self.conn:
-            self.conn.close()
+        self.pool.close()
 
-    def select(self, query):
+    def select(self, query, parameters=()):
         try:
-            self.connect()
-            self.cursor.execute(query)
-            columns = [column[0] for column in self.cursor.description]
-            data = [dict(zip(columns, data_row)) for data_row in self.cursor.fetchall()]
-            self.close()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, *parameters)
+                columns = [column[0] for column in cursor.description]
+                data = [dict(zip(columns, data_row)) for data_row in cursor.fetchall()]
             return data
         except pyodbc.Error as e:
             print(f'Error executing query: {str(e)}')
             return None
 
-    def insert(self, table_name, data):
+    def iterate(self, query, parameters=(), size=None):
+        """
+            Iterate the rows of a query in chunks, without loading the whole result
+        :param query: The query
+        :param parameters: The query parameters
+        :param size: The number of rows per fetch
+        :return: A generator of row tuples
+        """
+        size = size or self.batch_size
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, *parameters)
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                yield from (tuple(row) for row in rows)
+
+    def execute(self, query, parameters=()):
+        """
+            Execute and commit a statement
+        :param query: The query
+        :param parameters: The query parameters
+        :return: The number of affected rows or None if the statement failed
+        """
+        if self.dry_run:
+            print(f'Dry run, skipped statement: {" ".join(query.split())[:80]}')
+            return 0
         try:
-            self.connect()
-            columns = [column[3] for column in self.cursor.columns(table=table_name) if 'identity' not in column[5]]
-            placeholders = ','.join(['?'] * len(columns))
-
-            query = f"INSERT INTO {table_name} ({','.join(columns)}) VALUES ({placeholders})"
-            prepared_data = list()
-            for obj in data:
-                values = [getattr(obj, col) for col in columns]
-                prepared_data.append(tuple(values))
-            affected_rows = 0
-
-            for data_batch in batch(prepared_data):
-                self.cursor.executemany(query, data_batch)
-                self.conn.commit()
-                affected_rows += sum(abs(self.cursor.rowcount) for _ in data)
-            self.close()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, *parameters)
+                affected_rows = cursor.rowcount
+                conn.commit()
+            return affected_rows
+        except pyodbc.Error as e:
+            print(f'Error executing statement: {str(e)}')
+            return None
+
+    @staticmethod
+    def _merge_queries(table_name, columns, keys):
+        """
+            Build the queries staging rows in a temp table and merging them into a table on their natural keys
+        :param table_name: The table name
+        :param columns: The inserted columns
+        :param keys: The natural key columns
+        :return: The staging table name, and its create, merge and drop queries
+        """
+        staging_table = f'#{table_name}_staging'
+        create_query = f"SELECT TOP 0 {','.join(columns)} INTO {staging_table} FROM {table_name}"
+
+        on = ' AND '.join(f'target.{key} = source.{key}' for key in keys)
+        updates = ', '.join(f'{column} = source.{column}' for column in columns if column not in keys)
+        matched = f'WHEN MATCHED THEN UPDATE SET {updates}' if updates else ''
+        merge_query = f"""
+            MERGE {table_name} WITH (HOLDLOCK) AS target
+            USING {staging_table} AS source ON {on}
+            {matched}
+            WHEN NOT MATCHED THEN
+                INSERT ({','.join(columns)}) VALUES ({','.join(f'source.{column}' for column in columns)});
+        """
+
+        drop_query = f'DROP TABLE {staging_table}'
+        return staging_table, create_query, merge_query, drop_query
+
+    def insert(self, table_name, data, mode=None, commit_size=None, statements=None, keys=None):
+        """
+            Bulk insert data in a single transaction
+        :param table_name: The table name
+        :param data: A column buffer or the objects to insert, with an attribute per column
+        :param mode: 'fast' for fast_executemany with typed input sizes, 'tvp' to send the rows as a
+            table-valued parameter of the dbo.<table_name>_type table type, or 'plain' for a plain executemany
+        :param commit_size: The number of rows per commit, all rows are committed at once by default
+        :param statements: The (query, parameters) statements to run in the last transaction of the insert,
+            e.g. the watermark update of the collector
+        :param keys: The natural key columns to upsert the rows on. The rows are bulk loaded into a temp staging
+            table and merged into the table in one statement, so that re-ingesting rows updates them in place
+        :return: The number of inserted rows, or of inserted and updated rows of an upsert
+        """
+        if self.dry_run:
+            print(f'Dry run, skipped {len(data)} rows of {table_name}')
+            return len(data)
+        mode = mode or os.environ.get('DB_INSERT_MODE', 'fast')
+        commit_size = int(commit_size or os.environ.get('DB_COMMIT_SIZE', 0))
+        metrics = Metrics.shared()
+        start = time.perf_counter()
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                table_columns = [column for column in cursor.columns(table=table_name) if 'identity' not in column[5]]
+                columns = [column[3] for column in table_columns]
+                placeholders = ','.join(['?'] * len(columns))
+
+                target_table = table_name
+                if keys:
+                    target_table, create_query, merge_query, drop_query = self._merge_queries(table_name, columns, keys)
+                    cursor.execute(create_query)
+                    # The staged rows are merged at once, so they are committed with the merge
+                    commit_size = 0
+
+                query = f"INSERT INTO {target_table} ({','.join(columns)}) VALUES ({placeholders})"
+                if hasattr(data, 'rows'):
+                    # Column buffers are zipped straight into rows in the table column order
+                    prepared_data = data.rows(columns)
+                else:
+                    prepared_data = [tuple(getattr(obj, col) for col in columns) for obj in data]
+                affected_rows = 0
+
+                if mode == 'tvp':
+                    # The first two items of a table-valued parameter are the table type name and schema
+                    tvp = [f'{table_name}_type', 'dbo'] + prepared_data
+                    cursor.execute(f"INSERT INTO {target_table} ({','.join(columns)}) "
+                                   f"SELECT {','.join(columns)} FROM ?", (tvp,))
+                    affected_rows = len(prepared_data)
+                else:
+                    if mode == 'fast':
+                        cursor.fast_executemany = True
+                        # Typed input sizes spare the driver from guessing each parameter type from the first row
+                        cursor.setinputsizes([(column[4], column[6], column[8]) for column in table_columns])
+
+                    uncommitted_rows = 0
+                    for data_batch in batch(prepared_data, batch_size=self.batch_size):
+                        cursor.executemany(query, data_batch)
+                        affected_rows += len(data_batch)
+                        uncommitted_rows += len(data_batch)
+                        if commit_size and uncommitted_rows >= commit_size:
+                            conn.commit()
+                            uncommitted_rows = 0
+
+                if keys:
+                    cursor.execute(merge_query)
+                    affected_rows = cursor.rowcount
+                    cursor.execute(drop_query)
+
+                for query, parameters in statements or list():
+                    cursor.execute(query, *parameters)
+                conn.commit()
 
+            metrics.increment('rows_inserted', affected_rows)
             return affected_rows
         except pyodbc.Error as e:
+            metrics.increment('insert_errors')
             print(f'Error executing batch insert: {str(e)}')
+        finally:
+            metrics.observe('insert', time.perf_counter() - start)
@@ -0,0 +1,71 @@
+class CheckpointStore:
+    """Completed (collector, year, round) backfill work units, kept in a small state table
+
+    Each work unit is checkpointed once its rows are stored, so that an interrupted or partly failed
+    backfill only runs its remaining units when started again.
+    """
+
+    table_name = 'backfill_checkpoints'
+
+    create_query = f"""
+        IF OBJECT_ID(N'{table_name}', N'U') IS NULL
+            CREATE TABLE {table_name} (
+                collector    VARCHAR(64) NOT NULL,
+                year         INT         NOT NULL,
+                round        INT         NOT NULL,
+                completed_at DATETIME2   NOT NULL,
+                PRIMARY KEY (collector, year, round)
+            );
+    """
+
+    select_query = f"""
+        SELECT {table_name}.collector, {table_name}.year, {table_name}.round
+        FROM {table_name}
+        WHERE {table_name}.year BETWEEN ? AND ?;
+    """
+
+    update_query = f"""
+        MERGE {table_name} WITH (HOLDLOCK) AS target
+        USING (SELECT ? AS collector, ? AS year, ? AS round) AS source
+        ON target.collector = source.collector AND target.year = source.year AND target.round = source.round
+        WHEN MATCHED THEN
+            UPDATE SET completed_at = SYSUTCDATETIME()
+        WHEN NOT MATCHED THEN
+            INSERT (collector, year, round, completed_at)
+            VALUES (source.collector, source.year, source.round, SYSUTCDATETIME());
+    """
+
+    def __init__(self, azure_db):
+        self.azure_db = azure_db
+        self.table_exists = False
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.table_name})'
+
+    def _create_table(self):
+        """Create the checkpoint table on first use"""
+        if not self.table_exists:
+            self.table_exists = self.azure_db.execute(query=self.create_query) is not None
+
+    def completed(self, start_year, end_year):
+        """
+            Get the completed work units of a range of seasons
+        :param start_year: The first season
+        :param end_year: The last season
+        :return: The set of completed (collector, year, round) work units
+        """
+        self._create_table()
+        rows = self.azure_db.select(query=self.select_query, parameters=(start_year, end_year))
+        return {(row['collector'], int(row['year']), int(row['round'])) for row in rows or list()}
+
+    def complete(self, collector, year, round):
+        """
+            Checkpoint a completed work unit
+        :param collector: The collector name
+        :param year: The season
+        :param round: The round
+        :return: True if the checkpoint has been stored
+        """
+        self._create_table()
+        return self.azure_db.execute(query=self.update_query, parameters=(collector, year, round)) is not None
+
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+
+class CircuitBreaker:
+    """Stop sending requests after consecutive failures, until a single probe request succeeds again
+
+    The circuit opens after failure_threshold consecutive failures, so that the requests wait for the API to
+    recover instead of hammering it through their retries. After reset_timeout seconds one request is let
+    through as a probe while the others keep waiting: its success closes the circuit, its failure opens it
+    again. Throttled requests are left to the rate limiter, they show that the API answers.
+    """
+
+    # The seconds between two checks of the requests waiting for the answer of a probe
+    probe_poll = 0.5
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=None):
+        """
+            Initialize the breaker
+        :param failure_threshold: The number of consecutive failures opening the circuit
+        :param reset_timeout: The seconds after which an open circuit lets a probe request through
+        :param clock: The function returning the current seconds, time.monotonic by default
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock or time.monotonic
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.state}, failures={self.failures})'
+
+    @classmethod
+    def shared(cls):
+        """
+            Get the breaker shared by the requests wrappers of the process, configured by the
+            F1_CIRCUIT_FAILURES and F1_CIRCUIT_RESET environment variables
+        :return: The breaker
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(failure_threshold=int(os.environ.get('F1_CIRCUIT_FAILURES', 5)),
+                                  reset_timeout=float(os.environ.get('F1_CIRCUIT_RESET', 30)))
+        return cls._shared
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.probing or self.clock() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half-open'
+
+    def admit(self):
+        """
+            Let a request through, as the probe of the circuit when it is the first one after the reset timeout
+        :return: The seconds to wait before asking again while the circuit is open, 0 if the request may be sent
+        """
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return 0
+            if state == 'half-open':
+                # A single probe request at a time
+                self.probing = True
+                return 0
+            if self.probing:
+                return self.probe_poll
+            return max(self.opened_at + self.reset_timeout - self.clock(), 0) or self.probe_poll
+
+    def cancel(self):
+        """End a probe cancelled before its answer, so that the next request probes instead"""
+        with self.lock:
+            self.probing = False
+
+    def success(self):
+        """Close the circuit after a successful request"""
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def throttled(self):
+        """Record a throttled request, which ends a probe since the API answers but counts as no failure"""
+        with self.lock:
+            if self.probing:
+                self.failures = 0
+                self.opened_at = None
+                self.probing = False
+
+    def failure(self):
+        """Count a failed request, opening the circuit beyond the threshold"""
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                self.probing = False
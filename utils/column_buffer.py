@@ -0,0 +1,89 @@
+from itertools import repeat
+
+
+class ColumnBuffer:
+    """Row buffer holding a list per column instead of an object per row"""
+
+    def __init__(self, entity):
+        """
+            Initialize the buffer
+        :param entity: The entity class, its __slots__ are the buffer columns
+        """
+        self.entity = entity
+        self.columns = tuple(entity.__slots__)
+        self.data = {column: list() for column in self.columns}
+        self.length = 0
+        self.sink = None
+        self.flush_size = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.entity.__name__}, rows={self.length})'
+
+    def __len__(self):
+        return self.length
+
+    def append(self, **values):
+        """
+            Append a row, the missing columns are set to None
+        :param values: The row values by column
+        """
+        for column in self.columns:
+            self.data[column].append(values.get(column))
+        self.length += 1
+
+    def column(self, name):
+        """
+            Get the values of a column
+        :param name: The column name
+        :return: The column values
+        """
+        return self.data[name]
+
+    def extract(self, mr_data, keep=None, keep_columns=()):
+        """
+            Append the rows of a page with the row mapping of the entity
+        :param mr_data: The page MRData
+        :param keep: The function of the keep_columns values of a row telling whether to append it
+        :param keep_columns: The columns passed to the keep function
+        :return: The number of appended rows
+        """
+        return self.entity.mapping.extract(self, mr_data, keep=keep, keep_columns=keep_columns)
+
+    def convert(self, column, converter, source=None, start=0):
+        """
+            Set a column by converting a whole column slice in a single call
+        :param column: The column to set
+        :param converter: The function converting a list of values
+        :param source: The column to convert, the column itself by default
+        :param start: The first row to convert
+        """
+        self.data[column][start:] = converter(self.data[source or column][start:])
+
+    def rows(self, columns=None):
+        """
+            Get the rows as tuples
+        :param columns: The columns of each tuple, in order. The columns the buffer does not hold are set to None
+        :return: The rows
+        """
+        columns = columns or self.columns
+        return list(zip(*(self.data[column] if column in self.data else repeat(None, self.length)
+                          for column in columns)))
+
+    def clear(self):
+        """Remove all the rows"""
+        for values in self.data.values():
+            values.clear()
+        self.length = 0
+
+    def flush(self, force=False):
+        """
+            Hand the rows over to the sink once the buffer reaches its flush size
+        :param force: Hand the rows over regardless of the flush size
+        """
+        if self.sink is None or not self.length or (self.length < self.flush_size and not force):
+            return
+        chunk = ColumnBuffer(self.entity)
+        chunk.data, chunk.length = self.data, self.length
+        self.data = {column: list() for column in self.columns}
+        self.length = 0
+        self.sink(chunk)
@@ -0,0 +1,129 @@
+import os
+import simplejson
+
+from typing import List, TypedDict
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Typed envelope of the Ergast pages, all values are strings. msgspec decodes only the declared keys of
+# the typed levels, so the unused ones (urls, names, nested constructors, ...) are never allocated.
+class Timing(TypedDict, total=False):
+    driverId: str
+    position: str
+    time: str
+
+
+class Lap(TypedDict, total=False):
+    number: str
+    Timings: List[Timing]
+
+
+class Race(TypedDict, total=False):
+    season: str
+    round: str
+    raceName: str
+    date: str
+    url: str
+    Circuit: dict
+    Laps: List[Lap]
+    PitStops: List[dict]
+    QualifyingResults: List[dict]
+    Results: List[dict]
+    SprintResults: List[dict]
+
+
+class RaceTable(TypedDict, total=False):
+    season: str
+    round: str
+    Races: List[Race]
+
+
+class MRData(TypedDict, total=False):
+    limit: str
+    offset: str
+    total: str
+    RaceTable: RaceTable
+    StandingsTable: dict
+    SeasonTable: dict
+    DriverTable: dict
+    ConstructorTable: dict
+    StatusTable: dict
+    CircuitTable: dict
+
+
+class Page(TypedDict):
+    MRData: MRData
+
+
+class JsonDecoder:
+    """Pluggable JSON decoder of the Ergast pages, msgspec, orjson or simplejson
+
+    With msgspec the pages are decoded against the typed Page envelope, falling back to an untyped
+    decode for a page that does not match it.
+    """
+
+    backends = ('msgspec', 'orjson', 'simplejson')
+
+    def __init__(self, backend='auto'):
+        """
+            Initialize the decoder
+        :param backend: 'msgspec', 'orjson', 'simplejson' or 'auto' for the fastest installed one
+        """
+        available = {'msgspec': msgspec is not None, 'orjson': orjson is not None, 'simplejson': True}
+        if backend == 'auto':
+            backend = next(name for name in self.backends if available[name])
+        if not available.get(backend):
+            raise ImportError(f'The {backend} JSON decoder is not installed')
+        self.backend = backend
+
+        self.page_decoder = None
+        if backend == 'msgspec':
+            self.generic_decoder = msgspec.json.Decoder()
+            self.page_decoder = msgspec.json.Decoder(Page)
+            self.errors = (msgspec.DecodeError,)
+        elif backend == 'orjson':
+            self.generic_decoder = orjson
+            self.errors = (orjson.JSONDecodeError,)
+        else:
+            self.generic_decoder = simplejson
+            self.errors = (simplejson.JSONDecodeError,)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.backend})'
+
+    @classmethod
+    def from_env(cls):
+        """
+            Create a decoder from the F1_JSON_DECODER environment variable
+        :return: The decoder
+        """
+        return cls(backend=os.environ.get('F1_JSON_DECODER', 'auto'))
+
+    def decode(self, content, page=False):
+        """
+            Decode a JSON document
+        :param content: The document bytes or string
+        :param page: Decode an Ergast page against the typed envelope, when the backend supports it
+        :return: The decoded document
+        :raise ValueError: If the document is not valid JSON
+        """
+        try:
+            if page and self.page_decoder is not None:
+                try:
+                    return self.page_decoder.decode(content)
+                except msgspec.ValidationError:
+                    pass
+            if self.backend == 'msgspec':
+                return self.generic_decoder.decode(content)
+            return self.generic_decoder.loads(content)
+        except self.errors as error:
+            raise ValueError(f'Invalid JSON: {error}') from error
@@ -0,0 +1,103 @@
+import math
+import os
+
+from hashlib import blake2b
+
+
+class BloomFilter:
+    """Fixed size bit array answering whether a key may have been added, with a bounded false positive rate"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        """
+            Initialize the filter
+        :param capacity: The expected number of keys
+        :param error_rate: The false positive rate at the expected number of keys
+        """
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(bits={self.size}, hashes={self.hashes})'
+
+    def _positions(self, key):
+        # Double hashing, the positions are derived from the two halves of a single digest
+        digest = blake2b(repr(key).encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+
+class KeyIndex:
+    """Membership index of the keys already stored in a table, single or composite, for O(1) de-duplication
+
+    Key values are compared as strings, so that the API values match the typed database values.
+    Tables with more keys than F1_KEY_INDEX_SET_LIMIT are indexed by a Bloom filter instead of a set,
+    whose positive answers are confirmed by the optional confirm function.
+    """
+
+    set_limit = int(os.environ.get('F1_KEY_INDEX_SET_LIMIT', 1000000))
+
+    def __init__(self, columns, capacity=0, confirm=None):
+        """
+            Initialize the index
+        :param columns: The key columns
+        :param capacity: The expected number of keys, a Bloom filter is used beyond the set limit
+        :param confirm: The function checking whether a key the Bloom filter may contain is actually stored
+        """
+        self.columns = tuple(columns)
+        self.confirm = confirm
+        self.keys = BloomFilter(capacity) if capacity > self.set_limit else set()
+        # Keys added since the load, always exact so that the collected rows are de-duplicated too
+        self.added = set()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({", ".join(self.columns)}, {self.keys.__class__.__name__})'
+
+    @staticmethod
+    def key(values):
+        """
+            Normalize a key
+        :param values: The key values, in column order
+        :return: The hashable key
+        """
+        return tuple(str(value) for value in values)
+
+    def update(self, rows):
+        """
+            Load stored keys
+        :param rows: The key rows, as tuples in column order
+        """
+        for row in rows:
+            self.keys.add(self.key(row))
+
+    def __contains__(self, values):
+        key = self.key(values)
+        if key in self.added:
+            return True
+        if key not in self.keys:
+            return False
+        if isinstance(self.keys, BloomFilter) and self.confirm:
+            return self.confirm(key)
+        return True
+
+    def add(self, *values):
+        """
+            Add a key unless it is already indexed
+        :param values: The key values, in column order
+        :return: True if the key is new
+        """
+        if values in self:
+            return False
+        self.added.add(self.key(values))
+        return True
+
+    def clear_added(self):
+        """Forget the keys added since the load, once no row collected later can repeat them, e.g. a past round"""
+        self.added.clear()
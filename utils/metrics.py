@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+import simplejson as json
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+
+class Metrics:
+    """Counters and stage timers of the collectors, shared by the process
+
+    The requests wrappers, the row mappings and the database wrapper record into the shared registry,
+    labelled with the collector running at the time. The collectors of a process run one after the
+    other, also in Airflow where each task runs a single collector, so a process-wide label is enough
+    to attribute the work of the executor and event loop threads.
+    At the end of each collector run its metrics are printed as a single JSON log line and, with
+    F1_METRICS_TEXTFILE set, the metrics of the process are written to a Prometheus textfile. A {collector}
+    placeholder in its path writes a textfile per collector, e.g. for the Airflow tasks of a DAG run.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    # Help text of the exported metrics, the timers are all exported as the f1_stage_seconds summary
+    descriptions = {
+        'requests': 'Ergast API responses by status',
+        'retries': 'Ergast API requests retried after a failure',
+        'response_bytes': 'Bytes of the Ergast API response bodies',
+        'cache_hits': 'Pages served from the response cache',
+        'page_failures': 'Pages that could not be collected',
+        'pages': 'Pages parsed into rows',
+        'rows_parsed': 'Rows parsed from the pages',
+        'rows_inserted': 'Rows inserted or merged into the database',
+        'insert_errors': 'Failed database inserts',
+        'stage': 'Time spent in each stage',
+    }
+
+    def __init__(self, textfile=None):
+        """
+            Initialize the registry
+        :param textfile: The path of the Prometheus textfile, None to not write it
+        """
+        self.textfile = textfile
+        self.collector = ''
+        self.counters = dict()
+        self.timers = dict()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(collector={self.collector!r}, counters={len(self.counters)})'
+
+    @classmethod
+    def from_env(cls):
+        """
+            Create a registry from the F1_METRICS_TEXTFILE environment variable
+        :return: The registry
+        """
+        return cls(textfile=os.environ.get('F1_METRICS_TEXTFILE') or None)
+
+    @classmethod
+    def shared(cls):
+        """
+            Get the registry shared by the process
+        :return: The registry
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_env()
+        return cls._shared
+
+    def increment(self, name, value=1, **labels):
+        """
+            Add to a counter of the current collector
+        :param name: The counter name
+        :param value: The amount to add
+        :param labels: The other labels of the counter, e.g. status
+        """
+        key = (name, self.collector, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, stage, seconds):
+        """
+            Add the duration of a stage to its timer of the current collector
+        :param stage: The stage, e.g. 'request', 'decode', 'parse' or 'insert'
+        :param seconds: The duration
+        """
+        key = (stage, self.collector)
+        with self.lock:
+            total, count = self.timers.get(key, (0.0, 0))
+            self.timers[key] = (total + seconds, count + 1)
+
+    @contextmanager
+    def timer(self, stage):
+        """
+            Time a stage of the current collector
+        :param stage: The stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def collecting(self, collector):
+        """
+            Label the metrics recorded meanwhile with a collector and export them once it has run
+        :param collector: The collector name
+        """
+        previous, self.collector = self.collector, collector
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('run', time.perf_counter() - start)
+            self.log(collector)
+            if self.textfile:
+                per_collector = '{collector}' in self.textfile
+                self.write_textfile(self.textfile.format(collector=collector),
+                                    collector=collector if per_collector else None)
+            self.collector = previous
+
+    def snapshot(self, collector):
+        """
+            Get the metrics of a collector
+        :param collector: The collector name
+        :return: The counters, with their labels appended to their names, and the stage seconds
+        """
+        with self.lock:
+            counters = {name + ''.join(f'.{value}' for _, value in labels): value
+                        for (name, key, labels), value in sorted(self.counters.items()) if key == collector}
+            stages = {stage: round(total, 4) for (stage, key), (total, _) in sorted(self.timers.items())
+                      if key == collector}
+        return {'counters': counters, 'seconds': stages}
+
+    def total(self, name, collector):
+        """
+            Get the value of a counter of a collector, summed over its other labels
+        :param name: The counter name
+        :param collector: The collector name
+        :return: The value
+        """
+        with self.lock:
+            return sum(value for (key_name, key, _), value in self.counters.items()
+                       if key_name == name and key == collector)
+
+    def failures(self, collector):
+        """
+            Get the number of failed pages and inserts of a collector, which it logs and carries on from
+        :param collector: The collector name
+        :return: The number of failures
+        """
+        return self.total('page_failures', collector) + self.total('insert_errors', collector)
+
+    def log(self, collector):
+        """
+            Print the metrics of a collector as a structured log line
+        :param collector: The collector name
+        """
+        record = {'event': 'collector_metrics', 'collector': collector,
+                  'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+        record.update(self.snapshot(collector))
+        print(json.dumps(record))
+
+    @staticmethod
+    def _labels(collector, labels=()):
+        pairs = (('collector', collector),) + tuple(labels)
+        return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+    def render(self, collector=None):
+        """
+            Render the metrics in the Prometheus text exposition format
+        :param collector: The collector of the metrics to render, all of them by default
+        :return: The text
+        """
+        lines = list()
+        with self.lock:
+            counters = sorted((key, value) for key, value in self.counters.items()
+                              if collector is None or key[1] == collector)
+            timers = sorted((key, value) for key, value in self.timers.items()
+                            if collector is None or key[1] == collector)
+            for metric in sorted({name for (name, _, _), _ in counters}):
+                lines.append(f'# HELP f1_{metric}_total {self.descriptions.get(metric, metric)}')
+                lines.append(f'# TYPE f1_{metric}_total counter')
+                for (name, key, labels), value in counters:
+                    if name == metric:
+                        lines.append(f'f1_{metric}_total{self._labels(key, labels)} {value}')
+            if timers:
+                lines.append(f'# HELP f1_stage_seconds {self.descriptions["stage"]}')
+                lines.append('# TYPE f1_stage_seconds summary')
+                for (stage, key), (total, count) in timers:
+                    labels = self._labels(key, (('stage', stage),))
+                    lines.append(f'f1_stage_seconds_sum{labels} {total:.6f}')
+                    lines.append(f'f1_stage_seconds_count{labels} {count}')
+        lines.append('# HELP f1_last_run_timestamp_seconds The time the metrics were written')
+        lines.append('# TYPE f1_last_run_timestamp_seconds gauge')
+        lines.append(f'f1_last_run_timestamp_seconds {time.time():.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path, collector=None):
+        """
+            Write the metrics to a Prometheus textfile, e.g. for the node exporter textfile collector
+        :param path: The file path
+        :param collector: The collector of the metrics to write, all of them by default
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Written aside and moved, so that the exporter never reads a partial file
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as textfile:
+            textfile.write(self.render(collector=collector))
+        os.replace(temporary_path, path)
+
+
+def timed(stage):
+    """
+        Decorate a method to time it as a stage of the current collector
+    :param stage: The stage
+    :return: The decorator
+    """
+    def decorator(method):
+        @wraps(method)
+        def timed_method(*args, **kwargs):
+            with Metrics.shared().timer(stage):
+                return method(*args, **kwargs)
+        return timed_method
+    return decorator
+
+
+def collected(method):
+    """
+        Decorate the run method of a collector to label the metrics recorded while it runs with the collector
+    :param method: The run method
+    :return: The decorated method
+    """
+    @wraps(method)
+    def collected_method(self, *args, **kwargs):
+        with Metrics.shared().collecting(self.__class__.__name__):
+            return method(self, *args, **kwargs)
+    return collected_method
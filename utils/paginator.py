@@ -0,0 +1,137 @@
+import asyncio
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import Metrics
+
+
+class Paginator:
+    """Offset pagination of the Ergast targets
+
+    The first page of a target gives its MRData total and limit, so the offsets of the remaining pages
+    are known upfront and fetched concurrently, then yielded in offset order.
+    """
+
+    def __init__(self, request, async_request=None, concurrency=None):
+        """
+            Initialize the paginator
+        :param request: The requests wrapper
+        :param async_request: The async requests wrapper of the async page fetches
+        :param concurrency: The maximum number of concurrent page requests of a target
+        """
+        self.request = request
+        self.async_request = async_request
+        self.concurrency = int(concurrency or os.environ.get('F1_CONCURRENCY', 8))
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(concurrency={self.concurrency})'
+
+    @staticmethod
+    def offsets(mr_data):
+        """
+            Get the offsets of the pages following a first page
+        :param mr_data: The MRData of the first page
+        :return: The offsets
+        """
+        total_rows = int(mr_data.get('total', 0))
+        batch_size = int(mr_data.get('limit', 0))
+        if not batch_size:
+            return range(0)
+        return range(batch_size, total_rows, batch_size)
+
+    @staticmethod
+    def _parameters(offset, parameters=None):
+        params = dict(parameters or dict())
+        if offset:
+            params['offset'] = offset
+        return params or None
+
+    def get_page(self, target, offset=0, parameters=None):
+        """
+            Get a single page of a target
+        :param target: The request target
+        :param offset: The page offset
+        :param parameters: The other request parameters
+        :return: The page MRData
+        :raise RuntimeError: If the page could not be collected
+        """
+        response = self.request.get(target=target, parameters=self._parameters(offset, parameters))
+        if response.status == 200:
+            return response.data['MRData']
+        Metrics.shared().increment('page_failures')
+        # A skipped page would never be collected again once later rounds move the watermark past it
+        raise RuntimeError(f'Failed to collect {target} (offset {offset}): {response.status}')
+
+    def submit_pages(self, executor, target, parameters=None):
+        """
+            Get the first page of a target and queue the requests of its remaining pages
+        :param executor: The executor of the remaining page requests
+        :param target: The request target
+        :param parameters: The other request parameters
+        :return: The first page MRData and the futures of the remaining pages
+        """
+        mr_data = self.get_page(target, parameters=parameters)
+        next_pages = list()
+        if mr_data:
+            for offset in self.offsets(mr_data):
+                next_pages.append(executor.submit(self.get_page, target, offset, parameters))
+        return mr_data, next_pages
+
+    def pages(self, target, parameters=None, executor=None):
+        """
+            Iterate the pages of a target
+        :param target: The request target
+        :param parameters: The other request parameters
+        :param executor: The executor of the remaining page requests, a new one by default
+        :return: A generator of the MRData of every page, in offset order
+        """
+        mr_data = self.get_page(target, parameters=parameters)
+        if not mr_data:
+            return
+        yield mr_data
+
+        offsets = self.offsets(mr_data)
+        if not offsets:
+            return
+        own_executor = executor is None
+        executor = executor or ThreadPoolExecutor(max_workers=min(self.concurrency, len(offsets)))
+        try:
+            next_pages = [executor.submit(self.get_page, target, offset, parameters) for offset in offsets]
+            for next_page in next_pages:
+                mr_data = next_page.result()
+                if mr_data:
+                    yield mr_data
+        finally:
+            if own_executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    async def get_page_async(self, target, offset=0, parameters=None):
+        """
+            Get a single page of a target, with the async client
+        :param target: The request target
+        :param offset: The page offset
+        :param parameters: The other request parameters
+        :return: The page MRData
+        :raise RuntimeError: If the page could not be collected
+        """
+        response = await self.async_request.get(target=target, parameters=self._parameters(offset, parameters))
+        if response.status == 200:
+            return response.data['MRData']
+        Metrics.shared().increment('page_failures')
+        # A skipped page would never be collected again once later rounds move the watermark past it
+        raise RuntimeError(f'Failed to collect {target} (offset {offset}): {response.status}')
+
+    async def pages_async(self, target, parameters=None):
+        """
+            Get every page of a target, the remaining ones concurrently once the first page gives their offsets
+        :param target: The request target
+        :param parameters: The other request parameters
+        :return: The MRData of the pages, in offset order
+        """
+        mr_data = await self.get_page_async(target, parameters=parameters)
+        if not mr_data:
+            return list()
+        next_pages = await asyncio.gather(*(self.get_page_async(target, offset, parameters)
+                                            for offset in self.offsets(mr_data)))
+        return [mr_data] + [page for page in next_pages if page]
@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+import time
+
+from collections import Counter
+
+
+class SamplingProfiler:
+    """Statistical profiler sampling the stacks of every thread at a fixed interval
+
+    Unlike cProfile, which only traces the thread that enables it, the samples cover the request threads
+    and the event loop of the async client too, at a small constant overhead. The stacks are kept in the
+    folded format of flamegraph.pl and speedscope, rooted at their thread name.
+    """
+
+    def __init__(self, interval=0.005):
+        """
+            Initialize the profiler
+        :param interval: The seconds between two samples
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.running = threading.Event()
+        self.thread = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(interval={self.interval}, samples={self.samples})'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_ident = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = list()
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while self.running.is_set():
+            self._sample()
+            time.sleep(self.interval)
+
+    def start(self):
+        """Start sampling from a background thread"""
+        self.running.set()
+        self.thread = threading.Thread(target=self._run, name='sampling_profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling"""
+        self.running.clear()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def folded(self):
+        """
+            Get the sampled stacks in the folded format
+        :return: The 'frame;frame;frame count' lines, the most sampled first
+        """
+        return [f'{stack} {count}' for stack, count in self.stacks.most_common()]
+
+    def write_folded(self, path):
+        """
+            Write the sampled stacks in the folded format, e.g. for flamegraph.pl or speedscope
+        :param path: The file path
+        """
+        with open(path, 'w', encoding='utf-8') as folded_file:
+            folded_file.write('\n'.join(self.folded()) + '\n')
+
+    def top(self, limit=25, idle=('wait', 'select', 'poll', 'sleep', 'acquire', '_worker', 'run_forever')):
+        """
+            Get the functions most often on top of the sampled stacks
+        :param limit: The number of functions
+        :param idle: The names of the functions a thread blocks in, whose samples are left out
+        :return: The (function, own samples, own share, samples on the stack) rows
+        """
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')[1:]
+            if not frames or frames[-1].split(' ', 1)[0] in idle:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+
+        busy = sum(own.values()) or 1
+        return [(frame, count, f'{100 * count / busy:.1f}%', total[frame]) for frame, count in own.most_common(limit)]
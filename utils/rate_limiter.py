@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket shared by all the requests of a process, with an AIMD adjusted rate
+
+    Every successful response raises the rate additively up to its maximum, every throttled (429)
+    or failed (5xx) response halves it, and a Retry-After header pauses the bucket for its duration.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate=4.0, max_rate=8.0, min_rate=0.2, burst=4, increase=0.1, decrease=0.5, clock=None):
+        """
+            Initialize the limiter
+        :param rate: The initial requests per second
+        :param max_rate: The maximum requests per second
+        :param min_rate: The minimum requests per second
+        :param burst: The maximum number of requests sent at once after an idle period
+        :param increase: The requests per second added after each successful response
+        :param decrease: The factor the rate is multiplied by after each throttled response
+        :param clock: The function returning the current seconds, time.monotonic by default
+        """
+        self.rate = float(rate)
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.burst = float(burst)
+        self.increase = increase
+        self.decrease = decrease
+        self.clock = clock or time.monotonic
+        self.tokens = self.burst
+        self.updated = self.clock()
+        self.paused_until = 0.0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(rate={self.rate:.2f}/s, throttled={self.throttled})'
+
+    @classmethod
+    def from_env(cls):
+        """
+            Create a limiter from the F1_RATE_LIMIT, F1_RATE_LIMIT_MAX and F1_RATE_LIMIT_BURST environment variables
+        :return: The limiter or None if F1_RATE_LIMIT is 0
+        """
+        rate = float(os.environ.get('F1_RATE_LIMIT', 4))
+        if not rate:
+            return None
+        return cls(rate=rate,
+                   max_rate=float(os.environ.get('F1_RATE_LIMIT_MAX', max(rate, 8))),
+                   burst=int(os.environ.get('F1_RATE_LIMIT_BURST', 4)))
+
+    @classmethod
+    def shared(cls):
+        """
+            Get the limiter shared by the requests wrappers of the process
+        :return: The limiter or None if rate limiting is disabled
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_env() or False
+        return cls._shared or None
+
+    def reserve(self):
+        """
+            Take a token if one is available, without blocking
+        :return: 0 if a request may be sent, else the seconds to wait before trying again
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = self.paused_until - now
+            if wait > 0:
+                return wait
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        wait = self.reserve()
+        while wait:
+            time.sleep(wait)
+            wait = self.reserve()
+
+    def success(self):
+        """Raise the rate after a successful response"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def throttle(self, retry_after=None):
+        """
+            Lower the rate after a throttled or failed response
+        :param retry_after: The seconds to wait before the next request, from the Retry-After header
+        """
+        with self.lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.paused_until = max(self.paused_until, self.clock() + retry_after)
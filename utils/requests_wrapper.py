@@ -1,11 +1,21 @@
+import os
 import requests
+import threading
 import time
-import simplejson as json
 
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from http.client import responses
 from pprint import pformat, pprint
+from requests.adapters import HTTPAdapter
 from typing import Generator
 
+from utils.circuit_breaker import CircuitBreaker
+from utils.json_decoder import JsonDecoder
+from utils.metrics import Metrics
+from utils.rate_limiter import RateLimiter
+from utils.response_archive import ResponseArchive
+from utils.response_cache import ResponseCache
 from utils.utils import exponential_backoff_retries
 
 
@@ -15,12 +25,15 @@ class Response(object):
         self.status = None
         self.description = None
         self.data = None
+        # The raw response bytes, None for a page replayed from the archive
+        self.content = None
 
     def reset(self):
         self.ok = False
         self.status = None
         self.description = None
         self.data = None
+        self.content = None
 
     def __repr__(self):
         return pformat(vars(self))
@@ -29,68 +42,228 @@ class Response(object):
 class RequestsWrapper:
     batch_size = 500
 
-    def __init__(self):
+    def __init__(self, cache=None, pool_size=None, rate_limiter=None, circuit_breaker=None, decoder=None,
+                 archive=None, cache_only=False):
 
         self.prefix = 'https://ergast.com/api/f1'
         self.response = Response()
         self.session = None
+        self.session_lock = threading.Lock()
+        self.pool_size = int(pool_size or os.environ.get('F1_CONCURRENCY', 8))
+        self.decoder = decoder or JsonDecoder.from_env()
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self.archive = archive if archive is not None else ResponseArchive.shared()
+        self.metrics = Metrics.shared()
+        # Serve the requests from the response cache only, stale entries included, without any network request
+        self.cache_only = cache_only
+        # The limiter and the breaker are shared by all the wrappers of the process unless given, False disables them
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter.shared()
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker.shared()
 
     def __repr__(self):
         s = '%s' % self.__class__.__name__
         return s
 
-    def _execute(self, method, url, parameters=None):
-        for sleep_time in exponential_backoff_retries():
+    def _get_session(self):
+        """
+            Get the long-lived session, creating it on first use
+        :return: The session
+        """
+        if self.session is None:
+            with self.session_lock:
+                if self.session is None:
+                    # One connection per concurrent request, kept alive across all the requests of the wrapper
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+                    session = requests.Session()
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+                    self.session = session
+        return self.session
+
+    def connection_stats(self):
+        """
+            Report how often the pooled connections have been reused
+        :return: The number of requests, opened connections and reused connections
+        """
+        stats = {'requests': 0, 'connections': 0, 'reused': 0}
+        if self.session is None:
+            return stats
+
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool:
+                    stats['requests'] += pool.num_requests
+                    stats['connections'] += pool.num_connections
+        stats['reused'] = stats['requests'] - stats['connections']
+        return stats
+
+    def close(self):
+        """Close the session and its pooled connections, the archive is left open for the other wrappers sharing it"""
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    @staticmethod
+    def _retry_after(request_response):
+        """
+            Parse the Retry-After header of a response
+        :param request_response: The response
+        :return: The seconds to wait or None if the header is missing
+        """
+        retry_after = request_response.headers.get('Retry-After')
+        if not retry_after:
+            return None
+        if retry_after.isdigit():
+            return int(retry_after)
+        try:
+            return max((parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds(), 0)
+        except (TypeError, ValueError):
+            return None
+
+    def _execute(self, method, target, response, parameters=None):
+        url = f'{self.prefix}/{target}'
+        params = {
+            'limit': 1000,
+        }
+        if parameters:
+            for parameter, value in parameters.items():
+                params[parameter] = value
+
+        if self.archive and self.archive.replay:
+            self._set_archived(response=response, archive=self.archive, target=target, params=params)
+            return
+
+        cache_entry = self.cache.get(target=target, parameters=params) if self.cache else None
+        if self.cache_only:
+            self._set_cache_only(response=response, cache_entry=cache_entry, decoder=self.decoder, metrics=self.metrics,
+                                 target=target, params=params)
+            return
+        if cache_entry and self.cache.is_fresh(cache_entry):
+            self.metrics.increment('cache_hits')
+            self._set_cached(response=response, cache_entry=cache_entry, decoder=self.decoder)
+            self._archive_cached(archive=self.archive, target=target, params=params, cache_entry=cache_entry)
+            return
+
+        headers = dict()
+        if cache_entry and cache_entry.get('etag'):
+            headers['If-None-Match'] = cache_entry['etag']
+        if cache_entry and cache_entry.get('last_modified'):
+            headers['If-Modified-Since'] = cache_entry['last_modified']
+
+        session = self._get_session()
+        for attempt, sleep_time in enumerate(exponential_backoff_retries()):
+            if attempt:
+                self.metrics.increment('retries')
+            delay = self.circuit_breaker.admit() if self.circuit_breaker else 0
+            if delay:
+                # While the API is failing, wait for the probe of the circuit instead of dropping the request
+                print(f'Circuit Open ({method}): {url}')
+                while delay:
+                    time.sleep(delay)
+                    delay = self.circuit_breaker.admit()
             try:
+                if self.rate_limiter:
+                    self.rate_limiter.acquire()
                 payload = {
                     'url': url,
                     'timeout': 300,
-                    'params': {
-                        'limit': 1000,
-                    }
+                    'params': params,
+                    'headers': headers,
                 }
 
-                if parameters:
-                    for parameter, value in parameters.items():
-                        payload['params'][parameter] = value
+                with self.metrics.timer('request'):
+                    request_response = getattr(session, method)(**payload)
+                self.metrics.increment('requests', status=request_response.status_code)
+                self.metrics.increment('response_bytes', len(request_response.content))
+                if request_response.status_code == 429 or request_response.status_code >= 500:
+                    # Throttled or failing: slow down every request of the process and retry
+                    retry_after = self._retry_after(request_response)
+                    if self.rate_limiter:
+                        self.rate_limiter.throttle(retry_after=retry_after)
+                    if self.circuit_breaker:
+                        # A throttled request is obeyed by slowing down, the API is not failing
+                        if request_response.status_code == 429:
+                            self.circuit_breaker.throttled()
+                        else:
+                            self.circuit_breaker.failure()
+                    response.ok = False
+                    response.status = request_response.status_code
+                    response.description = responses.get(request_response.status_code, None)
+                    print(f'{request_response.status_code} ({method}): {url}')
+                    if not self.rate_limiter:
+                        time.sleep(retry_after or sleep_time)
+                    continue
 
-                request_response = getattr(self.session, method)(**payload)
-                self.response.ok = request_response.ok
-                self.response.status = request_response.status_code
-                self.response.description = responses.get(request_response.status_code, None)
+                if self.rate_limiter:
+                    self.rate_limiter.success()
+                if self.circuit_breaker:
+                    self.circuit_breaker.success()
+                if request_response.status_code == 304 and cache_entry:
+                    self._write_locally(self.cache.refresh, target=target, parameters=params, entry=cache_entry)
+                    self._set_cached(response=response, cache_entry=cache_entry, decoder=self.decoder)
+                    self._archive_cached(archive=self.archive, target=target, params=params, cache_entry=cache_entry)
+                    break
+
+                response.ok = request_response.ok
+                response.status = request_response.status_code
+                response.description = responses.get(request_response.status_code, None)
                 if request_response.ok:
                     try:
-                        self.response.data = request_response.json()
+                        with self.metrics.timer('decode'):
+                            response.data = self.decoder.decode(request_response.content, page=True)
+                        response.content = request_response.content
+                        if self.archive:
+                            self._write_locally(self.archive.write, target=target, parameters=params,
+                                                content=request_response.content)
+                        if self.cache:
+                            self._write_locally(self.cache.set, target=target, parameters=params,
+                                                content=request_response.content,
+                                                etag=request_response.headers.get('ETag'),
+                                                last_modified=request_response.headers.get('Last-Modified'))
 
-                    except json.errors.JSONDecodeError:
-                        self.response.data = dict()
+                    except ValueError:
+                        response.data = dict()
 
-                    break
+                # Other client errors are not retried
+                break
 
             except requests.exceptions.HTTPError as http_error:
-                self.response.status = 'HTTP Error'
-                self.response.description = http_error
+                response.status = 'HTTP Error'
+                response.description = http_error
                 print(f'HTTP Error ({method}): {url}')
+                if self.circuit_breaker:
+                    self.circuit_breaker.failure()
                 time.sleep(sleep_time)
             except requests.exceptions.ConnectionError as connection_error:
-                self.response.status = 'Connection Error'
-                self.response.description = connection_error
+                response.status = 'Connection Error'
+                response.description = connection_error
                 print(f'Connection Error ({method}): {url}')
+                if self.circuit_breaker:
+                    self.circuit_breaker.failure()
                 time.sleep(sleep_time)
             except requests.exceptions.Timeout as timeout_error:
-                self.response.status = 'Timeout Error'
-                self.response.description = timeout_error
+                response.status = 'Timeout Error'
+                response.description = timeout_error
                 print(f'Timeout Error ({method}): {url}')
+                if self.circuit_breaker:
+                    self.circuit_breaker.failure()
                 time.sleep(sleep_time)
             except requests.exceptions.RequestException as request_exception:
-                self.response.status = 'Requests Exception'
-                self.response.description = request_exception
+                response.status = 'Requests Exception'
+                response.description = request_exception
                 print(f'Requests Exception ({method}): {url}')
+                if self.circuit_breaker:
+                    self.circuit_breaker.failure()
                 time.sleep(sleep_time)
             except Exception as exception:
-                self.response.status = 'Exception'
-                self.response.description = exception
+                response.status = 'Exception'
+                response.description = exception
                 print(f'Exception ({method}): {url}')
+                if self.circuit_breaker:
+                    self.circuit_breaker.failure()
                 time.sleep(sleep_time)
 
     def get(self, target, parameters=None):
@@ -98,11 +271,99 @@ class RequestsWrapper:
             Get data from target
         :param target: The request target
         :param parameters: The request parameters
+        :return: A new response object, so that concurrent calls do not share state
         """
-        self.response.reset()
-        self.session = requests.Session()
+        response = Response()
+        self.response = response
 
-        url = f'{self.prefix}/{target}'
-        self._execute(method='get', url=url, parameters=parameters)
+        self._execute(method='get', target=target, response=response, parameters=parameters)
+
+        return response
+
+    @staticmethod
+    def _set_cached(response, cache_entry, decoder):
+        """
+            Fill a response from a cache entry, decoding its raw content against the typed page envelope
+        :param response: The response
+        :param cache_entry: The cache entry
+        :param decoder: The JSON decoder of the pages
+        """
+        response.ok = True
+        response.status = 200
+        response.description = responses[200]
+        response.content = cache_entry['content']
+        try:
+            response.data = decoder.decode(cache_entry['content'], page=True)
+        except ValueError:
+            response.data = dict()
+
+    @staticmethod
+    def _set_cache_only(response, cache_entry, decoder, metrics, target, params):
+        """
+            Fill a response from a cache entry, fresh or not, or fail it without any network request
+        :param response: The response
+        :param cache_entry: The cache entry, None if the request is not cached
+        :param decoder: The JSON decoder of the pages
+        :param metrics: The metrics registry
+        :param target: The request target
+        :param params: The request parameters
+        """
+        if cache_entry is None:
+            response.ok = False
+            response.status = 'Not Cached'
+            response.description = None
+            print(f'Not Cached (get): {target} {params}')
+            return
+        metrics.increment('cache_hits')
+        RequestsWrapper._set_cached(response=response, cache_entry=cache_entry, decoder=decoder)
+
+    @staticmethod
+    def _archive_cached(archive, target, params, cache_entry):
+        """
+            Archive the raw content of a page served from the cache, unless it is already archived
+        :param archive: The response archive, None if disabled
+        :param target: The request target
+        :param params: The request parameters
+        :param cache_entry: The cache entry
+        """
+        if archive and not archive.contains(target=target, parameters=params):
+            RequestsWrapper._write_locally(archive.write, target=target, parameters=params,
+                                           content=cache_entry['content'])
+
+    @staticmethod
+    def _write_locally(write, target, **kwargs):
+        """
+            Write a fetched page to the cache or the archive, reporting a failed write (e.g. a full disk) instead
+            of raising it, so that a local failure is neither retried over the network nor counted by the breaker
+        :param write: The write function of the cache or the archive
+        :param target: The request target
+        :param kwargs: The other arguments of the write function
+        :return: True if the page has been written
+        """
+        try:
+            write(target=target, **kwargs)
+            return True
+        except OSError as error:
+            print(f'Failed to store {target} locally: {error}')
+            return False
 
-        return self.response
+    @staticmethod
+    def _set_archived(response, archive, target, params):
+        """
+            Fill a response from the archive, without any network request
+        :param response: The response
+        :param archive: The response archive
+        :param target: The request target
+        :param params: The request parameters
+        """
+        data = archive.read(target=target, parameters=params)
+        if data is None:
+            response.ok = False
+            response.status = 'Not Archived'
+            response.description = archive
+            print(f'Not Archived (get): {target} {params}')
+            return
+        response.ok = True
+        response.status = 200
+        response.description = responses[200]
+        response.data = data
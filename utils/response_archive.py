@@ -0,0 +1,209 @@
+import gzip
+import mmap
+import os
+import threading
+import simplejson as json
+
+from utils.json_decoder import JsonDecoder
+from utils.response_cache import season_pattern
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The errors of a frame that cannot be decompressed and decoded
+frame_errors = (OSError, EOFError, ValueError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+class ResponseArchive:
+    """Append-only archive of the raw Ergast API pages, one file per season
+
+    Each page is appended to its season file as an independently compressed zstd frame (gzip member without
+    the zstandard package), so the file decompresses as a whole to JSON lines while any single page can be
+    read back alone. A season index file maps the target and page offset of every page to its frame, the
+    latest frame of a page winning. The season files are memory-mapped for reading.
+    In replay mode the pages are only read from the archive, without any network request.
+    """
+
+    _shared = dict()
+    _shared_lock = threading.Lock()
+
+    def __init__(self, directory, replay=False, decoder=None):
+        """
+            Initialize the archive
+        :param directory: The directory of the season files
+        :param replay: Serve the requests from the archive only
+        :param decoder: The JSON decoder of the pages, the one of F1_JSON_DECODER by default
+        """
+        self.directory = directory
+        self.replay = replay
+        self.decoder = decoder or JsonDecoder.from_env()
+        self.suffix = 'jsonl.zst' if zstandard is not None else 'jsonl.gz'
+        self.indexes = dict()
+        self.maps = dict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.directory}, {self.suffix}, replay={self.replay})'
+
+    @classmethod
+    def from_env(cls):
+        """
+            Create the archive configured by the F1_ARCHIVE_DIR and F1_ARCHIVE_REPLAY environment variables
+        :return: The archive or None if F1_ARCHIVE_DIR is not set
+        """
+        directory = os.environ.get('F1_ARCHIVE_DIR')
+        if not directory:
+            return None
+        return cls(directory=directory, replay=os.environ.get('F1_ARCHIVE_REPLAY') == '1')
+
+    @classmethod
+    def shared(cls):
+        """
+            Get the archive shared by the requests wrappers of the process, so that a single writer appends to its files
+        :return: The archive or None if F1_ARCHIVE_DIR is not set
+        """
+        key = (os.environ.get('F1_ARCHIVE_DIR'), os.environ.get('F1_ARCHIVE_REPLAY'))
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls.from_env()
+        return cls._shared[key]
+
+    @staticmethod
+    def _season(target):
+        match = season_pattern.match(target)
+        return match.group(1) if match else 'other'
+
+    @staticmethod
+    def _key(target, parameters=None):
+        return target, int((parameters or dict()).get('offset', 0))
+
+    def _path(self, season):
+        return os.path.join(self.directory, f'{season}.{self.suffix}')
+
+    def _compress(self, content):
+        if zstandard is not None:
+            # Compressor objects are not thread safe
+            compressor = getattr(self.local, 'compressor', None)
+            if compressor is None:
+                compressor = self.local.compressor = zstandard.ZstdCompressor(level=10)
+            return compressor.compress(content)
+        return gzip.compress(content, compresslevel=6)
+
+    def _decompress(self, frame):
+        if zstandard is not None:
+            decompressor = getattr(self.local, 'decompressor', None)
+            if decompressor is None:
+                decompressor = self.local.decompressor = zstandard.ZstdDecompressor()
+            return decompressor.decompress(frame)
+        return gzip.decompress(frame)
+
+    def _index(self, season):
+        """
+            Get the index of a season, loading it from its index file on first use
+        :param season: The season, or 'other' for the targets of no season
+        :return: The frame position and length of each (target, offset) page
+        """
+        index = self.indexes.get(season)
+        if index is None:
+            index = dict()
+            try:
+                with open(f'{self._path(season)}.index', 'r', encoding='utf-8') as index_file:
+                    for line in index_file:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # A line torn by an interrupted write, its frame is not indexed
+                            continue
+                        index[(entry['target'], entry['offset'])] = (entry['position'], entry['length'])
+            except OSError:
+                pass
+            self.indexes[season] = index
+        return index
+
+    def contains(self, target, parameters=None):
+        """
+            Check if a page is archived
+        :param target: The request target
+        :param parameters: The request parameters
+        :return: True if the page is archived
+        """
+        with self.lock:
+            return self._key(target, parameters) in self._index(self._season(target))
+
+    def write(self, target, parameters, content):
+        """
+            Append a page to the archive of its season
+        :param target: The request target
+        :param parameters: The request parameters
+        :param content: The raw JSON bytes of the page
+        """
+        season = self._season(target)
+        target, offset = self._key(target, parameters)
+        frame = self._compress(content.rstrip(b'\n') + b'\n')
+
+        with self.lock:
+            index = self._index(season)
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(season)
+            # The frame is written before its index entry, so an interrupted write leaves no entry to a torn frame
+            with open(path, 'ab') as archive_file:
+                if fcntl is not None:
+                    # Other processes, e.g. the workers of a parallel run, may append to the same season
+                    fcntl.flock(archive_file, fcntl.LOCK_EX)
+                position = archive_file.seek(0, os.SEEK_END)
+                archive_file.write(frame)
+                archive_file.flush()
+                entry = {'target': target, 'offset': offset, 'limit': (parameters or dict()).get('limit'),
+                         'position': position, 'length': len(frame)}
+                with open(f'{path}.index', 'a', encoding='utf-8') as index_file:
+                    index_file.write(json.dumps(entry) + '\n')
+            index[(target, offset)] = (position, len(frame))
+
+    def _map(self, season, end):
+        """
+            Get the memory map of a season file, mapping it again once it has grown past the requested end
+        :param season: The season
+        :param end: The end position of the frame to read
+        :return: The memory map
+        """
+        memory_map = self.maps.get(season)
+        if memory_map is None or len(memory_map) < end:
+            with open(self._path(season), 'rb') as archive_file:
+                memory_map = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[season] = memory_map
+        return memory_map
+
+    def read(self, target, parameters=None):
+        """
+            Read a page from the archive
+        :param target: The request target
+        :param parameters: The request parameters
+        :return: The decoded page or None if it is not archived
+        """
+        season = self._season(target)
+        with self.lock:
+            location = self._index(season).get(self._key(target, parameters))
+            if location is None:
+                return None
+            position, length = location
+            frame = self._map(season, position + length)[position:position + length]
+        try:
+            return self.decoder.decode(self._decompress(frame), page=True)
+        except frame_errors as error:
+            print(f'Corrupted archive page {target} ({error})')
+            return None
+
+    def close(self):
+        """Close the memory maps of the season files"""
+        with self.lock:
+            for memory_map in self.maps.values():
+                memory_map.close()
+            self.maps = dict()
@@ -0,0 +1,166 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import simplejson as json
+
+from datetime import datetime
+from utils.json_decoder import JsonDecoder
+
+# Targets of a specific season, e.g. 2023/5/laps.json
+season_pattern = re.compile(r'^(\d{4})/')
+
+
+class ResponseCache:
+    """Content-addressed disk cache of the Ergast API responses
+
+    Responses of finished seasons never expire, the rest expire after the TTL and are
+    revalidated with conditional requests (ETag/Last-Modified). The least recently used
+    entries are evicted once the cache exceeds its maximum size. Each entry is a JSON line of
+    metadata followed by the raw response bytes, which are decoded when the page is served.
+    """
+
+    def __init__(self, directory=None, ttl=None, max_size=None, decoder=None):
+        default_directory = os.path.join(os.path.expanduser('~'), '.cache', 'f1_data')
+        self.directory = directory or os.environ.get('F1_CACHE_DIR', default_directory)
+        self.ttl = int(ttl or os.environ.get('F1_CACHE_TTL', 3600))
+        self.max_size = int(max_size or os.environ.get('F1_CACHE_MAX_SIZE', 1024 ** 3))
+        self.decoder = decoder or JsonDecoder.from_env()
+        self.size = None
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.directory})'
+
+    @classmethod
+    def from_env(cls):
+        """
+            Create the cache configured by the environment
+        :return: The cache or None if it has been disabled by setting F1_CACHE_DIR to an empty value
+        """
+        if os.environ.get('F1_CACHE_DIR') == '':
+            return None
+        return cls()
+
+    @staticmethod
+    def key(target, parameters=None):
+        """
+            Create the cache key of a request
+        :param target: The request target
+        :param parameters: The request parameters
+        :return: The SHA-256 of the target and its sorted parameters
+        """
+        content = json.dumps({'target': target, 'parameters': parameters or dict()}, sort_keys=True)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def _expires(self, target):
+        """
+            Calculate the expiration of a new entry
+        :param target: The request target
+        :return: The expiration timestamp or None for the finished seasons
+        """
+        match = season_pattern.match(target)
+        if match and int(match.group(1)) < datetime.now().year:
+            return None
+        return time.time() + self.ttl
+
+    def _current_size(self):
+        if self.size is None:
+            self.size = 0
+            for root, _, files in os.walk(self.directory):
+                for file_name in files:
+                    self.size += os.path.getsize(os.path.join(root, file_name))
+        return self.size
+
+    def get(self, target, parameters=None):
+        """
+            Get a cached entry, fresh or not
+        :param target: The request target
+        :param parameters: The request parameters
+        :return: The entry, with the raw response bytes as its content, or None if it is not cached
+        """
+        path = self._path(self.key(target, parameters))
+        try:
+            with open(path, 'rb') as cache_file:
+                header, content = cache_file.read().split(b'\n', 1)
+            entry = self.decoder.decode(header)
+            entry['content'] = content
+            # The modification time tracks the last access for the LRU eviction
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            # Missing, torn or written by a former version of the cache
+            return None
+
+    @staticmethod
+    def is_fresh(entry):
+        """
+            Check if an entry can be used without revalidation
+        :param entry: The cache entry
+        :return: True if the entry has not expired
+        """
+        return entry['expires'] is None or entry['expires'] > time.time()
+
+    def set(self, target, parameters, content, etag=None, last_modified=None):
+        """
+            Store a response
+        :param target: The request target
+        :param parameters: The request parameters
+        :param content: The raw response bytes
+        :param etag: The response ETag header
+        :param last_modified: The response Last-Modified header
+        """
+        entry = {
+            'target': target,
+            'expires': self._expires(target),
+            'etag': etag,
+            'last_modified': last_modified,
+        }
+        path = self._path(self.key(target, parameters))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self.lock:
+            # Measured before the new entry is written, so that the first write does not count it twice
+            size = self._current_size()
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            temporary_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(temporary_path, 'wb') as cache_file:
+                cache_file.write(json.dumps(entry).encode('utf-8') + b'\n')
+                cache_file.write(content)
+            os.replace(temporary_path, path)
+            self.size = size - previous_size + os.path.getsize(path)
+            if self.size > self.max_size:
+                self._evict()
+
+    def refresh(self, target, parameters, entry):
+        """
+            Extend the expiration of an entry after a successful revalidation
+        :param target: The request target
+        :param parameters: The request parameters
+        :param entry: The revalidated entry
+        """
+        self.set(target=target, parameters=parameters, content=entry['content'], etag=entry.get('etag'),
+                 last_modified=entry.get('last_modified'))
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache fits its maximum size"""
+        entries = list()
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if self.size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                self.size -= size
+            except OSError:
+                pass
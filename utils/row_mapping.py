@@ -0,0 +1,130 @@
+import time
+
+from utils.metrics import Metrics
+
+
+class RowMapping:
+    """Declarative mapping of the rows nested in an Ergast page to the columns of an entity
+
+    The rows are found by following the list paths, e.g. ('RaceTable.Races', 'Laps', 'Timings') walks every
+    timing of every lap of every race of the page. Each field maps a column to a dotted key path, read from
+    the innermost list item by default or from an outer one with a 'Scope:' prefix, e.g. 'Races:season'
+    or 'Laps:number'. A '?' suffix makes a field optional, None when any of its keys is missing.
+    The converters set a column from a whole column slice in a single call once the rows of a page are
+    extracted, from the column itself or from a (converter, source column) pair.
+
+    The mapping is compiled once into a function of nested loops, with each field read at the loop
+    level of its scope, so that extracting a page runs no interpretation of the schema.
+    """
+
+    def __init__(self, rows, fields, converters=None):
+        """
+            Initialize the mapping
+        :param rows: The dotted key paths of the nested row lists, the first one from the page MRData
+        :param fields: The dotted key path of each column, with an optional 'Scope:' prefix and '?' suffix
+        :param converters: The converter of each column, or its (converter, source column) pair
+        """
+        self.rows = tuple(rows)
+        self.scopes = tuple(path.split('.')[-1] for path in self.rows)
+        self.fields = dict(fields)
+        self.converters = {column: converter if isinstance(converter, tuple) else (converter, None)
+                           for column, converter in (converters or dict()).items()}
+        self.extractors = dict()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({" > ".join(self.rows)}, columns={len(self.fields)})'
+
+    def _field(self, spec):
+        """
+            Parse a field
+        :param spec: The field, e.g. 'Races:season' or 'FastestLap.Time.time?'
+        :return: The scope level, the keys and whether the field is optional
+        """
+        level = len(self.scopes) - 1
+        if ':' in spec:
+            scope, spec = spec.split(':', 1)
+            level = self.scopes.index(scope)
+        optional = spec.endswith('?')
+        return level, spec.rstrip('?').split('.'), optional
+
+    @staticmethod
+    def _access(variable, keys, optional=False):
+        """
+            Build the expression reading a key path
+        :param variable: The variable of the dict to read from
+        :param keys: The keys
+        :param optional: Evaluate to None instead of failing when a key is missing
+        :return: The expression source
+        """
+        if not optional:
+            return variable + ''.join(f'[{key!r}]' for key in keys)
+        expression = variable
+        for key in keys[:-1]:
+            expression = f'({expression}.get({key!r}) or {{}})'
+        return f'{expression}.get({keys[-1]!r})'
+
+    def compile(self, columns, keep_columns=()):
+        """
+            Compile the extractor appending the rows of a page to column lists
+        :param columns: The columns of the buffer, the ones without a field are set to None
+        :param keep_columns: The columns passed to the keep function of each row
+        :return: The extractor, a function of the page MRData, the column lists and the keep function
+            returning the number of appended rows
+        """
+        levels = {level: list() for level in range(len(self.scopes))}
+        variables = dict()
+        for index, (column, spec) in enumerate(self.fields.items()):
+            level, keys, optional = self._field(spec)
+            variables[column] = f'v{index}'
+            levels[level].append(f'v{index} = {self._access(f"s{level}", keys, optional)}')
+
+        lines = ['def extract(mr_data, data, keep):']
+        lines += [f'    append_{index} = data[{column!r}].append' for index, column in enumerate(columns)]
+        lines.append('    rows = 0')
+
+        indent = '    '
+        for level, path in enumerate(self.rows):
+            source = 'mr_data' if level == 0 else f's{level - 1}'
+            lines.append(f'{indent}for s{level} in {self._access(source, path.split("."))}:')
+            indent += '    '
+            lines += [indent + line for line in levels[level]]
+
+        if keep_columns:
+            arguments = ', '.join(variables[column] for column in keep_columns)
+            lines.append(f'{indent}if keep is not None and not keep({arguments}):')
+            lines.append(f'{indent}    continue')
+        lines += [f'{indent}append_{index}({variables.get(column, "None")})' for index, column in enumerate(columns)]
+        lines.append(f'{indent}rows += 1')
+        lines.append('    return rows')
+
+        namespace = dict()
+        exec(compile('\n'.join(lines), f'<{self.__class__.__name__} {" > ".join(self.rows)}>', 'exec'), namespace)
+        return namespace['extract']
+
+    def extract(self, buffer, mr_data, keep=None, keep_columns=()):
+        """
+            Append the rows of a page to a column buffer and convert them
+        :param buffer: The column buffer
+        :param mr_data: The page MRData
+        :param keep: The function of the keep_columns values of a row telling whether to append it
+        :param keep_columns: The columns passed to the keep function
+        :return: The number of appended rows
+        """
+        key = (buffer.columns, tuple(keep_columns))
+        extractor = self.extractors.get(key)
+        if extractor is None:
+            extractor = self.extractors[key] = self.compile(buffer.columns, keep_columns)
+
+        began = time.perf_counter()
+        start = len(buffer)
+        rows = extractor(mr_data, buffer.data, keep)
+        buffer.length += rows
+        if rows:
+            for column, (converter, source) in self.converters.items():
+                buffer.convert(column=column, converter=converter, source=source, start=start)
+
+        metrics = Metrics.shared()
+        metrics.observe('parse', time.perf_counter() - began)
+        metrics.increment('pages')
+        metrics.increment('rows_parsed', rows)
+        return rows
@@ -0,0 +1,70 @@
+import os
+import queue
+import threading
+
+
+class StreamWriter:
+    """Background writer inserting the row chunks it receives through a bounded queue"""
+
+    def __init__(self, azure_db, table_name, statements=None, keys=None, queue_size=None):
+        """
+            Initialize the writer
+        :param azure_db: The database wrapper
+        :param table_name: The table name
+        :param statements: The function building the statements to run in the transaction of each chunk insert
+        :param keys: The natural key columns to upsert the chunks on, they are inserted by default
+        :param queue_size: The maximum number of chunks waiting to be inserted, the producer blocks beyond it
+        """
+        self.azure_db = azure_db
+        self.table_name = table_name
+        self.statements = statements
+        self.keys = keys
+        self.queue = queue.Queue(maxsize=int(queue_size or os.environ.get('F1_STREAM_QUEUE_SIZE', 4)))
+        self.rows = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._write, name=f'{table_name}_writer', daemon=True)
+        self.thread.start()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.table_name}, rows={self.rows})'
+
+    def _write(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            if self.error:
+                # Skip the chunks after a failure, the collection is resumed from the last inserted round
+                continue
+            try:
+                statements = self.statements(chunk) if self.statements else None
+                response = self.azure_db.insert(table_name=self.table_name, data=chunk, statements=statements,
+                                                keys=self.keys)
+            except Exception as error:
+                # An error ending the thread would leave the producer blocked on the full queue
+                self.error = f'Failed to insert {len(chunk)} rows in {self.table_name}: {error}'
+                continue
+            if response is None:
+                self.error = f'Failed to insert {len(chunk)} rows in {self.table_name}'
+            else:
+                self.rows += response
+
+    def put(self, chunk):
+        """
+            Queue a chunk of rows for insertion
+        :param chunk: The rows
+        """
+        if self.error:
+            raise RuntimeError(self.error)
+        self.queue.put(chunk)
+
+    def close(self):
+        """
+            Insert the queued chunks and stop the writer
+        :return: The number of inserted rows
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.rows
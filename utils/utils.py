@@ -1,22 +1,21 @@
 from datetime import datetime, date, timedelta
 from decimal import Decimal
-from random import randint
-from tabulate import tabulate
+from random import uniform
 from typing import Generator, Union
 
 
-def exponential_backoff_retries(max_backoff: int = 1200, max_retries: int = 20, max_random_s: int = 300) -> Generator:
+def exponential_backoff_retries(max_backoff: int = 60, max_retries: int = 20, max_random_s: float = 1) -> Generator:
     """For a finite number of retries, yield the wait duration
 
-    :param max_backoff: The maximum backoff duration
+    :param max_backoff: The maximum backoff duration in seconds
     :param max_retries: The maximum number of retries
-    :param max_random_s: The maximum number of milliseconds to be randomly added
-    :return: The waiting time
+    :param max_random_s: The maximum number of seconds to be randomly added
+    :return: The waiting time in seconds
     """
     maximum_backoff = max_backoff
     retry = 1
     while retry <= max_retries:
-        yield min(2 ^ retry + randint(1, max_random_s), maximum_backoff)
+        yield min(2 ** retry + uniform(0, max_random_s), maximum_backoff)
         retry += 1
 
 def batch(iterable: list, batch_size=500) -> Generator:
@@ -33,6 +32,53 @@ def batch(iterable: list, batch_size=500) -> Generator:
             yield iterable[ndx:min(ndx + batch_size, length)]
 
 
+def duration_to_milliseconds(duration: str) -> Union[int, None]:
+    """Convert a duration such as 1:23.456, 1:02:03.456 or 23.456 to milliseconds
+
+    :param duration: The duration string, with optional hours and minutes
+    :return: The milliseconds or None for an empty duration
+    """
+    if not duration:
+        return None
+    *hours_minutes, seconds = duration.split(':')
+    seconds, _, fraction = seconds.partition('.')
+    milliseconds = int(seconds) * 1000 + int(fraction[:3].ljust(3, '0'))
+    weight = 60000
+    for value in reversed(hours_minutes):
+        milliseconds += int(value) * weight
+        weight *= 60
+    return milliseconds
+
+
+def durations_to_milliseconds(durations: list) -> list:
+    """Convert a column of durations to milliseconds in a single call
+
+    :param durations: The duration strings
+    :return: The milliseconds of each duration, None for the empty ones
+    """
+    convert = duration_to_milliseconds
+    return [convert(duration) for duration in durations]
+
+
+def to_integers(values: list) -> list:
+    """Convert a column of numeric strings to integers in a single call
+
+    :param values: The strings
+    :return: The integers, None for the missing values
+    """
+    return [int(value) if value is not None else None for value in values]
+
+
+def to_dates(values: list) -> list:
+    """Convert a column of ISO dates such as 2023-03-05 to dates in a single call
+
+    :param values: The date strings
+    :return: The dates, None for the missing values
+    """
+    parse = date.fromisoformat
+    return [parse(value) if value else None for value in values]
+
+
 def json_converter(obj: Union[datetime, date, Decimal]) -> str:
     """Create a string representation of an object
 
@@ -71,6 +117,8 @@ def print_df(dataframe, head_rows=None, tail_rows=None):
     :param head_rows: The number of top rows to print
     :param tail_rows: The number of bottom rows to print
     """
+    from tabulate import tabulate
+
     if head_rows:
         print(tabulate(dataframe.head(head_rows), headers='keys', tablefmt='psql'))
     elif tail_rows:
@@ -79,6 +127,17 @@ def print_df(dataframe, head_rows=None, tail_rows=None):
         print(tabulate(dataframe, headers='keys', tablefmt='psql'))
 
 
+def last_past_round(races: list, today: date = None) -> int:
+    """Get the last round of a season calendar that has already run
+
+    :param races: The races of the season, with their round and date
+    :param today: The current date, today by default
+    :return: The last round dated before today, 0 if none has run yet
+    """
+    today = (today or date.today()).isoformat()
+    return max((int(race['round']) for race in races if race.get('date', today) < today), default=0)
+
+
 def round_to_ten(number) -> int:
     """
         Round a number to the nearest decade
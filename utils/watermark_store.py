@@ -0,0 +1,75 @@
+class WatermarkStore:
+    """Last ingested (year, round, offset) of each collector, kept in a small state table
+
+    The watermark of a collector is updated in the transaction of its insert, so that
+    start-up is a single key lookup instead of a MAX() scan of the collector table.
+    """
+
+    table_name = 'ingestion_watermarks'
+
+    create_query = f"""
+        IF OBJECT_ID(N'{table_name}', N'U') IS NULL
+            CREATE TABLE {table_name} (
+                collector  VARCHAR(64) NOT NULL PRIMARY KEY,
+                year       INT         NOT NULL,
+                round      INT         NOT NULL,
+                row_offset INT         NOT NULL,
+                updated_at DATETIME2   NOT NULL
+            );
+    """
+
+    select_query = f"""
+        SELECT {table_name}.year, {table_name}.round, {table_name}.row_offset
+        FROM {table_name}
+        WHERE {table_name}.collector = ?;
+    """
+
+    # Watermarks only move forward, so that re-ingesting older rounds never rewinds them
+    update_query = f"""
+        MERGE {table_name} WITH (HOLDLOCK) AS target
+        USING (SELECT ? AS collector, ? AS year, ? AS round, ? AS row_offset) AS source
+        ON target.collector = source.collector
+        WHEN MATCHED AND (source.year > target.year OR (source.year = target.year AND source.round >= target.round)) THEN
+            UPDATE SET year = source.year, round = source.round, row_offset = source.row_offset,
+                       updated_at = SYSUTCDATETIME()
+        WHEN NOT MATCHED THEN
+            INSERT (collector, year, round, row_offset, updated_at)
+            VALUES (source.collector, source.year, source.round, source.row_offset, SYSUTCDATETIME());
+    """
+
+    def __init__(self, azure_db):
+        self.azure_db = azure_db
+        self.table_exists = False
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.table_name})'
+
+    def _create_table(self):
+        """Create the watermark table on first use"""
+        if not self.table_exists:
+            self.table_exists = self.azure_db.execute(query=self.create_query) is not None
+
+    def get(self, collector):
+        """
+            Get the watermark of a collector
+        :param collector: The collector name
+        :return: A dict with the year, round and offset or None if the collector has no watermark yet
+        """
+        self._create_table()
+        rows = self.azure_db.select(query=self.select_query, parameters=(collector,))
+        for row in rows or list():
+            return {'year': int(row['year']), 'round': int(row['round']), 'offset': int(row['row_offset'])}
+        return None
+
+    def statement(self, collector, year, round, offset):
+        """
+            Build the statement updating the watermark of a collector, to run in the transaction of its insert
+        :param collector: The collector name
+        :param year: The last ingested season
+        :param round: The last ingested round
+        :param offset: The number of ingested rows of the last round
+        :return: The query and its parameters
+        """
+        # A collector run over an explicit range updates its watermark without having read it
+        self._create_table()
+        return self.update_query, (collector, year, round, offset)